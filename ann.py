@@ -0,0 +1,216 @@
+'''
+# Approximate nearest neighbors
+Inverted-file (IVF) index over the feature matrix. Its coarse quantizer is a k-means on the features
+(about sqrt(n) lists, trained on a sample): the beans closest to one centroid form its inverted list.
+A query only scans the `nprobe` lists with the closest centroids instead of the whole catalog,
+so `nprobe` trades recall for latency: nprobe = number of lists is exact search.
+
+The KMeans clusters of the models are not used as lists: the cluster labels of the dataset come from another
+notebook run and do not follow the feature space, so neighbors rarely share a cluster.
+
+Usage:
+    python -m ann --nprobe 1 2 4 8 16    # recall@10 and latency against exact search
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+DEFAULT_NPROBE = 8
+
+IVF_ARRAYS = ('ivf_centroids', 'ivf_lists', 'ivf_offsets', 'ivf_members')
+
+# Sample size of the quantizer training per list, and its number of Lloyd iterations
+TRAIN_SAMPLES_PER_LIST = 64
+TRAIN_ITERATIONS = 10
+
+# Beans assigned to the centroids at once, bounds the distance matrix size
+ASSIGN_BATCH_SIZE = 16384
+
+
+def compute_centroids(features, bean_cluster, n_clusters=None):
+    """Mean feature vector of every cluster, shape (n_clusters, n_features)."""
+    features = np.asarray(features, dtype=np.float32)
+    n_clusters = n_clusters or int(bean_cluster.max()) + 1
+    sums = np.zeros((n_clusters, features.shape[1]), dtype=np.float64)
+    np.add.at(sums, bean_cluster, features)
+    counts = np.bincount(bean_cluster, minlength=n_clusters)[:, None]
+    return (sums / np.maximum(counts, 1)).astype(np.float32)
+
+
+def default_n_lists(n_beans):
+    """About sqrt(n) lists, so the centroid scan and a list scan cost about the same."""
+    return max(1, int(round(np.sqrt(n_beans))))
+
+
+def assign_lists(features, centroids):
+    """Index of the closest centroid of every feature row, as int32."""
+    centroids = np.asarray(centroids, dtype=np.float32)
+    c_sq = np.einsum('ij,ij->i', centroids, centroids)
+    lists = np.empty(len(features), dtype=np.int32)
+    for start in range(0, len(features), ASSIGN_BATCH_SIZE):
+        block = np.asarray(features[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32)
+        lists[start:start + len(block)] = (c_sq[None, :] - 2.0 * (block @ centroids.T)).argmin(axis=1)
+    return lists
+
+
+def train_centroids(features, n_lists, seed=0):
+    """
+    Trains the coarse quantizer: Lloyd's k-means on a sample of TRAIN_SAMPLES_PER_LIST beans per list,
+    starting from randomly chosen sample beans.
+
+    Returns:
+        ndarray: float32 centroids, shape (n_lists, n_features).
+    """
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(features))
+    sample_size = min(len(features), n_lists * TRAIN_SAMPLES_PER_LIST)
+    sample = np.asarray(features[np.sort(rng.choice(len(features), size=sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(TRAIN_ITERATIONS):
+        lists = assign_lists(sample, centroids)
+        # Lists that lost all their beans keep their centroid
+        filled = np.bincount(lists, minlength=n_lists) > 0
+        centroids[filled] = compute_centroids(sample, lists, n_lists)[filled]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Approximate euclidean k-nearest neighbor search.
+
+    Parameters:
+        features (ndarray): Feature matrix, one row per coffee bean.
+        centroids (ndarray): One centroid per cluster.
+        offsets, members (ndarray): Inverted lists in the ClusterStore layout,
+            members[offsets[c]:offsets[c + 1]] are the beans of list c.
+        sq_norms (ndarray): Optional precomputed squared row norms of the features.
+        lists (ndarray): Optional list of every bean, needed to store the index (see `arrays`).
+    """
+
+    def __init__(self, features, centroids, offsets, members, sq_norms=None, lists=None):
+        self.features = features
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = offsets
+        self.members = members
+        self.lists = lists
+        self._sq_norms = np.einsum('ij,ij->i', features, features) if sq_norms is None else sq_norms
+
+    @classmethod
+    def build(cls, features, n_lists=None, centroids=None, seed=0, sq_norms=None):
+        """Index over `features`, with `centroids` or a quantizer of `n_lists` (default sqrt(n)) trained on them."""
+        if centroids is None:
+            centroids = train_centroids(features, n_lists or default_n_lists(len(features)), seed=seed)
+        return cls.from_lists(features, centroids, assign_lists(features, centroids), sq_norms=sq_norms)
+
+    @classmethod
+    def from_lists(cls, features, centroids, lists, sq_norms=None):
+        """Index from the list of every bean, e.g. after beans were appended to `features` and `lists`."""
+        members = np.argsort(lists, kind='stable').astype(np.int32)
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids))))).astype(np.int64)
+        return cls(features, centroids, offsets, members, sq_norms=sq_norms, lists=lists)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """Index stored in the artifact, or built in memory for artifacts that predate the stored index."""
+        arrays = artifact.arrays
+        if not all(key in arrays for key in IVF_ARRAYS):
+            return cls.build(artifact.features, sq_norms=arrays.get('sq_norms'))
+        return cls(artifact.features, arrays['ivf_centroids'], arrays['ivf_offsets'], arrays['ivf_members'],
+                   sq_norms=arrays.get('sq_norms'), lists=arrays['ivf_lists'])
+
+    def arrays(self):
+        """The index arrays under their artifact names."""
+        return dict(zip(IVF_ARRAYS, (self.centroids, self.lists, self.offsets, self.members)))
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def search(self, queries, k=10, nprobe=DEFAULT_NPROBE, exclude_ids=None):
+        """
+        Finds approximately the k nearest coffee beans of each query vector.
+
+        Parameters:
+            queries (ndarray): Query vectors, shape (n_queries, n_features).
+            k (int): Number of neighbors per query.
+            nprobe (int): Number of closest clusters to scan per query.
+            exclude_ids (array-like): Optional bean ID to leave out per query (the query bean itself).
+
+        Returns:
+            tuple: (indices, distances) of shape (n_queries, k), -1 / inf where fewer than k beans were scanned.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        nprobe = min(nprobe, self.n_lists)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+
+        # Closest clusters of every query in one batch
+        c_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        to_centroids = c_sq[None, :] - 2.0 * (queries @ self.centroids.T)
+        probes = np.argpartition(to_centroids, nprobe - 1, axis=1)[:, :nprobe]
+
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.members[self.offsets[c]:self.offsets[c + 1]] for c in probes[i]])
+            if exclude_ids is not None:
+                candidates = candidates[candidates != exclude_ids[i]]
+            if not len(candidates):
+                continue
+            sq = self._sq_norms[candidates] - 2.0 * (self.features[candidates] @ query) + query @ query
+            n = min(k, len(candidates))
+            top = np.argpartition(sq, n - 1)[:n]
+            top = top[np.argsort(sq[top], kind='stable')]
+            indices[i, :n] = candidates[top]
+            distances[i, :n] = np.sqrt(np.maximum(sq[top], 0.0))
+        return indices, distances
+
+    def kneighbors(self, query_ids, k=10, nprobe=DEFAULT_NPROBE):
+        """Approximate neighbors of beans in the index, excluding each bean itself."""
+        query_ids = np.atleast_1d(np.asarray(query_ids, dtype=np.int64))
+        return self.search(self.features[query_ids], k=k, nprobe=nprobe, exclude_ids=query_ids)
+
+
+def recall_at_k(index, engine, k=10, nprobe=DEFAULT_NPROBE, sample_size=1000, seed=0):
+    """
+    Measures the index against exact search on a sample of beans.
+
+    Returns:
+        dict: recall@k (share of the exact top-k found) and mean query latency of both searches in ms.
+            A bean as close as the exact k-th neighbor counts as found: many beans have identical features,
+            and which of them make the top-k is arbitrary.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(engine), size=min(sample_size, len(engine)), replace=False)
+
+    start = time.perf_counter()
+    exact, exact_dist = engine.kneighbors(sample, k=k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    start = time.perf_counter()
+    approx, approx_dist = index.kneighbors(sample, k=k, nprobe=nprobe)
+    approx_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    found = (approx_dist <= exact_dist[:, -1:] + 1e-4).sum()
+    return {'k': k, 'nprobe': nprobe, 'recall': found / exact.size, 'exact_ms': exact_ms, 'approx_ms': approx_ms}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF index against exact search.")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--sample-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    from registry import get_artifact
+    artifact = get_artifact()
+    index = IVFIndex.from_artifact(artifact)
+    print(f"{len(artifact)} beans, {index.n_lists} lists")
+    for nprobe in args.nprobe:
+        report = recall_at_k(index, artifact.engine(), k=args.k, nprobe=nprobe, sample_size=args.sample_size)
+        print(f"nprobe={nprobe:<4} recall@{args.k}={report['recall']:.3f}  "
+              f"ivf {report['approx_ms']:.3f} ms/query  exact {report['exact_ms']:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
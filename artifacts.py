@@ -0,0 +1,458 @@
+'''
+# Model artifact
+Versioned on-disk format for the recommendation models, replacing the pickled joblib dictionaries.
+An artifact is a directory holding a `manifest.json` and one `.npy` file per array:
+
+*   names.npy, sorted_names.npy, name_order.npy: name string table (fixed-width UTF-8) and its sorted lookup index
+*   features.npy: float32 feature matrix, one row per coffee bean
+*   ratings.npy, prices.npy: float32 rating and price per ounce of every coffee bean
+*   neighbors.npy: int32 top-k nearest neighbor IDs of every coffee bean (-1 padded)
+*   clusters.npy, cluster_offsets.npy, cluster_members.npy: KMeans assignments in the ClusterStore layout
+*   sq_norms.npy (optional): float32 squared norm of every feature row, read by the engine and the IVF index
+*   centroids.npy (optional): float32 KMeans cluster centroids, new beans join the closest one (see incremental.py)
+*   ivf_*.npy (optional): coarse quantizer centroids and inverted lists of the IVF index (see ann.py)
+*   compact_*.npy (optional): int8 / bit-packed copy of the features for the compact search (see quantized.py)
+*   table_*.npy (optional): precomputed recommendations for single beans and frequent pairs, stamped with the
+    model version they were computed for (see recommendation_table.py)
+*   deltas/*.npz (optional): beans added incrementally since the artifact was built (see incremental.py),
+    listed in the manifest and applied on load; an artifact with deltas is copied into memory instead of mapped
+
+The manifest's `model_version` is a hash of the arrays that determine the recommendations, recomputed when deltas
+are applied, so anything computed from one model version can tell whether it still matches.
+
+`load_artifact` memory-maps every array read-only, so loading does not depend on the catalog size
+and processes loading the same artifact share its pages through the OS page cache.
+
+Usage:
+    python -m artifacts build --csv coffee_cleaned.csv --out model/coffee_model
+    python -m artifacts convert --knn model/knn_model.joblib --kmeans model/kmeans_model.joblib --csv coffee_cleaned.csv
+    python -m artifacts build --pair-log baskets.jsonl --workers 4   # with the frequent pairs of a basket log
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from ann import IVF_ARRAYS, IVFIndex, assign_lists, compute_centroids
+from cluster_store import ClusterStore
+from name_table import NameTable
+from quantized import COMPACT_ARRAYS, CompactIndex
+from similarity import NUMERICAL_FEATURES, SimilarityEngine, build_feature_matrix
+
+FORMAT_NAME = 'coffee-model'
+FORMAT_VERSION = 1
+DEFAULT_ARTIFACT_PATH = './model/coffee_model'
+
+ARRAY_FILES = {
+    'names': 'names.npy',
+    'sorted_names': 'sorted_names.npy',
+    'name_order': 'name_order.npy',
+    'features': 'features.npy',
+    'ratings': 'ratings.npy',
+    'prices': 'prices.npy',
+    'neighbors': 'neighbors.npy',
+    'clusters': 'clusters.npy',
+    'cluster_offsets': 'cluster_offsets.npy',
+    'cluster_members': 'cluster_members.npy',
+}
+
+# Arrays that older artifacts may not have
+OPTIONAL_ARRAY_FILES = {
+    'sq_norms': 'sq_norms.npy',
+    'centroids': 'centroids.npy',
+    **{key: f"{key}.npy" for key in IVF_ARRAYS},
+    'compact_codes': 'compact_codes.npy',
+    'compact_sq_norms': 'compact_sq_norms.npy',
+    'compact_columns': 'compact_columns.npy',
+    'compact_scales': 'compact_scales.npy',
+    'table_single': 'table_single.npy',
+    'table_pair_keys': 'table_pair_keys.npy',
+    'table_pair_values': 'table_pair_values.npy',
+}
+
+# Arrays that determine the recommendations, hashed into the model version
+VERSIONED_ARRAYS = ('names', 'ratings', 'neighbors', 'clusters')
+
+
+class ModelArtifact:
+    """
+    All arrays of one model version, either memory-mapped from disk or held in memory.
+
+    Parameters:
+        arrays (dict): Array name -> ndarray, see ARRAY_FILES.
+        manifest (dict): Format version and metadata (feature columns, k, number of clusters).
+    """
+
+    def __init__(self, arrays, manifest):
+        self.arrays = arrays
+        self.manifest = manifest
+        self.names = NameTable(arrays['names'], arrays['sorted_names'], arrays['name_order'])
+        self._engine = None
+        self._cluster_store = None
+        self._ann_index = None
+        self._compact_index = None
+        self._recommendation_table = False
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get('arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def k(self):
+        return self.arrays['neighbors'].shape[1]
+
+    @property
+    def model_version(self):
+        """Hash of the recommendation-relevant arrays, computed once for artifacts that predate the manifest entry."""
+        if 'model_version' not in self.manifest:
+            self.manifest['model_version'] = model_version(self.arrays)
+        return self.manifest['model_version']
+
+    @property
+    def has_features(self):
+        return self.arrays['features'].shape[1] > 0
+
+    def engine(self):
+        """SimilarityEngine over the artifact's feature matrix, sharing its arrays."""
+        if self._engine is None:
+            self._engine = SimilarityEngine(self.names, self.features, self.ratings, sq_norms=self.arrays.get('sq_norms'))
+        return self._engine
+
+    def cluster_store(self):
+        """ClusterStore over the artifact's cluster arrays, sharing its arrays."""
+        if self._cluster_store is None:
+            self._cluster_store = ClusterStore(
+                self.clusters, self.ratings, offsets=self.cluster_offsets, members=self.cluster_members
+            )
+        return self._cluster_store
+
+    def cluster_centroids(self):
+        """Centroid of every KMeans cluster, the stored ones or computed from the features."""
+        centroids = self.arrays.get('centroids')
+        if centroids is None:
+            centroids = compute_centroids(self.features, self.clusters, self.manifest.get('n_clusters'))
+        return centroids
+
+    def ann_index(self):
+        """IVFIndex over the artifact's features, the stored one or one trained on first use."""
+        if self._ann_index is None:
+            self._ann_index = IVFIndex.from_artifact(self)
+        return self._ann_index
+
+    def compact_index(self):
+        """CompactIndex over the artifact's quantized features, re-ranking against its full-precision features."""
+        if self._compact_index is None:
+            self._compact_index = CompactIndex.from_artifact(self)
+        return self._compact_index
+
+    def recommendation_table(self):
+        """The precomputed RecommendationTable, None if the artifact has none or it belongs to another model version."""
+        if self._recommendation_table is False:
+            from recommendation_table import RecommendationTable
+            self._recommendation_table = RecommendationTable.from_artifact(self)
+        return self._recommendation_table
+
+
+def feature_means(features, feature_columns):
+    """Mean of every numerical feature column, by column name."""
+    means = np.asarray(features, dtype=np.float64).mean(axis=0) if len(features) else np.zeros(len(feature_columns))
+    return {column: float(mean) for column, mean in zip(feature_columns, means) if column in NUMERICAL_FEATURES}
+
+
+def model_version(arrays):
+    """SHA-256 over the VERSIONED_ARRAYS, shortened like the pipeline's cache keys."""
+    digest = hashlib.sha256()
+    for key in VERSIONED_ARRAYS:
+        array = np.ascontiguousarray(arrays[key])
+        digest.update(f"{key}:{array.dtype.str}:{array.shape}".encode('utf-8'))
+        digest.update(array.view(np.uint8))
+    return digest.hexdigest()[:16]
+
+
+def make_artifact(names, features, ratings, prices, neighbors, clusters, feature_columns=(), metadata=None):
+    """
+    Assembles an in-memory ModelArtifact from per-bean arrays in bean ID order.
+
+    Parameters:
+        names (list): Coffee bean names.
+        features (ndarray): Feature matrix, may have zero columns if the features are unknown.
+        ratings, prices (array-like): Rating and price per ounce of each bean.
+        neighbors (ndarray): Nearest neighbor IDs, shape (n_beans, k), -1 for missing entries.
+        clusters (array-like): KMeans cluster ID of each bean.
+        feature_columns (list): Names of the feature matrix columns.
+        metadata (dict): Extra manifest entries.
+    """
+    table = NameTable.from_names(names)
+    store = ClusterStore(clusters, ratings)
+    arrays = {
+        'names': table.names,
+        'sorted_names': table.sorted_names,
+        'name_order': table.order,
+        'features': np.ascontiguousarray(features, dtype=np.float32),
+        'ratings': np.asarray(ratings, dtype=np.float32),
+        'prices': np.asarray(prices, dtype=np.float32),
+        'neighbors': np.ascontiguousarray(neighbors, dtype=np.int32),
+        'clusters': store.bean_cluster,
+        'cluster_offsets': store.offsets,
+        'cluster_members': store.members,
+    }
+    metadata = dict(metadata or {})
+    if arrays['features'].shape[1]:
+        # Read by the engine and the IVF index instead of being computed again on every load
+        arrays['sq_norms'] = np.einsum('ij,ij->i', arrays['features'], arrays['features'])
+        arrays['centroids'] = compute_centroids(arrays['features'], store.bean_cluster, store.n_clusters)
+        # Baseline for the drift check of incremental updates
+        offsets = arrays['features'] - arrays['centroids'][store.bean_cluster]
+        metadata['mean_centroid_distance'] = float(np.linalg.norm(offsets, axis=1).mean())
+        # Fill values for missing scores of beans added later (see incremental.py)
+        metadata['feature_means'] = feature_means(arrays['features'], feature_columns)
+        arrays.update(CompactIndex.from_features(arrays['features']).arrays())
+        arrays.update(IVFIndex.build(arrays['features']).arrays())
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'n_beans': len(table),
+        'feature_columns': list(feature_columns),
+        'k': arrays['neighbors'].shape[1],
+        'n_clusters': store.n_clusters,
+        'model_version': model_version(arrays),
+    }
+    manifest.update(metadata)
+    return ModelArtifact(arrays, manifest)
+
+
+def compute_neighbors(engine, k=10, batch_size=1024, index=None, nprobe=None):
+    """
+    Top-k neighbors of every bean, computed in batches to bound memory.
+    With an IVFIndex and `nprobe`, the neighbors are approximate and the build scales
+    with the size of the probed lists instead of the whole catalog.
+    """
+    neighbors = np.empty((len(engine), k), dtype=np.int32)
+    for start in range(0, len(engine), batch_size):
+        ids = np.arange(start, min(start + batch_size, len(engine)))
+        if index is not None and nprobe:
+            neighbors[ids], _ = index.kneighbors(ids, k=k, nprobe=nprobe)
+        else:
+            neighbors[ids], _ = engine.kneighbors(ids, k=k)
+    return neighbors
+
+
+def build_artifact(df, k=10, nprobe=None):
+    """
+    Builds a ModelArtifact from the cleaned coffee dataset, as exported by the notebook.
+    The dataset must contain the `cluster` column assigned by the notebook's KMeans model.
+    Pass `nprobe` to compute the neighbor lists with the IVF index instead of exact search.
+    """
+    features, feature_columns = build_feature_matrix(df)
+    engine = SimilarityEngine(df['name'].to_numpy(), features, df['rating'].to_numpy())
+    clusters = df['cluster'].to_numpy()
+    index = IVFIndex.build(engine.features) if nprobe else None
+    return make_artifact(
+        df['name'].tolist(),
+        features,
+        df['rating'].to_numpy(),
+        pd.to_numeric(df['price_per_ounce'], errors='coerce').to_numpy(),
+        compute_neighbors(engine, k=k, index=index, nprobe=nprobe),
+        clusters,
+        feature_columns=feature_columns,
+        metadata={'neighbors_nprobe': nprobe} if nprobe else None,
+    )
+
+
+def convert_joblib(nearest_neighbors, clusters_dict, df=None):
+    """
+    Converts the notebook's joblib dictionaries into a ModelArtifact.
+
+    The dictionaries hold no features or prices; pass the cleaned dataset as `df` to include them.
+    Ratings are recovered from the neighbor lists, where every bean appears with its own rating.
+    """
+    names = list(nearest_neighbors)
+    name_to_id = {name: i for i, name in enumerate(names)}
+
+    ratings = np.full(len(names), np.nan, dtype=np.float32)
+    for entries in (nearest_neighbors, clusters_dict):
+        for entry in entries.values():
+            ratings[[name_to_id[n] for n in entry['neighbors']]] = entry['ratings']
+
+    k = max(len(entry['neighbors']) for entry in nearest_neighbors.values())
+    neighbors = np.full((len(names), k), -1, dtype=np.int32)
+    for name, entry in nearest_neighbors.items():
+        neighbors[name_to_id[name], :len(entry['neighbors'])] = [name_to_id[n] for n in entry['neighbors']]
+
+    clusters = np.array([clusters_dict[name]['cluster'] for name in names], dtype=np.int32)
+
+    if df is not None:
+        df = df.drop_duplicates(subset='name').set_index('name').loc[names].reset_index()
+        features, feature_columns = build_feature_matrix(df)
+        prices = pd.to_numeric(df['price_per_ounce'], errors='coerce').to_numpy()
+    else:
+        features, feature_columns = np.zeros((len(names), 0), dtype=np.float32), []
+        prices = np.full(len(names), np.nan, dtype=np.float32)
+
+    return make_artifact(
+        names, features, np.nan_to_num(ratings, nan=-np.inf), prices, neighbors, clusters,
+        feature_columns=feature_columns, metadata={'converted_from': 'joblib'},
+    )
+
+
+def save_artifact(path, artifact):
+    """
+    Writes an artifact directory. The new version is written next to the target and
+    renamed into place, so readers never see a partially written artifact.
+    """
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for key, filename in {**ARRAY_FILES, **OPTIONAL_ARRAY_FILES}.items():
+        if key in artifact.arrays:
+            np.save(os.path.join(tmp_path, filename), artifact.arrays[key])
+    # In-memory arrays already include any applied deltas
+    manifest = {key: value for key, value in artifact.manifest.items() if key not in ('deltas', 'delta_beans')}
+    manifest['n_beans'] = len(artifact)
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    # Already mapped files stay valid for existing readers after the old directory is removed
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def apply_delta(arrays, deltas):
+    """
+    Returns the arrays with incremental deltas applied in order: new beans appended, patched
+    neighbor lists replaced, and the name index and cluster layout rebuilt.
+
+    Every array is copied into memory once for all deltas, the memory-mapped base arrays are no longer shared
+    after this: `incremental.add_beans` compacts the deltas into the base arrays before this cost grows large.
+    """
+    arrays = dict(arrays)
+    names = np.concatenate([arrays['names']] + [delta['names'] for delta in deltas])
+    order = np.argsort(names, kind='stable').astype(np.int32)
+    arrays.update({'names': names, 'sorted_names': names[order], 'name_order': order})
+    for key in ('features', 'ratings', 'prices', 'clusters'):
+        arrays[key] = np.concatenate([arrays[key]] + [delta[key].astype(arrays[key].dtype) for delta in deltas])
+    if 'sq_norms' in arrays:
+        added = arrays['features'][len(arrays['sq_norms']):]
+        arrays['sq_norms'] = np.concatenate([arrays['sq_norms'], np.einsum('ij,ij->i', added, added)])
+
+    neighbors = np.concatenate([arrays['neighbors']] + [delta['neighbors'] for delta in deltas])
+    # In order, a later delta may patch the list of a bean an earlier one added or patched
+    for delta in deltas:
+        neighbors[delta['patched_ids']] = delta['patched_neighbors']
+    arrays['neighbors'] = neighbors
+
+    store = ClusterStore(arrays['clusters'], arrays['ratings'])
+    arrays.update({'cluster_offsets': store.offsets, 'cluster_members': store.members})
+    if all(key in arrays for key in IVF_ARRAYS):
+        # New beans join the closest list of the trained quantizer
+        n_base = len(arrays['ivf_lists'])
+        lists = np.concatenate([arrays['ivf_lists'], assign_lists(arrays['features'][n_base:], arrays['ivf_centroids'])])
+        arrays.update(IVFIndex.from_lists(arrays['features'], arrays['ivf_centroids'], lists).arrays())
+    # Encoded for the old beans only, `compact_index` encodes all features again on first use
+    for key in COMPACT_ARRAYS:
+        arrays.pop(key, None)
+    return arrays
+
+
+def load_artifact(path=DEFAULT_ARTIFACT_PATH, mmap_mode='r'):
+    """
+    Loads an artifact directory, memory-mapping every array read-only.
+    Incremental deltas listed in the manifest are applied on top, in memory (see `apply_delta`).
+
+    Raises:
+        ValueError: If the directory holds an unknown format or a newer format version.
+    """
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact at {path}: {manifest.get('format')} v{manifest.get('version')}")
+
+    arrays = {key: np.load(os.path.join(path, filename), mmap_mode=mmap_mode) for key, filename in ARRAY_FILES.items()}
+    for key, filename in OPTIONAL_ARRAY_FILES.items():
+        if os.path.exists(os.path.join(path, filename)):
+            arrays[key] = np.load(os.path.join(path, filename), mmap_mode=mmap_mode)
+    if manifest.get('deltas'):
+        deltas = []
+        for delta_file in manifest['deltas']:
+            with np.load(os.path.join(path, delta_file)) as delta:
+                deltas.append(dict(delta))
+        arrays = apply_delta(arrays, deltas)
+        manifest['model_version'] = model_version(arrays)
+    return ModelArtifact(arrays, manifest)
+
+
+def load_or_build_artifact(path, load_dataset, knn_path, kmeans_path):
+    """
+    Loads the artifact at `path`, or builds one in memory when it has not been exported yet.
+
+    Parameters:
+        path (str): Artifact directory.
+        load_dataset (callable): Returns the cleaned coffee dataset, only called when building.
+        knn_path, kmeans_path (str): joblib models, converted with the dataset's features so the neighbor lists
+            and clusters stay those of the shipped models. The dataset's cluster labels come from another
+            notebook run and are only used when the joblib models are missing or do not cover the dataset.
+    """
+    if os.path.exists(os.path.join(path, 'manifest.json')):
+        return load_artifact(path)
+    df = load_dataset()
+    if os.path.exists(knn_path) and os.path.exists(kmeans_path):
+        from joblib import load
+        nearest_neighbors = load(knn_path)
+        if 'cluster' not in df.columns or set(nearest_neighbors).issubset(df['name']):
+            return convert_joblib(nearest_neighbors, load(kmeans_path), df)
+    return build_artifact(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or convert the coffee model artifact.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Build from the cleaned dataset")
+    build_parser.add_argument('--csv', default='coffee_cleaned.csv')
+    build_parser.add_argument('--k', type=int, default=10)
+    build_parser.add_argument('--nprobe', type=int, default=None, help="Build the neighbor lists with the IVF index")
+    build_parser.add_argument('--out', default=DEFAULT_ARTIFACT_PATH)
+
+    convert_parser = subparsers.add_parser('convert', help="Convert the joblib models")
+    convert_parser.add_argument('--knn', default='./model/knn_model.joblib')
+    convert_parser.add_argument('--kmeans', default='./model/kmeans_model.joblib')
+    convert_parser.add_argument('--csv', default=None, help="Cleaned dataset providing features and prices")
+    convert_parser.add_argument('--out', default=DEFAULT_ARTIFACT_PATH)
+
+    for subparser in (build_parser, convert_parser):
+        subparser.add_argument('--pair-log', default=None, help="Basket log whose frequent pairs are precomputed")
+        subparser.add_argument('--workers', type=int, default=1, help="Processes building the recommendation table")
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        artifact = build_artifact(pd.read_csv(args.csv), k=args.k, nprobe=args.nprobe)
+    else:
+        from joblib import load
+        df = pd.read_csv(args.csv) if args.csv else None
+        artifact = convert_joblib(load(args.knn), load(args.kmeans), df)
+
+    from recommendation_table import add_table
+    add_table(artifact, args.pair_log, workers=args.workers)
+    save_artifact(args.out, artifact)
+    print(f"Saved {len(artifact)} coffee beans to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
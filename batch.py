@@ -0,0 +1,248 @@
+'''
+# Batch recommendations
+Recommends coffee beans for many baskets at once, for offline campaigns.
+Baskets are read as a stream, cut into chunks, and inside a chunk the baskets are grouped by size
+so the neighbor and cluster lookups of a whole group become a few array operations.
+Chunks are spread across a process pool; every worker memory-maps the same model artifact.
+
+Input formats:
+*   JSONL: one basket per line, {"id": ..., "beans": ["name", ...]}
+*   CSV: a header row, the first column is the basket ID and every further non-empty column a bean name
+
+Usage:
+    python -m batch --model knn --input baskets.jsonl --output recommendations.jsonl --workers 4
+'''
+
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from recommendation import rank_neighbor_votes
+from registry import get_artifact
+
+MODELS = ('knn', 'kmeans')
+
+
+def read_baskets(stream, fmt='jsonl'):
+    """Yields (basket_id, bean_names) pairs from a JSONL or CSV stream."""
+    if fmt == 'csv':
+        reader = csv.reader(stream)
+        next(reader, None)  # Header row
+        for row in reader:
+            if row:
+                yield row[0], [name for name in row[1:] if name]
+    else:
+        for i, line in enumerate(stream):
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record.get('id', i), record['beans']
+
+
+def write_results(results, stream, fmt='jsonl'):
+    """Writes (basket_id, recommendation, error) triples as JSONL or CSV."""
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(['id', 'recommendation', 'error'])
+        for basket_id, recommendation, error in results:
+            writer.writerow([basket_id, recommendation or '', error or ''])
+    else:
+        for basket_id, recommendation, error in results:
+            record = {'id': basket_id, 'recommendation': recommendation}
+            if error:
+                record['error'] = error
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def best_candidates(candidates, ratings):
+    """
+    Highest-rated candidate of each row, -1 for rows without candidates.
+    Ties go to the lowest bean ID, like the single-basket path.
+    """
+    valid = candidates >= 0
+    scores = np.where(valid, ratings[np.maximum(candidates, 0)], -np.inf)
+    best = scores.max(axis=1, keepdims=True)
+    ties = valid & (scores == best)
+    picked = np.where(ties, candidates, np.iinfo(np.int64).max).min(axis=1)
+    return np.where(valid.any(axis=1), picked, -1)
+
+
+def knn_batch(artifact, baskets, k=10, metric='euclidean'):
+    """
+    KNN recommendations for an array of baskets of the same size.
+    Larger baskets than two beans are ranked one by one with the neighbor votes of basket mode.
+
+    Parameters:
+        artifact (ModelArtifact): Model to recommend from.
+        baskets (ndarray): Bean IDs, shape (n_baskets, basket_size).
+
+    Returns:
+        ndarray: Recommended bean ID per basket, -1 if there is no recommendation.
+    """
+    unique_ids, inverse = np.unique(baskets, return_inverse=True)
+    if metric == 'euclidean' and k <= artifact.k:
+        neighbors = np.asarray(artifact.neighbors[unique_ids, :k], dtype=np.int64)
+    else:
+        neighbors, _ = artifact.engine().kneighbors(unique_ids, k=k, metric=metric)
+    neighbors = neighbors[inverse.reshape(baskets.shape)]  # (n_baskets, basket_size, k)
+
+    if baskets.shape[1] == 1:
+        first = neighbors[:, 0, :]
+        # Same tie rule as recommend_knn: first highest-rated neighbor in distance order
+        scores = np.where(first >= 0, artifact.ratings[np.maximum(first, 0)], -np.inf)
+        picked = first[np.arange(len(first)), scores.argmax(axis=1)]
+        return np.where((first >= 0).any(axis=1), picked, -1)
+
+    if baskets.shape[1] == 2:
+        first, second = neighbors[:, 0, :], neighbors[:, 1, :]
+        in_both = (first[:, :, None] == second[:, None, :]).any(axis=2) & (first >= 0)
+        from_overlap = best_candidates(np.where(in_both, first, -1), artifact.ratings)
+        from_union = best_candidates(np.concatenate([first, second], axis=1), artifact.ratings)
+        return np.where(in_both.any(axis=1), from_overlap, from_union)
+
+    picked = np.full(len(baskets), -1)
+    for i, (basket, basket_neighbors) in enumerate(zip(baskets, neighbors)):
+        _, first = np.unique(basket, return_index=True)  # A bean listed twice votes once
+        best_ids, _ = rank_neighbor_votes(basket_neighbors[first], basket, artifact.ratings, n=1)
+        if len(best_ids):
+            picked[i] = best_ids[0]
+    return picked
+
+
+def kmeans_batch(artifact, baskets):
+    """
+    KMeans recommendations for an array of baskets of the same size, see `knn_batch`.
+    A basket of m beans excludes at most m members per cluster, so the top m + 1 members
+    of each input cluster are the only candidates.
+    """
+    store = artifact.cluster_store()
+    n_baskets, size = baskets.shape
+    # Ascending cluster IDs, the tie order of ClusterStore.recommend
+    clusters = np.sort(store.bean_cluster[baskets], axis=1)
+    starts = store.offsets[clusters]
+    sizes = store.offsets[clusters + 1] - starts
+
+    ranks = np.arange(size + 1)
+    positions = starts[:, :, None] + ranks
+    candidates = np.where(ranks < sizes[:, :, None], store.members[np.minimum(positions, len(store.members) - 1)], -1)
+    candidates = candidates.reshape(n_baskets, -1)  # Cluster by cluster, best member first
+    excluded = (candidates[:, :, None] == baskets[:, None, :]).any(axis=2)
+    candidates = np.where(excluded, -1, candidates)
+
+    # First highest rating in cluster order, like ClusterStore.recommend
+    scores = np.where(candidates >= 0, store.ratings[np.maximum(candidates, 0)], -np.inf)
+    picked = candidates[np.arange(n_baskets), scores.argmax(axis=1)]
+    return np.where((candidates >= 0).any(axis=1), picked, -1)
+
+
+def recommend_chunk(chunk, model='knn', k=10, metric='euclidean'):
+    """
+    Recommends one bean for each basket of a chunk.
+
+    Parameters:
+        chunk (list): (basket_id, bean_names) pairs.
+        model (str): 'knn' or 'kmeans'.
+
+    Returns:
+        list: (basket_id, recommendation, error) triples in input order.
+    """
+    artifact = get_artifact()
+    results = [None] * len(chunk)
+    groups = {}
+    for i, (basket_id, names) in enumerate(chunk):
+        ids = [artifact.names.find(name) for name in names]
+        if not ids or None in ids:
+            unknown = [name for name, bean_id in zip(names, ids) if bean_id is None]
+            results[i] = (basket_id, None, f"unknown beans: {unknown}" if unknown else "empty basket")
+        else:
+            groups.setdefault(len(ids), []).append((i, ids))
+
+    for size, members in groups.items():
+        baskets = np.array([ids for _, ids in members], dtype=np.int64)
+        if model == 'knn':
+            picked = knn_batch(artifact, baskets, k=k, metric=metric)
+        else:
+            picked = kmeans_batch(artifact, baskets)
+        for (i, _), bean_id in zip(members, picked):
+            recommendation = artifact.names[int(bean_id)] if bean_id >= 0 else None
+            error = None if bean_id >= 0 else f"no recommendation for {size} beans"
+            results[i] = (chunk[i][0], recommendation, error)
+    return results
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def recommend_batch(baskets, model='knn', k=10, metric='euclidean', chunk_size=10000, workers=1):
+    """
+    Streams recommendations for an iterable of (basket_id, bean_names) pairs.
+
+    At most two chunks per worker are in flight, so memory stays flat whatever the input size.
+
+    Parameters:
+        baskets (iterable): (basket_id, bean_names) pairs, e.g. from `read_baskets`.
+        model (str): 'knn' or 'kmeans'.
+        k (int), metric (str): KNN neighborhood size and distance metric.
+        chunk_size (int): Baskets per chunk.
+        workers (int): Worker processes, 1 runs everything in this process.
+
+    Yields:
+        tuple: (basket_id, recommendation, error) in input order.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
+
+    chunks = chunked(baskets, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from recommend_chunk(chunk, model, k, metric)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(recommend_chunk, chunk, model, k, metric))
+            if len(pending) >= 2 * workers:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch coffee recommendations.")
+    parser.add_argument('--model', choices=MODELS, default='knn')
+    parser.add_argument('--input', default='-', help="Basket file, '-' for stdin")
+    parser.add_argument('--output', default='-', help="Result file, '-' for stdout")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default=None, help="Defaults to the input file extension")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--metric', default='euclidean')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.input.endswith('.csv') else 'jsonl')
+    source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        results = recommend_batch(
+            read_baskets(source, fmt), model=args.model, k=args.k, metric=args.metric,
+            chunk_size=args.chunk_size, workers=args.workers,
+        )
+        write_results(results, target, fmt)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+'''
+# Benchmarks
+Times the hot paths of the app outside a Streamlit session, on synthetic catalogs of 1k to 1M coffee beans:
+
+*   synthetic.py: catalog generator with the schema of `coffee_cleaned.csv` and the matching model artifact
+*   suite.py: artifact load time and RSS, single and two-bean query latency percentiles,
+    batch throughput, CSV parse time and chart rendering, written to a JSON results file
+
+Usage:
+    python -m benchmarks run --sizes 1000 10000 100000 --out results.json
+    python -m benchmarks compare baseline.json results.json
+'''
@@ -0,0 +1,58 @@
+import argparse
+import sys
+
+from benchmarks.load import FLOWS, run_load
+from benchmarks.suite import DATA_DIR, SECTIONS, compare, read_results, run_suite, write_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Coffee app benchmarks.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Benchmark synthetic catalogs")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    run_parser.add_argument('--only', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    run_parser.add_argument('--data-dir', default=DATA_DIR, help="Generated catalogs, reused across runs")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--out', default='benchmark_results.json')
+
+    load_parser = subparsers.add_parser('load', help="Load test the Streamlit pages with simulated users")
+    load_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    load_parser.add_argument('--duration', type=float, default=60, help="Seconds per concurrency level")
+    load_parser.add_argument('--flows', nargs='+', choices=list(FLOWS), default=list(FLOWS))
+    load_parser.add_argument('--size', type=int, help="Synthetic catalog size, the app's data by default")
+    load_parser.add_argument('--data-dir', default=DATA_DIR, help="Generated catalogs, reused across runs")
+    load_parser.add_argument('--seed', type=int, default=0)
+    load_parser.add_argument('--out', default='load_results.json')
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help="Relative change counted as a regression")
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        results = run_suite(args.sizes, args.only, data_dir=args.data_dir, seed=args.seed)
+        write_results(results, args.out)
+        print(f"wrote {args.out}")
+        return 0
+    if args.command == 'load':
+        results = run_load(args.concurrency, args.duration, args.flows, size=args.size, data_dir=args.data_dir,
+                           seed=args.seed)
+        write_results(results, args.out)
+        print(f"wrote {args.out}")
+        return 0
+
+    baseline, current = read_results(args.baseline), read_results(args.current)
+    print(f"{baseline['meta'].get('revision')} -> {current['meta'].get('revision')}")
+    regressions = 0
+    for size, metric, old, new, change, regressed in compare(baseline, current, args.threshold):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{size:>8} {metric:<32} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+'''
+# Load test
+Drives simulated users through the Streamlit pages at increasing concurrency, to size replicas from data.
+
+Every simulated user is a thread that keeps opening a new session (a Streamlit `AppTest`) and scripting one flow:
+
+*   recommendation: choose a model, pick one or two coffees, click "Get Recommendation"
+*   explorer: open the Dataset Explorer, switch between visualizations, pick features for the Feature Comparison
+
+`streamlit run` executes the script runs of all sessions as threads of one process, sharing the registry and chart
+caches, and so do the simulated users: the GIL, matplotlib and model loads contend like they do in one container.
+The websocket round trip and the browser are not part of the measurement.
+
+Every concurrency level runs in a fresh process, so the peak RSS is the level's own. Each level first runs every flow
+once (loading the dataset, the models and the plotting libraries), then the users for `duration` seconds. Reported
+per level:
+
+*   throughput: reruns and completed flows per second
+*   p50/p95/p99 rerun latency, overall and per flow
+*   errors: script runs that raised, the session is dropped and the user starts a new one
+*   peak RSS of the process
+
+Results use the format of `python -m benchmarks run` with the concurrency level in place of the catalog size,
+so two load runs can be compared with `python -m benchmarks compare`.
+
+Usage:
+    python -m benchmarks load --concurrency 1 2 4 8 16 --duration 60 --out load.json
+    python -m benchmarks load --flows recommendation --size 100000   # synthetic catalog instead of the app's data
+'''
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.suite import DATA_DIR, percentiles, revision, _use_artifact
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VIEWS = ("Overview", "Category Features", "Price Analysis", "Feature Comparison", "Fun Facts 🆕")
+MODELS = ("KNN Model", "KMeans Model")
+
+# A script run that takes longer fails its flow
+RUN_TIMEOUT = 300
+
+
+class Session:
+    """
+    One simulated browser session on a page, timing every rerun.
+
+    Parameters:
+        page (str): Page script, relative to the repository root.
+        record (callable): Called with the duration in seconds of every rerun.
+    """
+
+    def __init__(self, page, record):
+        from streamlit.testing.v1 import AppTest
+
+        # Pages only render under __main__, AppTest.from_file would run them under another name
+        self.app = AppTest.from_string(
+            f"import runpy; runpy.run_path({page!r}, run_name='__main__')", default_timeout=RUN_TIMEOUT
+        )
+        self.record = record
+
+    def rerun(self):
+        start = time.perf_counter()
+        self.app.run()
+        self.record(time.perf_counter() - start)
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+        return self.app
+
+    def button(self, label):
+        return next(button for button in self.app.sidebar.button if button.label == label)
+
+
+def recommendation_flow(record, rng):
+    """Model choice, one or two coffee picks, then "Get Recommendation": four or five reruns."""
+    session = Session('pages/recommendation.py', record)
+    app = session.rerun()
+    app.sidebar.radio[0].set_value(MODELS[rng.integers(len(MODELS))])
+    app = session.rerun()
+
+    first, second = app.sidebar.selectbox[0], app.sidebar.selectbox[1]
+    first.select_index(int(rng.integers(1, len(first.options))))
+    app = session.rerun()
+    if rng.random() < 0.5:
+        second.select_index(int(rng.integers(1, len(second.options))))
+        app = session.rerun()
+
+    session.button("Get Recommendation").click()
+    app = session.rerun()
+    if not app.success:
+        raise RuntimeError("no recommendation shown")
+
+
+def explorer_flow(record, rng):
+    """Opens the Dataset Explorer, visits three visualizations and compares two features: five reruns."""
+    session = Session('pages/dataset_explorer.py', record)
+    app = session.rerun()
+    for view in rng.choice(VIEWS[1:], size=2, replace=False):
+        app.sidebar.radio[0].set_value(str(view))
+        app = session.rerun()
+
+    app.sidebar.radio[0].set_value("Feature Comparison")
+    app = session.rerun()
+    x_axis, y_axis = app.selectbox[0], app.selectbox[1]
+    x_axis.select_index(int(rng.integers(len(x_axis.options))))
+    y_axis.select_index(int(rng.integers(len(y_axis.options))))
+    session.rerun()
+
+
+FLOWS = {
+    'recommendation': recommendation_flow,
+    'explorer': explorer_flow,
+}
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _silence_streamlit():
+    from streamlit import config
+    from streamlit.logger import set_log_level
+
+    # Bare script runs warn about the missing `streamlit run`; the config is parsed first, it would reset the level
+    config.get_option('logger.level')
+    set_log_level('error')
+
+
+def run_level(concurrency, duration, flows=tuple(FLOWS), catalog=None, seed=0):
+    """
+    Runs `concurrency` simulated users for `duration` seconds in this process.
+
+    Parameters:
+        concurrency (int): Simultaneous users.
+        duration (float): Seconds after the warm-up; flows in progress when it ends are finished.
+        flows (tuple): Names of the FLOWS the users pick from at random.
+        catalog (tuple): (csv_path, artifact_path) of a synthetic catalog, None for the app's data.
+        seed (int): Seed of the users' choices.
+
+    Returns:
+        dict: {metric: value} for the level.
+    """
+    os.chdir(ROOT)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    _silence_streamlit()
+    if catalog:
+        _use_artifact(*catalog)
+
+    warmup_start = time.perf_counter()
+    for name in flows:
+        FLOWS[name](lambda seconds: None, np.random.default_rng(seed))
+    warmup_seconds = time.perf_counter() - warmup_start
+
+    lock = threading.Lock()
+    latencies = {name: [] for name in flows}
+    counts = {'flows': 0, 'errors': 0}
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def user(user_seed):
+        rng = np.random.default_rng(user_seed)
+        while time.perf_counter() < deadline:
+            name = flows[rng.integers(len(flows))]
+            seconds = []
+            try:
+                FLOWS[name](seconds.append, rng)
+                ok = True
+            except Exception as exc:
+                ok = False
+                errors.append(f"{name}: {type(exc).__name__}: {exc}")
+            with lock:
+                latencies[name].extend(seconds)
+                counts['flows' if ok else 'errors'] += 1
+
+    start = time.perf_counter()
+    users = [threading.Thread(target=user, args=((seed, i),), daemon=True) for i in range(concurrency)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"{len(errors)} failed flow(s), first: {errors[0]}", file=sys.stderr)
+
+    reruns = [seconds for values in latencies.values() for seconds in values]
+    metrics = {
+        'reruns_per_s': len(reruns) / elapsed,
+        'flows_per_s': counts['flows'] / elapsed,
+        'errors': counts['errors'],
+        'warmup_s': warmup_seconds,
+        'peak_rss_mb': peak_rss() / 2**20,
+    }
+    if reruns:
+        metrics.update(percentiles('rerun', reruns))
+    for name, values in latencies.items():
+        if values:
+            metrics.update(percentiles(f'{name}_rerun', values))
+    return metrics
+
+
+def run_load(levels, duration=60, flows=tuple(FLOWS), size=None, data_dir=DATA_DIR, seed=0, log=print):
+    """
+    Runs `run_level` for every concurrency level, each in a fresh process.
+
+    Parameters:
+        levels (list): Concurrency levels.
+        size (int): Beans of a synthetic catalog (see benchmarks.synthetic), None for the app's data.
+
+    Returns:
+        dict: {'meta': {...}, 'results': {level: {metric: value}}}, like `benchmarks.suite.run_suite`.
+    """
+    catalog = None
+    if size:
+        from benchmarks.synthetic import write_catalog
+        catalog = write_catalog(data_dir, size, seed, log=log)
+
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for concurrency in levels:
+        with context.Pool(1) as pool:
+            metrics = pool.apply(run_level, (concurrency, duration, tuple(flows), catalog, seed))
+        results[str(concurrency)] = metrics
+        log(f"{concurrency:>4} users  {metrics['reruns_per_s']:6.1f} reruns/s  "
+            f"p50 {metrics.get('rerun_p50_ms', 0):7.0f} ms  p95 {metrics.get('rerun_p95_ms', 0):7.0f} ms  "
+            f"p99 {metrics.get('rerun_p99_ms', 0):7.0f} ms  peak RSS {metrics['peak_rss_mb']:6.0f} MB  "
+            f"errors {metrics['errors']}")
+
+    meta = {
+        'revision': revision(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'kind': 'load',
+        'flows': list(flows),
+        'duration_s': duration,
+        'catalog_size': size,
+        'cpus': os.cpu_count(),
+        'seed': seed,
+    }
+    return {'meta': meta, 'results': results}
@@ -0,0 +1,275 @@
+'''
+# Benchmark suite
+Times every hot path in isolation on synthetic catalogs and writes the results as JSON:
+
+*   load: artifact load time and RSS growth, measured in a fresh process
+*   query: latency percentiles of `recommend_knn` / `recommend_kmeans` for one and two beans, and of
+    `recommend_basket` (top 10) for baskets of 5, 20 and 50 beans
+*   batch: baskets per second of `batch.recommend_batch`
+*   csv: CSV parse time and the load time of the typed dataset cache
+*   charts: explorer scatter plot and `visuals.plot_feature_comparison` render time
+
+Results are flat {metric: value} dictionaries per catalog size, so two result files can be compared
+metric by metric. Metrics ending in `_per_s` are better when higher, all others when lower.
+'''
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_catalog
+
+DATA_DIR = os.path.join(os.environ.get('COFFEE_CACHE_DIR', './.cache'), 'benchmarks')
+# Basket sizes of the basket-mode query benchmark
+BASKET_SIZES = (5, 20, 50)
+
+SECTIONS = ('load', 'query', 'batch', 'csv', 'charts')
+PERCENTILES = (50, 95, 99)
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak instead of current RSS, in bytes on macOS and KiB elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentiles(prefix, seconds):
+    values = np.percentile(np.asarray(seconds) * 1000, PERCENTILES)
+    return {f"{prefix}_p{p}_ms": float(v) for p, v in zip(PERCENTILES, values)}
+
+
+def _load_probe(artifact_path):
+    # Runs in a fresh process, so the RSS growth is the artifact's alone
+    from artifacts import load_artifact
+    rss = current_rss()
+    start = time.perf_counter()
+    artifact = load_artifact(artifact_path)
+    load_seconds = time.perf_counter() - start
+    load_rss = current_rss() - rss
+
+    start = time.perf_counter()
+    bean_id = artifact.names.find(artifact.names[0])
+    artifact.cluster_store().recommend([bean_id])
+    first_query_seconds = time.perf_counter() - start
+    return load_seconds, load_rss, first_query_seconds, current_rss() - rss
+
+
+def bench_load(csv_path, artifact_path, repeat=5):
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        with context.Pool(1) as pool:
+            runs.append(pool.apply(_load_probe, (artifact_path,)))
+    load_seconds, load_rss, first_query_seconds, query_rss = np.median(np.array(runs), axis=0)
+    size = sum(entry.stat().st_size for entry in os.scandir(artifact_path) if entry.is_file())
+    return {
+        'artifact_size_mb': size / 2**20,
+        'artifact_load_ms': load_seconds * 1000,
+        'artifact_load_rss_mb': load_rss / 2**20,
+        'artifact_first_query_ms': first_query_seconds * 1000,
+        'artifact_first_query_rss_mb': query_rss / 2**20,
+    }
+
+
+def _use_artifact(csv_path, artifact_path):
+    """Points the registry at a synthetic catalog."""
+    import registry
+    registry.DATASET_PATH = csv_path
+    registry.ARTIFACT_PATH = artifact_path
+    registry.invalidate()
+    return registry.get_artifact()
+
+
+def bench_query(csv_path, artifact_path, n_queries=1000, seed=0):
+    from recommendation import recommend_basket, recommend_kmeans, recommend_knn
+    artifact = _use_artifact(csv_path, artifact_path)
+    rng = np.random.default_rng(seed)
+    names = [artifact.names[int(i)] for i in rng.integers(0, len(artifact), 2 * n_queries)]
+    baskets = {
+        'single': [[name] for name in names[:n_queries]],
+        'pair': [names[i:i + 2] for i in range(0, 2 * n_queries, 2)],
+    }
+    for size in BASKET_SIZES:
+        # Fewer queries for the larger baskets, they are only compared with each other
+        ids = rng.integers(0, len(artifact), (n_queries // 5, size))
+        baskets[f'basket{size}'] = [[artifact.names[int(i)] for i in row] for row in ids]
+
+    results = {}
+    for model, recommend in (('knn', recommend_knn), ('kmeans', recommend_kmeans)):
+        for kind, inputs in baskets.items():
+            query = partial(recommend_basket, model=model, n=10) if kind.startswith('basket') else recommend
+            for basket in inputs[:20]:  # Warm-up
+                query(basket)
+            seconds = []
+            for basket in inputs:
+                start = time.perf_counter()
+                query(basket)
+                seconds.append(time.perf_counter() - start)
+            results.update(percentiles(f"{model}_{kind}", seconds))
+    return results
+
+
+def bench_batch(csv_path, artifact_path, n_baskets=20000, seed=0):
+    from batch import recommend_batch
+    artifact = _use_artifact(csv_path, artifact_path)
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, len(artifact), (n_baskets, 2))
+    sizes = rng.integers(1, 3, n_baskets)
+    baskets = [(i, [artifact.names[int(b)] for b in ids[i, :sizes[i]]]) for i in range(n_baskets)]
+
+    results = {}
+    for model in ('knn', 'kmeans'):
+        start = time.perf_counter()
+        for _ in recommend_batch(baskets, model=model):
+            pass
+        results[f"batch_{model}_baskets_per_s"] = n_baskets / (time.perf_counter() - start)
+    return results
+
+
+def bench_csv(csv_path, artifact_path):
+    from dataset import load_dataset, parse_csv
+    start = time.perf_counter()
+    parse_csv(csv_path)
+    parse_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        load_dataset(csv_path, cache_dir=cache_dir)  # Writes the cache
+        start = time.perf_counter()
+        load_dataset(csv_path, cache_dir=cache_dir)
+        cached_seconds = time.perf_counter() - start
+    return {'csv_parse_ms': parse_seconds * 1000, 'dataset_cached_load_ms': cached_seconds * 1000}
+
+
+def bench_charts(csv_path, artifact_path, repeat=3):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from streamlit import config
+    from streamlit.logger import set_log_level
+
+    # st.pyplot warns outside `streamlit run`; the config is parsed first, it would reset the level
+    config.get_option('logger.level')
+    set_log_level('error')
+
+    from charts import feature_scatter, to_png
+    from dataset import parse_csv
+    from catalog_index import CatalogIndex
+    from visuals import plot_feature_comparison
+
+    df = parse_csv(csv_path)
+    catalog = CatalogIndex(df)
+    names = df['name'].head(3).tolist()
+
+    scatter, comparison = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        to_png(feature_scatter(df, 'aroma', 'rating'))
+        scatter.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        plot_feature_comparison(names[:2], names[2], catalog)
+        comparison.append(time.perf_counter() - start)
+        plt.close('all')
+    return {
+        'chart_feature_scatter_ms': float(np.median(scatter)) * 1000,
+        'chart_feature_comparison_ms': float(np.median(comparison)) * 1000,
+    }
+
+
+BENCHMARKS = {
+    'load': bench_load,
+    'query': bench_query,
+    'batch': bench_batch,
+    'csv': bench_csv,
+    'charts': bench_charts,
+}
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, sections=SECTIONS, data_dir=DATA_DIR, seed=0, log=print):
+    """
+    Runs the benchmark sections on a synthetic catalog of every size.
+
+    Parameters:
+        sizes (list): Catalog sizes in beans.
+        sections (list): Names of the BENCHMARKS to run.
+        data_dir (str): Directory of the generated catalogs, reused across runs.
+        seed (int): Catalog and query seed.
+
+    Returns:
+        dict: {'meta': {...}, 'results': {size: {metric: value}}}
+    """
+    results = {}
+    for size in sizes:
+        csv_path, artifact_path = write_catalog(data_dir, size, seed, log=log)
+        metrics = results[str(size)] = {}
+        for section in sections:
+            start = time.perf_counter()
+            metrics.update(BENCHMARKS[section](csv_path, artifact_path))
+            log(f"{size:>8} {section:<7} {time.perf_counter() - start:.1f}s")
+
+    meta = {
+        'revision': revision(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': seed,
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Relative change of every metric present in both result sets.
+
+    Returns:
+        list: (size, metric, old, new, change, regressed) rows, change is new / old - 1.
+            A metric regressed when it got worse by more than `threshold`.
+    """
+    rows = []
+    for size, metrics in current['results'].items():
+        old_metrics = baseline['results'].get(size, {})
+        for metric, new in metrics.items():
+            old = old_metrics.get(metric)
+            if old is None:
+                continue
+            change = new / old - 1 if old else 0.0
+            worse = -change if metric.endswith('_per_s') else change
+            rows.append((size, metric, old, new, change, worse > threshold))
+    return rows
+
+
+def write_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
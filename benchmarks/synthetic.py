@@ -0,0 +1,129 @@
+'''
+# Synthetic catalogs
+Generates coffee catalogs of any size with the columns of `coffee_cleaned.csv`, so the benchmarks can
+run at sizes the real dataset does not reach.
+
+Beans are drawn around latent flavor profiles: the five flavor scores are integer scores around the
+profile of the bean's cluster, and the rating follows the scores. The latent profile is stored as the
+`cluster` column, standing in for the notebook's KMeans labels. Every catalog is generated from a seed,
+so the same size and seed always give the same catalog.
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from artifacts import build_artifact, save_artifact
+from similarity import NUMERICAL_FEATURES, PROCESSED_COUNTRIES
+
+ROASTS = ['Light', 'Medium-Light', 'Medium', 'Medium-Dark', 'Dark']
+ROAST_WEIGHTS = [0.2, 0.4, 0.25, 0.1, 0.05]
+
+# Roaster countries with a city, weighted roughly like the reviews
+ROASTER_LOCATIONS = {
+    'USA': ('Portland, Oregon', 0.6),
+    'Taiwan': ('Taipei, Taiwan', 0.15),
+    'Hong Kong': ('Kowloon, Hong Kong', 0.05),
+    'Canada': ('Toronto, Canada', 0.05),
+    'China': ('Shanghai, China', 0.05),
+    'Guatemala': ('Antigua, Guatemala', 0.03),
+    'Japan': ('Kyoto, Japan', 0.03),
+    'Australia': ('Melbourne, Australia', 0.02),
+    'England': ('London, England', 0.02),
+}
+
+ORIGINS = {
+    'Ethiopia': 'Yirgacheffe', 'Kenya': 'Nyeri', 'Colombia': 'Huila', 'Guatemala': 'Antigua',
+    'Panama': 'Boquete', 'Costa Rica': 'Tarrazu', 'Brazil': 'Cerrado', 'Indonesia': 'Sumatra',
+    'Rwanda': 'Nyamasheke', 'Yemen': 'Haraz', 'Honduras': 'Santa Barbara', 'Peru': 'Cajamarca',
+}
+
+# Beans per latent flavor profile, and the bounds on the number of profiles (the KMeans clusters of the catalog).
+BEANS_PER_CLUSTER = 20
+MIN_CLUSTERS, MAX_CLUSTERS = 10, 1000
+
+# From this size on the neighbor lists are built with the IVF index instead of exact search
+IVF_THRESHOLD = 50000
+IVF_NPROBE = 4
+
+
+def n_clusters_for(n_beans):
+    return int(np.clip(n_beans // BEANS_PER_CLUSTER, MIN_CLUSTERS, MAX_CLUSTERS))
+
+
+def make_catalog(n_beans, seed=0):
+    """
+    Generates a synthetic cleaned coffee dataset.
+
+    Parameters:
+        n_beans (int): Number of coffee beans.
+        seed (int): Random seed.
+
+    Returns:
+        DataFrame: One row per bean with the columns of `coffee_cleaned.csv`.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = n_clusters_for(n_beans)
+
+    clusters = rng.integers(0, n_clusters, n_beans)
+    profiles = rng.uniform(5.0, 9.5, (n_clusters, len(NUMERICAL_FEATURES)))
+    scores = np.clip(np.rint(profiles[clusters] + rng.normal(0.0, 0.8, (n_beans, len(NUMERICAL_FEATURES)))), 1, 10)
+    rating = np.clip(np.rint(70 + 2.5 * scores.mean(axis=1) + rng.normal(0.0, 1.5, n_beans)), 75, 98)
+
+    countries = list(ROASTER_LOCATIONS)
+    weights = np.array([weight for _, weight in ROASTER_LOCATIONS.values()])
+    country = np.array(countries)[rng.choice(len(countries), n_beans, p=weights / weights.sum())]
+    location = pd.Series(country).map({c: location for c, (location, _) in ROASTER_LOCATIONS.items()})
+
+    origin_names = list(ORIGINS)
+    origin_country = np.array(origin_names)[rng.integers(0, len(origin_names), n_beans)]
+    origin = pd.Series(origin_country).map({c: f"{region}, {c}" for c, region in ORIGINS.items()})
+
+    # Prices per 12 ounce bag, log-normal like the reviews
+    bag_price = np.round(np.exp(rng.normal(3.0, 0.4, n_beans)), 2)
+    price_per_ounce = bag_price / 12
+
+    width = len(str(n_beans - 1))
+    ids = np.char.zfill(np.arange(n_beans).astype(str), width)
+    df = pd.DataFrame({
+        'name': pd.Series(origin_country).str.cat([f"Lot {i}" for i in ids], sep=' '),
+        'roaster': [f"Roaster {r}" for r in rng.integers(0, max(1, n_beans // 10), n_beans)],
+        'roast': np.array(ROASTS)[rng.choice(len(ROASTS), n_beans, p=ROAST_WEIGHTS)],
+        'location': location,
+        'origin': origin,
+        'est_price': [f"${price:.2f}/12 ounces" for price in bag_price],
+        **{feature: scores[:, i] for i, feature in enumerate(NUMERICAL_FEATURES)},
+        'rating': rating,
+        'country': country,
+        'price_per_ounce': price_per_ounce,
+        'origin_country': origin_country,
+        'country_processed': np.where(np.isin(country, PROCESSED_COUNTRIES), country, 'Others'),
+        'price_per_ounce_log': np.log(price_per_ounce),
+        'cluster': clusters.astype(np.int32),
+    })
+    return df
+
+
+def write_catalog(directory, n_beans, seed=0, log=print):
+    """
+    Writes a synthetic catalog as `coffee_cleaned.csv` and its model artifact, unless they already exist.
+
+    Returns:
+        tuple: (csv_path, artifact_path)
+    """
+    path = os.path.join(directory, f"{n_beans}-{seed}")
+    csv_path = os.path.join(path, 'coffee_cleaned.csv')
+    artifact_path = os.path.join(path, 'coffee_model')
+    if os.path.exists(csv_path) and os.path.exists(os.path.join(artifact_path, 'manifest.json')):
+        return csv_path, artifact_path
+
+    log(f"generating {n_beans} beans in {path}")
+    os.makedirs(path, exist_ok=True)
+    df = make_catalog(n_beans, seed)
+    nprobe = IVF_NPROBE if n_beans >= IVF_THRESHOLD else None
+    save_artifact(artifact_path, build_artifact(df, nprobe=nprobe))
+    # The CSV is written last, it marks the catalog as complete
+    df.to_csv(f"{csv_path}.tmp", index=False)
+    os.replace(f"{csv_path}.tmp", csv_path)
+    return csv_path, artifact_path
@@ -0,0 +1,71 @@
+'''
+# Catalog index
+Maps every coffee bean name to its row in the dataset and keeps the columns used by the
+recommendation page and the comparison charts as aligned arrays, so per-bean lookups are O(1)
+instead of a boolean scan over the whole DataFrame.
+'''
+
+import numpy as np
+import pandas as pd
+
+FLAVOR_FEATURES = ['aroma', 'acid', 'body', 'flavor', 'aftertaste']
+CATEGORY_FEATURES = ['roast', 'country']
+
+
+class CatalogIndex:
+    """
+    Row index over the coffee dataset.
+
+    Parameters:
+        df (DataFrame): Coffee dataset, one row per coffee bean.
+    """
+
+    def __init__(self, df):
+        self.names = df['name'].to_numpy(dtype=object)
+        # Like df[df['name'] == name].iloc[0], the first row wins for duplicated names
+        self.name_to_row = {}
+        for row, name in enumerate(self.names):
+            self.name_to_row.setdefault(name, row)
+
+        self.features = np.ascontiguousarray(
+            df[FLAVOR_FEATURES].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+        )
+        self.ratings = pd.to_numeric(df['rating'], errors='coerce').to_numpy(dtype=np.float32)
+
+        # Categories as integer codes plus one lookup table per column
+        self.category_codes = {}
+        self.category_values = {}
+        for col in CATEGORY_FEATURES:
+            categorical = pd.Categorical(df[col])
+            self.category_codes[col] = categorical.codes
+            self.category_values[col] = np.append(np.asarray(categorical.categories, dtype=object), None)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.name_to_row
+
+    def row(self, name):
+        """Row ID of a coffee bean, None if the name is not in the dataset."""
+        return self.name_to_row.get(name)
+
+    def rows(self, names):
+        """Row IDs of the known names, unknown names are skipped."""
+        return np.array([self.name_to_row[n] for n in names if n in self.name_to_row], dtype=np.int64)
+
+    def flavor_features(self, rows):
+        """Flavor scores of the given rows, shape (len(rows), 5)."""
+        return self.features[rows]
+
+    def category(self, col, rows):
+        """Values of a categorical column for the given rows (None for missing values)."""
+        # Code -1 (missing) indexes the trailing None entry
+        return self.category_values[col][self.category_codes[col][rows]]
+
+    def record(self, name, columns=CATEGORY_FEATURES):
+        """Dict of the categorical columns of one coffee bean, None if the name is unknown."""
+        row = self.row(name)
+        if row is None:
+            return None
+        return {col: self.category_values[col][self.category_codes[col][row]] for col in columns}
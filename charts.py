@@ -0,0 +1,367 @@
+'''
+# Chart cache
+Rendered Dataset Explorer charts, shared by all sessions.
+
+*   Every chart is drawn on its own `matplotlib.figure.Figure`, never through the global pyplot state,
+    so charts can be rendered from several threads at once.
+*   Charts are cached as PNG bytes under (dataset version, chart id, parameters), so a chart is drawn
+    once per dataset version instead of on every rerun. The cache evicts the least recently used charts
+    when it holds more than CACHE_BYTES.
+*   `prewarm` renders the static charts in a background thread, so the first visit of a tab is fast too.
+*   matplotlib and seaborn are imported when the first chart is drawn, importing this module is cheap.
+*   Above DENSITY_THRESHOLD beans the scatter plots (Price vs. Rating, Feature Comparison) draw the bean density on a
+    GRID_BINS x GRID_BINS grid instead of one marker per bean, so their cost depends on the grid, not the catalog.
+    The binned grids of the current dataset are cached per feature pair.
+'''
+
+import io
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from registry import get_dataset, version
+from tracing import span
+
+CACHE_BYTES = int(os.environ.get('COFFEE_CHART_CACHE_BYTES', 64 * 1024 * 1024))
+DPI = 200  # Same resolution as st.pyplot
+
+NUMERIC_FEATURES = ['aroma', 'acid', 'body', 'flavor', 'aftertaste']
+
+# Scatter plots of more beans are drawn as a density grid, COFFEE_DENSITY_THRESHOLD=0 always draws the points
+DENSITY_THRESHOLD = int(os.environ.get('COFFEE_DENSITY_THRESHOLD', 20000))
+GRID_BINS = 100
+
+
+def use_density(df):
+    """Whether the scatter plots of `df` are drawn as a density grid."""
+    return 0 < DENSITY_THRESHOLD < len(df)
+
+
+def grid_edges(values, bins=GRID_BINS):
+    """Bin edges over the range of `values`, one bin per value for small integer ranges such as the 1-10 scores."""
+    low, high = float(values.min()), float(values.max())
+    if high - low < bins and np.array_equal(values, np.round(values)):
+        return np.arange(low - 0.5, high + 1.5)
+    if high == low:
+        high = low + 1.0
+    return np.linspace(low, high, bins + 1)
+
+
+class GridCache:
+    """
+    2-D histograms of feature pairs of one DataFrame, the most recent one asked for.
+    A new dataset version replaces the grids of the previous one, so the cache holds at most one grid per pair.
+    The grid of (y, x) is the transposed grid of (x, y).
+    """
+
+    def __init__(self):
+        self._df = None  # Weak reference, the cache does not keep a replaced dataset alive
+        self._grids = {}
+        self._lock = threading.Lock()
+
+    def get(self, df, x, y, bins=GRID_BINS):
+        """
+        Returns:
+            tuple: (counts, x_edges, y_edges), counts[i, j] is the number of beans in x bin i and y bin j.
+        """
+        pair = tuple(sorted((x, y)))
+        key = (pair, bins)
+        with self._lock:
+            if self._df is None or self._df() is not df:
+                self._df = weakref.ref(df)
+                self._grids = {}
+            grids = self._grids
+            grid = grids.get(key)
+        if grid is None:
+            grid = self._bin(df, *pair, bins)
+            with self._lock:
+                grids[key] = grid
+        if pair == (x, y):
+            return grid
+        counts, first_edges, second_edges = grid
+        return counts.T, second_edges, first_edges
+
+    @staticmethod
+    def _bin(df, x, y, bins):
+        values = df[[x, y]].to_numpy(dtype=np.float64)
+        values = values[~np.isnan(values).any(axis=1)]
+        if not len(values):
+            return np.zeros((1, 1)), np.array([0.0, 1.0]), np.array([0.0, 1.0])
+        x_edges, y_edges = grid_edges(values[:, 0], bins), grid_edges(values[:, 1], bins)
+        counts, _, _ = np.histogram2d(values[:, 0], values[:, 1], bins=(x_edges, y_edges))
+        return counts, x_edges, y_edges
+
+
+_grids = GridCache()
+
+
+def scatter_or_density(df, x, y, ax):
+    """Draws `y` against `x`: one marker per bean, or the bean density on a grid for large datasets."""
+    if not use_density(df):
+        import seaborn as sns
+        sns.scatterplot(data=df, x=x, y=y, ax=ax)
+        return
+    from matplotlib.colors import LogNorm
+    counts, x_edges, y_edges = _grids.get(df, x, y)
+    mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), norm=LogNorm(), cmap='viridis')
+    ax.figure.colorbar(mesh, ax=ax, label="Coffee beans")
+
+
+def new_figure(figsize):
+    """A figure outside the pyplot state machine, matplotlib is only imported here."""
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+
+# Charts, each draws one figure from the dataset and its parameters
+
+def rating_distribution(df):
+    import seaborn as sns
+    fig = new_figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.histplot(df['rating'], bins=20, kde=True, ax=ax)
+    ax.set_title("Distribution of Coffee Ratings")
+    ax.set_xlabel("Rating")
+    ax.set_ylabel("Frequency")
+    return fig
+
+
+def feature_distributions(df):
+    import seaborn as sns
+    fig = new_figure(figsize=(15, 15))
+    axes = fig.subplots(3, 2).ravel()  # Adjusted to fit 6 plots
+
+    # Plot numeric features
+    for idx, feature in enumerate(NUMERIC_FEATURES):
+        sns.histplot(data=df, x=feature, ax=axes[idx])
+        axes[idx].set_title(f'{feature.capitalize()} Distribution')
+
+    # Plot roast type distribution
+    ax = axes[len(NUMERIC_FEATURES)]
+    sns.countplot(data=df, x='roast', ax=ax)
+    ax.set_title("Count of Coffee Beans by Roast Type")
+    ax.set_xlabel("Roast Type")
+    ax.set_ylabel("Count")
+    fig.tight_layout()
+    return fig
+
+
+def price_distribution(df):
+    import seaborn as sns
+    fig = new_figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.histplot(df['price_per_ounce'], bins=20, kde=True, ax=ax)
+    ax.set_title("Distribution of Coffee Price per Ounce")
+    ax.set_xlabel("Price (USD/Ounce)")
+    ax.set_ylabel("Frequency")
+    return fig
+
+
+def price_vs_rating(df):
+    fig = new_figure(figsize=(10, 6))
+    ax = fig.subplots()
+    scatter_or_density(df, 'price_per_ounce', 'rating', ax)
+    ax.set_title("Relationship between Price and Rating")
+    ax.set_xlabel("Price (USD/Ounce)")
+    ax.set_ylabel("Rating")
+    return fig
+
+
+def price_by_roast(df):
+    import seaborn as sns
+    fig = new_figure(figsize=(12, 6))
+    ax = fig.subplots()
+    average_price_by_roast = df.groupby('roast', observed=True)['price_per_ounce'].mean()
+    sns.barplot(x=average_price_by_roast.index, y=average_price_by_roast.values, ax=ax)
+    ax.set_title("Average Price by Roast Type")
+    ax.set_xlabel("Roast Type")
+    ax.set_ylabel("Average Price (USD/Ounce)")
+    ax.tick_params(axis='x', labelrotation=45)
+    return fig
+
+
+def price_correlation(df):
+    import seaborn as sns
+    fig = new_figure(figsize=(12, 8))
+    ax = fig.subplots()
+    correlation_matrix = df[['price_per_ounce', 'rating', 'aroma', 'acid', 'body', 'flavor']].corr()
+    sns.heatmap(correlation_matrix, annot=True, fmt=".2f", cmap='coolwarm', square=True, ax=ax)
+    ax.set_title("Correlation of Price with Other Features")
+    return fig
+
+
+def country_counts(df):
+    fig = new_figure(figsize=(10, 6))
+    ax = fig.subplots()
+    df['country'].value_counts().plot(kind='bar', ax=ax)
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+    fig.tight_layout()
+    return fig
+
+
+def roast_counts(df):
+    fig = new_figure(figsize=(8, 6))
+    ax = fig.subplots()
+    df['roast'].value_counts().plot(kind='pie', autopct='%1.1f%%', ax=ax)
+    ax.set_title('Distribution of Roast Types')
+    return fig
+
+
+def top_origins(df):
+    import seaborn as sns
+    fig = new_figure(figsize=(12, 6))
+    ax = fig.subplots()
+    top = df['origin'].value_counts().head(10).reset_index()  # Get the top 10 origins
+    top.columns = ['origin', 'count']  # Rename columns for clarity
+    sns.barplot(data=top, x='origin', y='count', palette='viridis', hue='origin', legend=False, ax=ax)
+    ax.set_title("Count of Coffee Beans by Origin (Top 10)")
+    ax.set_xlabel("Origin")
+    ax.set_ylabel("Count")
+    ax.tick_params(axis='x', labelrotation=45)
+    return fig
+
+
+def feature_scatter(df, x, y):
+    fig = new_figure(figsize=(10, 6))
+    ax = fig.subplots()
+    scatter_or_density(df, x, y, ax)
+    ax.set_title(f"{x} vs. {y}")
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return fig
+
+
+CHARTS = {
+    'rating_distribution': rating_distribution,
+    'feature_distributions': feature_distributions,
+    'price_distribution': price_distribution,
+    'price_vs_rating': price_vs_rating,
+    'price_by_roast': price_by_roast,
+    'price_correlation': price_correlation,
+    'country_counts': country_counts,
+    'roast_counts': roast_counts,
+    'top_origins': top_origins,
+    'feature_scatter': feature_scatter,
+}
+
+# Charts without parameters, rendered ahead of time by `prewarm`
+STATIC_CHARTS = [name for name in CHARTS if name != 'feature_scatter']
+
+
+def to_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """
+    LRU cache of rendered charts bounded by their total size in bytes.
+    Concurrent requests for a chart that is being rendered wait for that render.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rendering = {}
+
+    def get(self, key, render):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            done = self._rendering.get(key)
+            if done is None:
+                self.misses += 1
+                done = self._rendering[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            done.wait()
+            with self._lock:
+                if key in self.entries:
+                    return self.entries[key]
+            return self.get(key, render)  # The render failed, try again
+
+        try:
+            data = render()
+            with self._lock:
+                self._put(key, data)
+            return data
+        finally:
+            with self._lock:
+                del self._rendering[key]
+            done.set()
+
+    def _put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+_cache = ChartCache()
+
+
+def chart(chart_id, **params):
+    """
+    PNG bytes of a chart of the current dataset, rendered at most once per dataset version.
+
+    Parameters:
+        chart_id (str): Name of the chart in CHARTS.
+        params: Chart parameters, part of the cache key.
+    """
+    key = (version('dataset'), chart_id, tuple(sorted(params.items())))
+    with span(f'chart.{chart_id}'):
+        return _cache.get(key, lambda: to_png(CHARTS[chart_id](get_dataset(), **params)))
+
+
+# Chart IDs -> dataset version they were last rendered for, older versions are not kept
+_prewarmed = {}
+_prewarm_lock = threading.Lock()
+_prewarm_thread = None
+
+
+def render_static(chart_ids=None):
+    """
+    Renders the static charts of the current dataset into the cache, once per dataset version.
+    Concurrent calls share the renders through the chart cache, a failed render is retried by the next call.
+    """
+    chart_ids = tuple(STATIC_CHARTS if chart_ids is None else chart_ids)
+    dataset_version = version('dataset')
+    with _prewarm_lock:
+        if _prewarmed.get(chart_ids) == dataset_version:
+            return
+    for chart_id in chart_ids:
+        chart(chart_id)
+    with _prewarm_lock:
+        _prewarmed[chart_ids] = dataset_version
+
+
+def prewarm(chart_ids=None):
+    """
+    `render_static` in a background thread. The caller does not wait for the dataset either,
+    so pages can call this on every run.
+    """
+    global _prewarm_thread
+    with _prewarm_lock:
+        if _prewarm_thread is not None and _prewarm_thread.is_alive():
+            return _prewarm_thread
+        _prewarm_thread = threading.Thread(target=render_static, args=(chart_ids,), name='chart-prewarm', daemon=True)
+        _prewarm_thread.start()
+        return _prewarm_thread
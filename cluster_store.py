@@ -0,0 +1,116 @@
+'''
+# Cluster store
+Compact, cluster-indexed layout of the KMeans model.
+Instead of keeping, for every coffee bean, a copy of all other members of its cluster,
+the members of all clusters are stored once in a single array, grouped by cluster and
+sorted by rating (highest first). `offsets[c]:offsets[c + 1]` is the slice of cluster c.
+'''
+
+import numpy as np
+
+
+class ClusterStore:
+    """
+    Cluster membership of every coffee bean, stored as flat integer arrays.
+
+    Parameters:
+        bean_cluster (array-like): Cluster ID of each coffee bean, indexed by bean ID.
+        ratings (array-like): Rating of each coffee bean, indexed by bean ID.
+    """
+
+    def __init__(self, bean_cluster, ratings, offsets=None, members=None):
+        self.bean_cluster = np.asarray(bean_cluster, dtype=np.int32)
+        self.ratings = np.asarray(ratings, dtype=np.float32)
+
+        if offsets is None or members is None:
+            # Sort by cluster, then by rating descending; lexsort is stable so ties keep bean order
+            members = np.lexsort((-self.ratings, self.bean_cluster)).astype(np.int32)
+            counts = np.bincount(self.bean_cluster, minlength=self.bean_cluster.max() + 1)
+            offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.members = np.asarray(members, dtype=np.int32)
+
+    @classmethod
+    def from_clusters_dict(cls, clusters_dict, name_to_id):
+        """
+        Converts the notebook's `clusters_dict` export into a ClusterStore.
+
+        Parameters:
+            clusters_dict (dict): Bean name -> {"cluster", "neighbors", "ratings"}.
+            name_to_id (dict): Bean name -> bean ID used by the rest of the application.
+        """
+        n_beans = len(name_to_id)
+        bean_cluster = np.full(n_beans, -1, dtype=np.int32)
+        ratings = np.full(n_beans, np.nan, dtype=np.float32)
+        for name, entry in clusters_dict.items():
+            bean_cluster[name_to_id[name]] = entry["cluster"]
+            # A bean's own rating is only stored in the neighbor lists of the other members
+            for neighbor, rating in zip(entry["neighbors"], entry["ratings"]):
+                ratings[name_to_id[neighbor]] = rating
+        if (bean_cluster < 0).any():
+            raise ValueError("clusters_dict does not cover every coffee bean")
+        return cls(bean_cluster, np.nan_to_num(ratings, nan=-np.inf))
+
+    @property
+    def n_clusters(self):
+        return len(self.offsets) - 1
+
+    def cluster_members(self, cluster_id):
+        """Returns the bean IDs in a cluster, highest rated first."""
+        return self.members[self.offsets[cluster_id]:self.offsets[cluster_id + 1]]
+
+    def best_in_clusters(self, cluster_ids, exclude_ids=()):
+        """
+        Finds the highest-rated coffee bean in the given clusters, skipping excluded beans.
+
+        Each cluster is already sorted by rating, so at most len(exclude_ids) entries are
+        skipped per cluster regardless of the cluster size.
+
+        Returns:
+            int or None: Bean ID of the best coffee, None if every candidate is excluded.
+        """
+        exclude = set(int(i) for i in exclude_ids)
+        best_id = None
+        for cluster_id in cluster_ids:
+            for bean_id in self.cluster_members(cluster_id)[:len(exclude) + 1]:
+                if int(bean_id) not in exclude:
+                    if best_id is None or self.ratings[bean_id] > self.ratings[best_id]:
+                        best_id = int(bean_id)
+                    break
+        return best_id
+
+    def rank(self, input_ids, n=10):
+        """
+        Top `n` coffee beans in the clusters of a basket of any size, excluding the basket.
+
+        A candidate scores the share of basket beans in its cluster, ties go to the higher rating and then
+        to the lower cluster ID, like `recommend`. Only basket beans of the same cluster can be skipped,
+        so the first n + (basket beans in the cluster) members of each cluster are the only candidates and the
+        cost does not depend on the cluster sizes.
+
+        Returns:
+            tuple: (bean_ids, scores) arrays, best first.
+        """
+        input_ids = np.asarray(input_ids, dtype=np.int64)
+        basket_clusters = self.bean_cluster[input_ids]
+        # Distinct clusters in ID order, with the number of basket beans in each
+        clusters, counts = np.unique(basket_clusters, return_counts=True)
+
+        starts = self.offsets[clusters]
+        sizes = np.minimum(self.offsets[clusters + 1] - starts, n + counts)
+        positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        candidates = self.members[positions].astype(np.int64)
+        scores = np.repeat(counts / len(input_ids), sizes)
+
+        keep = ~np.isin(candidates, input_ids)
+        candidates, scores = candidates[keep], scores[keep]
+        best = np.lexsort((np.arange(len(candidates)), -self.ratings[candidates], -scores))[:n]
+        return candidates[best], scores[best]
+
+    def recommend(self, input_ids):
+        """
+        Highest-rated coffee bean in the clusters of the input beans, excluding the inputs.
+        Ties go to the lower cluster ID, so the order of the inputs does not matter.
+        """
+        input_clusters = np.unique(self.bean_cluster[np.asarray(input_ids, dtype=np.int64)])
+        return self.best_in_clusters(input_clusters, exclude_ids=input_ids)
@@ -0,0 +1,134 @@
+'''
+# Dataset cache
+Parses the cleaned coffee CSV once and keeps a typed, columnar copy of it on disk,
+keyed by the SHA-256 of the CSV file. Later loads memory-map the cached columns instead of parsing the CSV:
+
+*   categorical columns (roast, country, roaster, origin, ...) are stored as integer category codes
+*   float columns are stored as float32, integer columns (e.g. cluster) as int32
+*   price_per_ounce is stored already parsed as float32
+*   every other text column is stored as a fixed-width UTF-8 array
+'''
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from geo import COUNTRY_CODE_DTYPE
+
+CACHE_DIR = os.environ.get('COFFEE_CACHE_DIR', './.cache')
+CACHE_FORMAT_VERSION = 1
+
+CATEGORICAL_COLUMNS = ['roast', 'country', 'roaster', 'origin', 'country_processed', 'origin_country', 'country_code']
+NUMERIC_COLUMNS = ['rating', 'aroma', 'acid', 'body', 'flavor', 'aftertaste', 'price_per_ounce']
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_csv(path):
+    """Parses the CSV and converts every column to its compact cached type."""
+    df = pd.read_csv(path)
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS or pd.api.types.is_float_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype(np.int32)
+        elif col == 'country_code':
+            df[col] = df[col].astype(COUNTRY_CODE_DTYPE)
+        elif col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def write_cache(df, cache_path):
+    """Writes one .npy file per column plus a manifest describing how to rebuild the frame."""
+    tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        filename = f"{i:03d}.npy"
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry = {'kind': 'category', 'categories': [str(c) for c in series.cat.categories]}
+            np.save(os.path.join(tmp_path, filename), series.cat.codes.to_numpy())
+        elif pd.api.types.is_numeric_dtype(series):
+            entry = {'kind': 'numeric'}
+            np.save(os.path.join(tmp_path, filename), series.to_numpy())
+        else:
+            # Missing values are stored as empty strings together with a mask
+            entry = {'kind': 'text'}
+            values = series.fillna('').astype(str)
+            np.save(os.path.join(tmp_path, filename), np.array([v.encode('utf-8') for v in values], dtype=bytes))
+            np.save(os.path.join(tmp_path, f"{i:03d}.mask.npy"), series.isna().to_numpy())
+        entry.update({'name': col, 'file': filename})
+        columns.append(entry)
+
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump({'version': CACHE_FORMAT_VERSION, 'rows': len(df), 'columns': columns}, f)
+
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path, ignore_errors=True)
+    os.rename(tmp_path, cache_path)
+
+
+def read_cache(cache_path):
+    """Rebuilds the DataFrame from a cache directory, memory-mapping the numeric and code arrays."""
+    with open(os.path.join(cache_path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != CACHE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset cache version at {cache_path}")
+
+    data = {}
+    for entry in manifest['columns']:
+        values = np.load(os.path.join(cache_path, entry['file']), mmap_mode='r')
+        if entry['kind'] == 'category':
+            data[entry['name']] = pd.Categorical.from_codes(values, categories=entry['categories'])
+        elif entry['kind'] == 'numeric':
+            data[entry['name']] = values
+        else:
+            mask = np.load(os.path.join(cache_path, entry['file'].replace('.npy', '.mask.npy')))
+            text = np.char.decode(values, 'utf-8').astype(object)
+            text[mask] = np.nan
+            data[entry['name']] = text
+    return pd.DataFrame(data, copy=False)
+
+
+def load_dataset(path='coffee_cleaned.csv', cache_dir=CACHE_DIR):
+    """
+    Loads the coffee dataset, parsing the CSV only when no cache exists for its current content.
+
+    Parameters:
+        path (str): Path of the cleaned coffee CSV.
+        cache_dir (str): Directory holding the typed column caches, None to disable caching.
+
+    Returns:
+        DataFrame: The dataset with categorical and float32/int32 columns.
+    """
+    if cache_dir is None:
+        return parse_csv(path)
+
+    cache_path = os.path.join(cache_dir, 'dataset', file_hash(path)[:16])
+    if os.path.exists(os.path.join(cache_path, 'manifest.json')):
+        try:
+            return read_cache(cache_path)
+        except (OSError, ValueError):
+            pass  # Unreadable or outdated cache, rebuild it below
+
+    df = parse_csv(path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        write_cache(df, cache_path)
+    except OSError:
+        pass  # A read-only filesystem only costs the cache, not the data
+    return df
@@ -0,0 +1,87 @@
+'''
+# Fun facts cube
+Precomputed answers for the "Fun Facts" explorer, built once per dataset version.
+
+For every (country, roast) scope, including "all countries" and "all roasts", the cube holds the best,
+worst, most expensive and most affordable coffee bean and roaster, with the number of beans or roasters
+the answer was chosen from. Answering a fun fact is a dictionary lookup.
+
+Ties go to the first bean in dataset order and the first roaster in name order, like `idxmax` / `idxmin`.
+'''
+
+from collections import namedtuple
+
+import pandas as pd
+
+# Fact -> (metric, aggregation picking the answer)
+FACTS = {
+    'Best': ('rating', 'idxmax'),
+    'Worst': ('rating', 'idxmin'),
+    'Most Expensive': ('price_per_ounce', 'idxmax'),
+    'Most Affordable': ('price_per_ounce', 'idxmin'),
+}
+
+ALL = None  # Scope value for "all countries" / "all roasts"
+
+Fact = namedtuple('Fact', ['name', 'value', 'count'])
+
+
+class FactCube:
+    """
+    Fun facts about coffee beans and roasters for every (country, roast) scope.
+
+    Parameters:
+        df (DataFrame): Coffee dataset with 'name', 'roaster', 'country', 'roast', 'rating'
+            and 'price_per_ounce' columns.
+    """
+
+    def __init__(self, df):
+        df = df[['name', 'roaster', 'country', 'roast', 'rating', 'price_per_ounce']].reset_index(drop=True)
+        self.countries = [c for c in pd.unique(df['country']) if isinstance(c, str)]
+        self.roasts = [r for r in pd.unique(df['roast']) if isinstance(r, str)]
+        self.beans = {}
+        self.roasters = {}
+        for scope in (['country', 'roast'], ['country'], ['roast'], []):
+            for fact, (metric, pick) in FACTS.items():
+                self._add_beans(df, scope, fact, metric, pick)
+                self._add_roasters(df, scope, fact, metric, pick)
+
+    @staticmethod
+    def _key(scope, group, fact):
+        values = dict(zip(scope, group if isinstance(group, tuple) else (group,)))
+        return values.get('country', ALL), values.get('roast', ALL), fact
+
+    def _add_beans(self, df, scope, fact, metric, pick):
+        values = df[metric]
+        if not scope:
+            if values.notna().any():
+                row = getattr(values, pick)()
+                self.beans[(ALL, ALL, fact)] = Fact(df['name'][row], float(values[row]), int(values.count()))
+            return
+        grouped = values.groupby([df[col] for col in scope], observed=True)
+        counts = grouped.count()
+        for group, row in getattr(grouped, pick)().dropna().items():
+            row = int(row)
+            self.beans[self._key(scope, group, fact)] = Fact(df['name'][row], float(values[row]), int(counts[group]))
+
+    def _add_roasters(self, df, scope, fact, metric, pick):
+        # Mean per roaster within each scope, then the best roaster of each scope
+        means = df.groupby(scope + ['roaster'], observed=True)[metric].mean().dropna()
+        if means.empty:
+            return
+        if not scope:
+            roaster = getattr(means, pick)()
+            self.roasters[(ALL, ALL, fact)] = Fact(roaster, float(means[roaster]), len(means))
+            return
+        grouped = means.groupby(level=list(range(len(scope))), observed=True)
+        counts = grouped.size()
+        for group, index in getattr(grouped, pick)().items():
+            self.roasters[self._key(scope, group, fact)] = Fact(index[-1], float(means[index]), int(counts[group]))
+
+    def bean(self, fact, roast=ALL, country=ALL):
+        """The coffee bean answering `fact` ('Best', 'Worst', ...) in the scope, None if the scope is empty."""
+        return self.beans.get((country, roast, fact))
+
+    def roaster(self, fact, country=ALL, roast=ALL):
+        """The roaster with the best average for `fact` in the scope, None if the scope is empty."""
+        return self.roasters.get((country, roast, fact))
@@ -0,0 +1,143 @@
+'''
+# Geo normalization
+Vectorized country extraction for the review dataset:
+
+*   The roaster country is the last part of `location`; US states (and the misspellings found in the reviews)
+    are folded into "USA" through an alias table lookup instead of a linear list scan.
+*   Origin countries are found with one compiled alternation regex over all country names,
+    longest name first and on word boundaries, so "Dominican Republic" does not also match "Dominica".
+*   Every distinct string is resolved once and the result is broadcast back to the rows.
+*   Countries map to stable ISO 3166 alpha-3 codes with a fixed categorical dtype,
+    so the codes are the same for every dataset.
+'''
+
+import re
+
+import pandas as pd
+
+# US states and territories, including the spellings found in the dataset
+US_STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado",
+    "Connecticut", "Delaware", "Florida", "Georgia", "Hawaii", "Idaho",
+    "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky", "Louisiana",
+    "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota",
+    "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada",
+    "New Hampshire", "New Jersey", "New Mexico", "New York",
+    "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon",
+    "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
+    "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington",
+    "West Virginia", "Wisconsin", "Wyoming", "District of Columbia",
+    "Hawai’i", "Calfornia", "Big Island of Hawai'i", "Branford Connecticut",
+    "Washingto", "Los Angeles", "Big Island of Hawai’i", "D.C.", "MInnesota",
+    "Hawai'i"
+]
+
+# Roaster location spellings and the country they stand for
+COUNTRY_ALIASES = {
+    **{state: "USA" for state in US_STATES},
+    "United States": "USA", "USA": "USA", "US": "USA",
+}
+
+# Known country names with their ISO 3166 alpha-3 code
+COUNTRY_CODES = {
+    "Afghanistan": "AFG", "Albania": "ALB", "Algeria": "DZA", "Andorra": "AND", "Angola": "AGO",
+    "Argentina": "ARG", "Armenia": "ARM", "Australia": "AUS", "Austria": "AUT", "Azerbaijan": "AZE",
+    "Bahamas": "BHS", "Bahrain": "BHR", "Bangladesh": "BGD", "Barbados": "BRB", "Belarus": "BLR",
+    "Belgium": "BEL", "Belize": "BLZ", "Benin": "BEN", "Bhutan": "BTN", "Bolivia": "BOL",
+    "Bosnia": "BIH", "Botswana": "BWA", "Brazil": "BRA", "Brunei": "BRN", "Bulgaria": "BGR",
+    "Burkina Faso": "BFA", "Burundi": "BDI", "Cambodia": "KHM", "Cameroon": "CMR", "Canada": "CAN",
+    "Chile": "CHL", "China": "CHN", "Colombia": "COL", "Comoros": "COM",
+    "Congo": "COD",  # Coffee origins named "Congo" are in the Democratic Republic of the Congo
+    "Costa Rica": "CRI", "Croatia": "HRV", "Cuba": "CUB", "Cyprus": "CYP", "Czech Republic": "CZE",
+    "Denmark": "DNK", "Djibouti": "DJI", "Dominica": "DMA", "Dominican Republic": "DOM", "Ecuador": "ECU",
+    "Egypt": "EGY", "El Salvador": "SLV", "Equatorial Guinea": "GNQ", "Eritrea": "ERI", "Estonia": "EST",
+    "Eswatini": "SWZ", "Ethiopia": "ETH", "Fiji": "FJI", "Finland": "FIN", "France": "FRA",
+    "Gabon": "GAB", "Gambia": "GMB", "Georgia": "GEO", "Germany": "DEU", "Ghana": "GHA",
+    "Greece": "GRC", "Grenada": "GRD", "Guatemala": "GTM", "Guinea": "GIN", "Guyana": "GUY",
+    "Haiti": "HTI", "Honduras": "HND", "Hungary": "HUN", "Iceland": "ISL", "India": "IND",
+    "Indonesia": "IDN", "Iran": "IRN", "Iraq": "IRQ", "Ireland": "IRL", "Israel": "ISR",
+    "Italy": "ITA", "Jamaica": "JAM", "Japan": "JPN", "Jordan": "JOR", "Kazakhstan": "KAZ",
+    "Kenya": "KEN", "Kiribati": "KIR", "Kuwait": "KWT", "Kyrgyzstan": "KGZ", "Laos": "LAO",
+    "Latvia": "LVA", "Lebanon": "LBN", "Lesotho": "LSO", "Liberia": "LBR", "Libya": "LBY",
+    "Liechtenstein": "LIE", "Lithuania": "LTU", "Luxembourg": "LUX", "Madagascar": "MDG", "Malawi": "MWI",
+    "Malaysia": "MYS", "Maldives": "MDV", "Mali": "MLI", "Malta": "MLT", "Marshall Islands": "MHL",
+    "Mauritania": "MRT", "Mauritius": "MUS", "Mexico": "MEX", "Micronesia": "FSM", "Moldova": "MDA",
+    "Monaco": "MCO", "Mongolia": "MNG", "Montenegro": "MNE", "Morocco": "MAR", "Mozambique": "MOZ",
+    "Myanmar": "MMR", "Namibia": "NAM", "Nauru": "NRU", "Nepal": "NPL", "Netherlands": "NLD",
+    "New Zealand": "NZL", "Nicaragua": "NIC", "Niger": "NER", "Nigeria": "NGA", "North Korea": "PRK",
+    "North Macedonia": "MKD", "Norway": "NOR", "Oman": "OMN", "Pakistan": "PAK", "Palau": "PLW",
+    "Panama": "PAN", "Papua New Guinea": "PNG", "Paraguay": "PRY", "Peru": "PER", "Philippines": "PHL",
+    "Poland": "POL", "Portugal": "PRT", "Qatar": "QAT", "Romania": "ROU", "Russia": "RUS",
+    "Rwanda": "RWA", "Saint Kitts": "KNA", "Saint Lucia": "LCA", "Saint Vincent": "VCT", "Samoa": "WSM",
+    "San Marino": "SMR", "Sao Tome": "STP", "Saudi Arabia": "SAU", "Senegal": "SEN", "Serbia": "SRB",
+    "Seychelles": "SYC", "Sierra Leone": "SLE", "Singapore": "SGP", "Slovakia": "SVK", "Slovenia": "SVN",
+    "Solomon Islands": "SLB", "Somalia": "SOM", "South Africa": "ZAF", "South Korea": "KOR",
+    "South Sudan": "SSD", "Spain": "ESP", "Sri Lanka": "LKA", "Sudan": "SDN", "Suriname": "SUR",
+    "Sweden": "SWE", "Switzerland": "CHE", "Syria": "SYR", "Taiwan": "TWN", "Tajikistan": "TJK",
+    "Tanzania": "TZA", "Thailand": "THA", "Togo": "TGO", "Tonga": "TON", "Trinidad": "TTO",
+    "Tunisia": "TUN", "Turkey": "TUR", "Turkmenistan": "TKM", "Tuvalu": "TUV", "Uganda": "UGA",
+    "Ukraine": "UKR", "United Arab Emirates": "ARE", "United Kingdom": "GBR", "United States": "USA",
+    "Uruguay": "URY", "Uzbekistan": "UZB", "Vanuatu": "VUT", "Vatican": "VAT", "Venezuela": "VEN",
+    "Vietnam": "VNM", "Yemen": "YEM", "Zambia": "ZMB", "Zimbabwe": "ZWE",
+}
+
+# Country names matched in the origin text, in the order they are listed
+COUNTRY_LIST = list(COUNTRY_CODES)
+
+# Roaster countries that are not in the country list
+EXTRA_CODES = {
+    "USA": "USA", "Hong Kong": "HKG", "Macau": "MAC", "Puerto Rico": "PRI",
+    "England": "GBR", "Scotland": "GBR", "Wales": "GBR", "UK": "GBR",
+}
+
+# Fixed categories: the code of a country never depends on which countries a dataset contains
+COUNTRY_CODE_DTYPE = pd.CategoricalDtype(sorted(set(COUNTRY_CODES.values()) | set(EXTRA_CODES.values())))
+
+_COUNTRY_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(name) for name in sorted(COUNTRY_LIST, key=len, reverse=True)) + r')\b'
+)
+_COUNTRY_ORDER = {name: i for i, name in enumerate(COUNTRY_LIST)}
+
+
+def _distinct(values, func):
+    """Applies a Series -> Series function to the distinct values only and broadcasts the result."""
+    codes, uniques = pd.factorize(values)
+    resolved = func(pd.Series([*uniques, None], dtype=object))
+    return pd.Series(resolved.to_numpy(dtype=object)[codes], index=values.index, dtype=object)
+
+
+def roaster_countries(locations):
+    """
+    Country of every roaster location, the last comma-separated part with US states folded into "USA".
+
+    Parameters:
+        locations (Series): Roaster locations such as "Portland, Oregon".
+
+    Returns:
+        Series: Country names, None for missing locations.
+    """
+    def resolve(values):
+        countries = values.where(values.map(lambda v: isinstance(v, str))).str.rsplit(',', n=1).str[-1].str.strip()
+        return countries.map(lambda country: COUNTRY_ALIASES.get(country, country), na_action='ignore')
+    return _distinct(locations, resolve)
+
+
+def origin_countries(origins):
+    """
+    Countries named in every origin text, joined with "; " in country list order.
+
+    Returns:
+        Series: Joined country names, None where no country is named.
+    """
+    def resolve(values):
+        found = values.where(values.map(lambda v: isinstance(v, str))).str.findall(_COUNTRY_PATTERN)
+        return found.map(
+            lambda names: "; ".join(sorted(set(names), key=_COUNTRY_ORDER.get)) or None, na_action='ignore'
+        )
+    return _distinct(origins, resolve)
+
+
+def country_codes(countries):
+    """ISO alpha-3 code of every country name as a categorical with the fixed COUNTRY_CODE_DTYPE, NaN if unknown."""
+    lookup = {**COUNTRY_CODES, **EXTRA_CODES}
+    return countries.map(lookup).astype(COUNTRY_CODE_DTYPE)
@@ -0,0 +1,118 @@
+'''
+# Import budget
+Measures the import cost of the app's entry points with `python -X importtime`, each in a fresh interpreter,
+and checks it against a budget:
+
+*   the total import time, not counting the interpreter's own startup imports
+*   modules that must not be imported at all: the plotting and model libraries are only imported
+    when a chart is drawn or a model is loaded (see warmup.py)
+
+Page scripts are executed under a name other than "__main__", so only their imports run.
+
+Usage:
+    python -m import_budget             # exit status 1 when an entry point is over budget
+    python -m import_budget --scale 2   # budgets x2, for slower machines
+'''
+
+import argparse
+import subprocess
+import sys
+
+# Libraries only needed once a chart is drawn or a model is built
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'sklearn', 'scipy', 'joblib')
+
+# pandas comes with the dataset, which the registry loads on first use
+DATA_MODULES = ('pandas',)
+
+# Entry point -> (budget in ms, modules it must not import), about twice the cost measured when set
+BUDGETS = {
+    'main.py': (800, HEAVY_MODULES + DATA_MODULES),
+    'pages/dataset_explorer.py': (800, HEAVY_MODULES + DATA_MODULES),
+    'pages/recommendation.py': (1000, HEAVY_MODULES + DATA_MODULES),
+    'recommendation.py': (300, HEAVY_MODULES + DATA_MODULES),
+    'service.py': (400, HEAVY_MODULES),
+}
+
+
+def parse_importtime(stderr):
+    """(module, cumulative_us, depth) of every line of `-X importtime` output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), int(cumulative), depth))
+    return entries
+
+
+def importtime(code):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"{code!r} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure(entry_point, repeat=3):
+    """
+    Import cost of one entry point.
+
+    Returns:
+        dict: total_ms (fastest of `repeat` runs), modules (all imported module names)
+            and top (the five most expensive top-level imports as (module, ms)).
+    """
+    baseline = {name for name, _, _ in importtime("import runpy")}
+    code = f"import runpy; runpy.run_path({entry_point!r}, run_name='__import_budget__')"
+    best = None
+    for _ in range(repeat):
+        entries = importtime(code)
+        top = [(name, us / 1000) for name, us, depth in entries if depth == 0 and name not in baseline]
+        total = sum(ms for _, ms in top)
+        if best is None or total < best['total_ms']:
+            best = {
+                'total_ms': total,
+                'modules': {name for name, _, _ in entries},
+                'top': sorted(top, key=lambda item: -item[1])[:5],
+            }
+    return best
+
+
+def check(budgets=None, scale=1.0, repeat=3):
+    """
+    Measures every entry point against its budget.
+
+    Returns:
+        list: (entry_point, report, budget_ms, forbidden_modules_found) per entry point.
+    """
+    results = []
+    for entry_point, (budget_ms, forbidden) in (budgets or BUDGETS).items():
+        report = measure(entry_point, repeat=repeat)
+        # Top-level packages only, their submodules would make the list long
+        found = sorted({
+            module.split('.')[0] for module in report['modules']
+            if any(module == name or module.startswith(name + '.') for name in forbidden)
+        })
+        results.append((entry_point, report, budget_ms * scale, found))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the app's entry points.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per entry point, the fastest counts")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for entry_point, report, budget_ms, found in check(scale=args.scale, repeat=args.repeat):
+        ok = report['total_ms'] <= budget_ms and not found
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {entry_point:<28} {report['total_ms']:7.0f} ms / {budget_ms:.0f} ms")
+        if found:
+            print(f"     imports {', '.join(found)}")
+        if not ok:
+            print("     slowest: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in report['top']))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
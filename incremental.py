@@ -0,0 +1,292 @@
+'''
+# Incremental catalog updates
+Adds newly reviewed coffee beans to an exported model artifact without refitting the models:
+
+*   each new bean is assigned to the KMeans cluster with the nearest existing centroid
+*   its neighbor list is computed exactly against the whole catalog
+*   existing neighbor lists are patched where a new bean is closer than their exact k-th neighbor
+
+The changes are written as a delta file next to the artifact and listed in its manifest,
+so the registry picks them up like a new artifact. `compact` folds all deltas into the base arrays.
+Loading an artifact with deltas copies every array into memory instead of mapping it, so `add_beans` compacts
+automatically once the delta beans exceed MAX_DELTA_SHARE of the base arrays or there are MAX_DELTAS delta files.
+A full refit is recommended once the catalog grew by more than MAX_GROWTH since the last fit,
+or new beans sit much further from their centroids than the fitted ones (MAX_DISTANCE_RATIO).
+
+The added beans are also appended to the cleaned dataset (`--dataset`), so the pages can show their details.
+
+Usage:
+    python -m incremental add --csv new_reviews.csv
+    python -m incremental compact
+'''
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from artifacts import DEFAULT_ARTIFACT_PATH, feature_means, load_artifact, save_artifact
+from name_table import encode_names
+from quantized import CompactIndex
+from similarity import build_feature_matrix
+
+DEFAULT_DATASET_PATH = 'coffee_cleaned.csv'
+
+MAX_GROWTH = 0.2
+MAX_DISTANCE_RATIO = 1.5
+
+# Thresholds of the automatic compaction, see `add_beans`
+MAX_DELTA_SHARE = 0.05
+MAX_DELTAS = 20
+
+# New beans compared against the catalog at once, bounds the distance matrix size
+BATCH_SIZE = 64
+
+
+def _squared_distances(queries, features, feature_sq_norms):
+    sq = np.einsum('ij,ij->i', queries, queries)[:, None] - 2.0 * (queries @ features.T) + feature_sq_norms[None, :]
+    return np.maximum(sq, 0.0)
+
+
+def _exact_kth_distances(artifact, ids, k):
+    """Exact distance of each bean in `ids` to its k-th nearest other bean of the artifact, inf below k + 1 beans."""
+    kth = np.full(len(ids), np.inf, dtype=np.float32)
+    if len(artifact) <= k:
+        return kth
+    engine = artifact.engine()
+    for start in range(0, len(ids), BATCH_SIZE):
+        _, distances = engine.kneighbors(ids[start:start + BATCH_SIZE], k=k)
+        kth[start:start + BATCH_SIZE] = distances[:, -1]
+    return kth
+
+
+def compute_delta(artifact, new_df):
+    """
+    Computes the delta that adds the beans of `new_df` to `artifact`.
+
+    Parameters:
+        artifact (ModelArtifact): Current model, must include the feature matrix.
+        new_df (DataFrame): New beans in the cleaned dataset format (cluster column not needed).
+
+    Returns:
+        tuple: (delta, report) where delta maps array names to arrays (see artifacts.apply_delta)
+        and report describes skipped (already known) and rejected (incomplete features) beans
+        and the drift of the new beans.
+    """
+    if not artifact.has_features:
+        raise ValueError("Incremental updates need an artifact with features, rebuild it with the dataset")
+
+    known = new_df['name'].map(lambda name: name in artifact.names)
+    skipped = new_df.loc[known, 'name'].tolist()
+    new_df = new_df[~known].drop_duplicates(subset='name').reset_index(drop=True)
+
+    old_features = np.asarray(artifact.features)
+    old_sq_norms = artifact.arrays.get('sq_norms')
+    if old_sq_norms is None:
+        old_sq_norms = np.einsum('ij,ij->i', old_features, old_features)
+    # Missing scores get the catalog means, the means of a small batch say nothing about it
+    fill_values = artifact.manifest.get('feature_means') or feature_means(old_features, artifact.manifest['feature_columns'])
+    new_features, _ = build_feature_matrix(new_df, artifact.manifest['feature_columns'], fill_values)
+
+    # Beans that still have no value for a feature cannot be placed, they are reported instead of added
+    valid = np.isfinite(new_features).all(axis=1)
+    rejected = new_df.loc[~valid, 'name'].tolist()
+    new_df = new_df[valid].reset_index(drop=True)
+    new_features = np.ascontiguousarray(new_features[valid])
+    n_old, n_new, k = len(old_features), len(new_features), artifact.k
+
+    # Assign every new bean to the nearest existing centroid
+    centroids = artifact.cluster_centroids()
+    to_centroids = _squared_distances(new_features, centroids, np.einsum('ij,ij->i', centroids, centroids))
+    clusters = to_centroids.argmin(axis=1).astype(np.int32)
+    centroid_distances = np.sqrt(to_centroids[np.arange(n_new), clusters])
+
+    # Distance of every old bean to the farthest bean of its list, inf where the list is not full. The lists need
+    # not be the exact top-k in this feature space (e.g. converted from joblib), so this only bounds the exact
+    # k-th neighbor distance from above: it selects the candidates, `_exact_kth_distances` decides.
+    neighbors = np.asarray(artifact.neighbors)
+    list_dist = np.full(n_old, np.inf, dtype=np.float32)
+    for start in range(0, n_old, BATCH_SIZE * 64):
+        block = neighbors[start:start + BATCH_SIZE * 64]
+        full = (block >= 0).all(axis=1)
+        rows = np.arange(start, start + len(block))[full]
+        list_dist[rows] = np.linalg.norm(old_features[block[full]] - old_features[rows, None, :], axis=2).max(axis=1)
+
+    new_sq_norms = np.einsum('ij,ij->i', new_features, new_features)
+    new_to_new = _squared_distances(new_features, new_features, new_sq_norms)
+    np.fill_diagonal(new_to_new, np.inf)
+
+    new_neighbors = np.full((n_new, k), -1, dtype=np.int32)
+    closer = []  # (old bean ID, new bean ID, distance) where the new bean enters the old bean's list
+    for start in range(0, n_new, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, n_new)
+        to_old = _squared_distances(new_features[start:stop], old_features, old_sq_norms)
+
+        # Neighbors of the new beans among old and new beans together
+        candidates = np.hstack([to_old, new_to_new[start:stop]])
+        n = min(k, candidates.shape[1] - 1)
+        top = np.argpartition(candidates, n - 1, axis=1)[:, :n]
+        top = np.take_along_axis(top, np.argsort(np.take_along_axis(candidates, top, axis=1), axis=1), axis=1)
+        new_neighbors[start:stop, :n] = top
+
+        dist = np.sqrt(to_old)
+        rows, cols = np.nonzero(dist < list_dist[None, :])
+        closer.extend(zip(cols, rows + start + n_old, dist[rows, cols]))
+
+    # A new bean enters an old bean's list only if it is closer than the exact k-th neighbor
+    candidate_ids = np.unique(np.array([old_id for old_id, _, _ in closer], dtype=np.int64))
+    kth_dist = dict(zip(candidate_ids.tolist(), _exact_kth_distances(artifact, candidate_ids, k).tolist()))
+    by_old = {}
+    for old_id, new_id, dist in closer:
+        if dist < kth_dist[int(old_id)]:
+            by_old.setdefault(int(old_id), []).append((float(dist), int(new_id)))
+
+    # Merge the closer new beans into the affected old neighbor lists
+    patched_ids = np.array(sorted(by_old), dtype=np.int64)
+    patched_neighbors = np.empty((len(patched_ids), k), dtype=np.int32)
+    for row, old_id in enumerate(patched_ids):
+        current = neighbors[old_id][neighbors[old_id] >= 0]
+        current_dist = np.linalg.norm(old_features[current] - old_features[old_id], axis=1)
+        merged = sorted(list(zip(current_dist.tolist(), current.tolist())) + by_old[old_id])[:k]
+        patched_neighbors[row] = [bean_id for _, bean_id in merged] + [-1] * (k - len(merged))
+
+    delta = {
+        'names': encode_names(new_df['name']),
+        'features': new_features,
+        'ratings': pd.to_numeric(new_df['rating'], errors='coerce').to_numpy(dtype=np.float32),
+        'prices': pd.to_numeric(new_df['price_per_ounce'], errors='coerce').to_numpy(dtype=np.float32),
+        'clusters': clusters,
+        'neighbors': new_neighbors,
+        'patched_ids': patched_ids,
+        'patched_neighbors': patched_neighbors,
+    }
+    report = {
+        'added': n_new,
+        'skipped': skipped,
+        'rejected': rejected,
+        'patched_neighbor_lists': len(patched_ids),
+        'centroid_distance_sum': float(centroid_distances.sum()),
+    }
+    return delta, report
+
+
+def drift_status(manifest, report):
+    """Updates the drift counters of the manifest and decides whether a full refit is due."""
+    drift = dict(manifest.get('drift', {'beans_since_refit': 0, 'centroid_distance_sum': 0.0}))
+    drift['beans_since_refit'] += report['added']
+    drift['centroid_distance_sum'] += report['centroid_distance_sum']
+
+    fitted = manifest['n_beans'] - manifest.get('drift', {}).get('beans_since_refit', 0)
+    growth = drift['beans_since_refit'] / max(fitted, 1)
+    baseline = manifest.get('mean_centroid_distance')
+    ratio = (drift['centroid_distance_sum'] / max(drift['beans_since_refit'], 1)) / baseline if baseline else 1.0
+    drift.update({'growth': growth, 'distance_ratio': ratio})
+    # A NaN ratio compares False against any threshold: counters that can no longer measure drift call for a refit
+    drift['needs_refit'] = bool(growth > MAX_GROWTH or not np.isfinite(ratio) or ratio > MAX_DISTANCE_RATIO)
+    return drift
+
+
+def write_delta(path, delta, report):
+    """Saves the delta file and lists it in the artifact manifest, replacing the manifest atomically. Returns the new manifest."""
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    deltas = manifest.get('deltas', [])
+    delta_file = os.path.join('deltas', f"{len(deltas) + 1:04d}.npz")
+    os.makedirs(os.path.join(path, 'deltas'), exist_ok=True)
+    np.savez(os.path.join(path, delta_file), **delta)
+
+    manifest['drift'] = drift_status(manifest, report)
+    manifest['deltas'] = deltas + [delta_file]
+    manifest['delta_beans'] = manifest.get('delta_beans', 0) + report['added']
+    manifest['n_beans'] += report['added']
+    tmp_file = os.path.join(path, f"manifest.json.tmp-{os.getpid()}")
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, os.path.join(path, 'manifest.json'))
+    return manifest
+
+
+def append_to_dataset(dataset_path, rows):
+    """
+    Appends rows to the cleaned dataset CSV in its column order, columns the rows lack stay empty.
+    The file is replaced atomically, so readers see the old or the new dataset.
+    """
+    columns = pd.read_csv(dataset_path, nrows=0).columns
+    tmp_file = f"{dataset_path}.tmp-{os.getpid()}"
+    shutil.copyfile(dataset_path, tmp_file)
+    rows.reindex(columns=columns).to_csv(tmp_file, mode='a', header=False, index=False)
+    os.replace(tmp_file, dataset_path)
+
+
+def add_beans(new_df, path=DEFAULT_ARTIFACT_PATH, dataset_path=None):
+    """
+    Adds the beans of `new_df` to the artifact at `path` as a new delta, and compacts the
+    deltas into the base arrays once they exceed MAX_DELTA_SHARE or MAX_DELTAS.
+
+    Parameters:
+        new_df (DataFrame): New beans in the cleaned dataset format.
+        path (str): Artifact directory.
+        dataset_path (str): Optional cleaned dataset CSV the added beans are appended to, with their cluster,
+            so the pages can show their details. The CLI appends to coffee_cleaned.csv.
+
+    Returns:
+        dict: Report with the number of added, skipped and rejected beans, the drift status
+        and whether the artifact was compacted.
+    """
+    delta, report = compute_delta(load_artifact(path), new_df)
+    report['compacted'] = False
+    if report['added']:
+        manifest = write_delta(path, delta, report)
+        if dataset_path:
+            # The rows compute_delta kept, in delta order
+            rows = new_df[~new_df['name'].isin(report['skipped'] + report['rejected'])].drop_duplicates(subset='name')
+            append_to_dataset(dataset_path, rows.assign(cluster=delta['clusters']))
+        report['drift'] = manifest['drift']
+        base_beans = manifest['n_beans'] - manifest['delta_beans']
+        if manifest['delta_beans'] > MAX_DELTA_SHARE * base_beans or len(manifest['deltas']) >= MAX_DELTAS:
+            compact(path)
+            report['compacted'] = True
+    return report
+
+
+def compact(path=DEFAULT_ARTIFACT_PATH):
+    """Folds all deltas into the base arrays of the artifact."""
+    # The drift counters stay in the manifest, they count since the last full fit
+    artifact = load_artifact(path)
+    if artifact.has_features:
+        # apply_delta drops the compact features, they only covered the base beans
+        artifact.arrays.update(CompactIndex.from_features(artifact.features).arrays())
+    save_artifact(path, artifact)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental updates of the coffee model artifact.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_parser = subparsers.add_parser('add', help="Add new beans from a cleaned CSV")
+    add_parser.add_argument('--csv', required=True)
+    add_parser.add_argument('--artifact', default=DEFAULT_ARTIFACT_PATH)
+    add_parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH, help="Cleaned dataset the beans are appended to")
+    compact_parser = subparsers.add_parser('compact', help="Fold the deltas into the artifact")
+    compact_parser.add_argument('--artifact', default=DEFAULT_ARTIFACT_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'compact':
+        compact(args.artifact)
+        print(f"Compacted {args.artifact}")
+        return
+
+    report = add_beans(pd.read_csv(args.csv), args.artifact, args.dataset)
+    print(f"Added {report['added']} beans, skipped {len(report['skipped'])} already known, "
+          f"rejected {len(report['rejected'])} with incomplete features, patched {report['patched_neighbor_lists']} neighbor lists")
+    if report['compacted']:
+        print(f"Compacted the deltas into {args.artifact}")
+    if report.get('drift', {}).get('needs_refit'):
+        print("Drift threshold crossed: rerun the full training pipeline to refit the models")
+
+
+if __name__ == "__main__":
+    main()
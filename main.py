@@ -1,6 +1,10 @@
 import streamlit as st
+from warmup import PREWARM, start_warmup
 
 def main():
+    # Load the models and render the explorer charts in the background while the landing page is shown
+    if PREWARM:
+        start_warmup()
     st.image("static/coffee_header.jpg")
     st.write("""
     Welcome to the Coffee Analysis and Recommendation System! 
@@ -0,0 +1,69 @@
+'''
+# Name table
+Coffee bean names stored as fixed-width UTF-8 byte arrays, so they can be memory-mapped.
+Name -> bean ID lookups binary-search a sorted copy of the names instead of building a
+Python dict, which keeps loading independent of the catalog size.
+'''
+
+import numpy as np
+
+
+def encode_names(names):
+    """Encodes bean names as a fixed-width UTF-8 byte array."""
+    return np.array([str(name).encode('utf-8') for name in names], dtype=bytes)
+
+
+class NameTable:
+    """
+    Bidirectional bean name <-> bean ID mapping.
+
+    Parameters:
+        names (ndarray): Encoded names in bean ID order (see `encode_names`).
+        sorted_names (ndarray): The same names sorted.
+        order (ndarray): Bean ID of each entry of `sorted_names`.
+    """
+
+    def __init__(self, names, sorted_names, order):
+        self.names = names
+        self.sorted_names = sorted_names
+        self.order = order
+
+    @classmethod
+    def from_names(cls, names):
+        encoded = encode_names(names)
+        order = np.argsort(encoded, kind='stable').astype(np.int32)
+        return cls(encoded, encoded[order], order)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, ids):
+        """Decodes the name of one bean ID, or a list of names for an array of IDs."""
+        if np.ndim(ids) == 0:
+            return self.names[ids].decode('utf-8')
+        return [name.decode('utf-8') for name in self.names[ids]]
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def find(self, name):
+        """Returns the bean ID for a name, or None if the name is unknown."""
+        key = str(name).encode('utf-8')
+        pos = np.searchsorted(self.sorted_names, key)
+        if pos < len(self.sorted_names) and self.sorted_names[pos] == key:
+            return int(self.order[pos])
+        return None
+
+    def ids(self, names):
+        """Maps bean names to bean IDs with one binary search, raising KeyError for unknown names."""
+        if not len(names):
+            return np.empty(0, dtype=np.int64)
+        keys = encode_names(names)
+        pos = np.minimum(np.searchsorted(self.sorted_names, keys), len(self.sorted_names) - 1)
+        unknown = self.sorted_names[pos] != keys
+        if unknown.any():
+            raise KeyError(names[int(np.argmax(unknown))])
+        return self.order[pos].astype(np.int64)
+
+    def to_dict(self):
+        return {name: i for i, name in enumerate(self[np.arange(len(self))])}
@@ -1,14 +1,55 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import time
-
+from charts import chart, prewarm, use_density
+from registry import get_dataset, get_fact_cube, get_search_index
+from tracing import debug_panel, panel_enabled, span, traced
+
+# Fact -> (headline, icon around the name)
+BEAN_HEADLINES = {
+    "Best": ("The Best {} Coffee Bean is...", "✨"),
+    "Worst": ("The Worst {} Coffee Bean is...", "💀"),
+    "Most Expensive": ("The Most Expensive {} Coffee Bean is...", "💲"),
+    "Most Affordable": ("The Most Affordable {} Coffee Bean is...", "💸"),
+}
+BEAN_BADGES = {"Best": "🏆", "Worst": "💔", "Most Expensive": "💎", "Most Affordable": "🤝💸"}
+ROASTER_HEADLINES = {
+    "Best": ("The Best Roaster {} is...", "✨"),
+    "Worst": ("The Worst Roaster {} is...", "💀"),
+    "Most Expensive": ("The Most Expensive Roaster {} is...", "💲"),
+    "Most Affordable": ("The Most Affordable Roaster {} is...", "💸"),
+}
+ROASTER_BADGES = {"Best": "🏆", "Worst": "💔", "Most Expensive": "💎💲", "Most Affordable": "🤝💸"}
+
+# Fade-in played by the browser, so revealing the answer never blocks the script
+FACT_ANIMATION_CSS = """
+<style>
+@keyframes fact-reveal { from { opacity: 0; } to { opacity: 1; } }
+.fact-line { opacity: 0; animation: fact-reveal 0.6s ease-in forwards; }
+</style>
+"""
+
+
+def show_fact(lines, animate=False):
+    """Shows the lines of a fun fact, revealed one second apart when animated."""
+    if not animate:
+        for line in lines:
+            st.markdown(line)
+        return
+    # Blank lines around each line keep it markdown inside the HTML wrapper
+    st.markdown(FACT_ANIMATION_CSS + "".join(
+        f'<div class="fact-line" style="animation-delay: {i}s">\n\n{line}\n\n</div>\n'
+        for i, line in enumerate(lines)
+    ), unsafe_allow_html=True)
+
+
+@traced('page.explorer')
 def run_dataset_explorer():
     st.title("Coffee Dataset Explorer")
     
-    # Load the dataset
-    df = pd.read_csv('coffee_cleaned.csv')
+    # Load the dataset (shared by all sessions, do not modify it in place)
+    with span('page.explorer.load'):
+        df = get_dataset()
+        # Render the static charts in the background while this page is being read
+        prewarm()
 
     # Sidebar for selecting the type of visualization
     st.sidebar.title("Select Visualization")
@@ -23,8 +64,13 @@ def run_dataset_explorer():
             submit_button = st.form_submit_button(label='Search')
 
         if submit_button:
-            # Filter the DataFrame based on the search term
-            filtered_df = df[df['name'].str.contains(search_term, case=False) | df['roaster'].str.contains(search_term, case=False)]
+            # Matching rows from the indexed names and roasters, ranked by how well the name matches and then by rating
+            search_index = get_search_index()
+            with span('page.explorer.search'):
+                filtered_df = df.iloc[search_index.search(search_term)]
+                suggestions = search_index.suggest(search_term, limit=5)
+            if suggestions:
+                st.caption("Suggestions: " + " · ".join(suggestions))
 
             # Display the results
             if not filtered_df.empty:
@@ -43,82 +89,36 @@ def run_dataset_explorer():
 
         # Basic statistics
         st.subheader("Statistical Summary")
-        st.write(df.describe())
+        with span('page.explorer.describe'):
+            summary = df.describe()
+        st.write(summary)
 
-        # Overview visualizations
+        # Overview visualizations, rendered once per dataset version and shared by all sessions
         st.subheader("Distribution of Coffee Ratings")
-        plt.figure(figsize=(10, 6))
-        sns.histplot(df['rating'], bins=20, kde=True)
-        plt.title("Distribution of Coffee Ratings")
-        plt.xlabel("Rating")
-        plt.ylabel("Frequency")
-        st.pyplot(plt)
+        st.image(chart("rating_distribution"))
         
         # Feature distributions
         st.header("Feature Distributions")
-        
-        # Numeric features visualization
-        numeric_features = ['aroma', 'acid', 'body', 'flavor', 'aftertaste']
-        
-        # Create distribution plots
-        fig, axes = plt.subplots(3, 2, figsize=(15, 15))  # Adjusted to fit 6 plots
-        axes = axes.ravel()
-        
-        # Plot numeric features
-        for idx, feature in enumerate(numeric_features):
-            sns.histplot(data=df, x=feature, ax=axes[idx])
-            axes[idx].set_title(f'{feature.capitalize()} Distribution')
-        
-        # Plot roast type distribution
-        sns.countplot(data=df, x='roast', ax=axes[len(numeric_features)])  # Use the next available subplot
-        axes[len(numeric_features)].set_title("Count of Coffee Beans by Roast Type")
-        axes[len(numeric_features)].set_xlabel("Roast Type")
-        axes[len(numeric_features)].set_ylabel("Count")
-        
-        # Remove the extra subplot if needed
-        if len(numeric_features) + 1 < len(axes):
-            axes[-1].remove()
-        
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(chart("feature_distributions"))
 
     elif visualization_type == "Price Analysis":
         # Price Distribution Plot
         st.subheader("Price Distribution")
-        plt.figure(figsize=(10, 6))
-        sns.histplot(df['price_per_ounce'], bins=20, kde=True)
-        plt.title("Distribution of Coffee Price per Ounce")
-        plt.xlabel("Price (USD/Ounce)")
-        plt.ylabel("Frequency")
-        st.pyplot(plt)
+        st.image(chart("price_distribution"))
 
         # Price vs. Rating Scatter Plot
         st.subheader("Price vs. Rating Scatter Plot")
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(data=df, x='price_per_ounce', y='rating')
-        plt.title("Relationship between Price and Rating")
-        plt.xlabel("Price (USD/Ounce)")
-        plt.ylabel("Rating")
-        st.pyplot(plt)
+        st.image(chart("price_vs_rating"))
+        if use_density(df):
+            st.caption(f"Bean density: {len(df):,} coffee beans are too many to draw one by one.")
 
         # Average Price by Roast Type Bar Chart
         st.subheader("Average Price by Roast Type")
-        plt.figure(figsize=(12, 6))
-        average_price_by_roast = df.groupby('roast')['price_per_ounce'].mean()
-        sns.barplot(x=average_price_by_roast.index, y=average_price_by_roast.values)
-        plt.title("Average Price by Roast Type")
-        plt.xlabel("Roast Type")
-        plt.ylabel("Average Price (USD/Ounce)")
-        plt.xticks(rotation=45)
-        st.pyplot(plt)
+        st.image(chart("price_by_roast"))
 
         # Price vs. Other Features Correlation Heatmap
         st.subheader("Price vs. Other Features Correlation Heatmap")
-        plt.figure(figsize=(12, 8))
-        correlation_matrix = df[['price_per_ounce', 'rating', 'aroma', 'acid', 'body', 'flavor']].corr()
-        sns.heatmap(correlation_matrix, annot=True, fmt=".2f", cmap='coolwarm', square=True)
-        plt.title("Correlation of Price with Other Features")
-        st.pyplot(plt)
+        st.image(chart("price_correlation"))
 
     elif visualization_type == "Category Features":
         # Categorical features
@@ -126,44 +126,20 @@ def run_dataset_explorer():
         
         # Country distribution
         st.subheader("Coffee Origins")
-        country_counts = df['country'].value_counts()
-        fig, ax = plt.subplots(figsize=(10, 6))
-        country_counts.plot(kind='bar')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        st.pyplot(fig)
+        st.image(chart("country_counts"))
 
         # Roast distribution
         st.subheader("Roast Types")
-        roast_counts = df['roast'].value_counts()
-        fig, ax = plt.subplots(figsize=(8, 6))
-        roast_counts.plot(kind='pie', autopct='%1.1f%%')
-        plt.title('Distribution of Roast Types')
-        st.pyplot(fig)
+        st.image(chart("roast_counts"))
 
         # Bar Chart of Coffee Origins (Top 10)
         st.subheader("Top 10 Coffee Origins Count")
-        plt.figure(figsize=(12, 6))
-        
-        # Get the top 10 origins
-        origin_counts = df['origin'].value_counts().head(10)  # Get the top 10 origins
-        top_origins = origin_counts.reset_index()
-        top_origins.columns = ['origin', 'count']  # Rename columns for clarity
-
-        # Create the bar plot
-        sns.barplot(data=top_origins, x='origin', y='count', palette='viridis', hue='origin', legend=False)
-        plt.title("Count of Coffee Beans by Origin (Top 10)")
-        plt.xlabel("Origin")
-        plt.ylabel("Count")
-        plt.xticks(rotation=45)
-        st.pyplot(plt)
+        st.image(chart("top_origins"))
 
     elif visualization_type == "Feature Comparison":
 
-        # Convert relevant columns to numeric
+        # The dataset loader already stores these columns as float32
         numeric_columns = ['rating', 'aroma', 'acid', 'body', 'flavor', 'price_per_ounce']
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
 
         # User selects columns to compare
         st.subheader("Select Features to Compare")
@@ -172,15 +148,16 @@ def run_dataset_explorer():
 
         # Scatter Plot of Selected Features
         st.subheader(f"{feature_x} vs. {feature_y}")
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(data=df, x=feature_x, y=feature_y)
-        plt.title(f"{feature_x} vs. {feature_y}")
-        plt.xlabel(feature_x)
-        plt.ylabel(feature_y)
-        st.pyplot(plt)
+        st.image(chart("feature_scatter", x=feature_x, y=feature_y))
+        if use_density(df):
+            st.caption(f"Bean density: {len(df):,} coffee beans are too many to draw one by one.")
     
     elif visualization_type == "Fun Facts 🆕":
-        # Fun Facts Section
+        # Fun Facts Section, every answer is a lookup in the precomputed cube
+        with span('page.explorer.fact_cube'):
+            cube = get_fact_cube()
+        animate = st.sidebar.toggle("Animate fun facts", value=False,
+                                    help="Reveal the answers line by line")
 
         # Coffee Beans Selection
         st.subheader("🌟 Fun Facts about Coffee Beans")
@@ -203,45 +180,19 @@ def run_dataset_explorer():
             if coffee_roast_type == "Select Roast Type" or coffee_fact_type == "Select Fact":
                 st.info("Let's find out the most ❓ coffee ☕️ !")
             else:
-                with st.spinner("Exploring in the mysterious dataset..."):
-                    time.sleep(1)
-                    # Filter the DataFrame based on the selected roast type
-                    if coffee_roast_type != "All Coffee Beans":
-                        filtered_coffee_df = df[df['roast'] == coffee_roast_type]
-                    else:
-                        filtered_coffee_df = df
-
-                    if coffee_fact_type == "Best":
-                        best_coffee = filtered_coffee_df.loc[filtered_coffee_df['rating'].idxmax()]
-                        st.markdown(f"**The Best {coffee_roast_type} Coffee Bean is...** 🏆")
-                        time.sleep(1)
-                        st.markdown(f"**Name:**\n\n✨ *{best_coffee['name']}* ✨")
-                        time.sleep(1)
-                        st.markdown(f"**Rating:** {best_coffee['rating']:.2f}")
-
-                    elif coffee_fact_type == "Worst":
-                        worst_coffee = filtered_coffee_df.loc[filtered_coffee_df['rating'].idxmin()]
-                        st.markdown(f"**The Worst {coffee_roast_type} Coffee Bean is...** 💔")
-                        time.sleep(1)
-                        st.markdown(f"**Name:**\n\n💀 *{worst_coffee['name']}* 💀")
-                        time.sleep(1)
-                        st.markdown(f"**Rating:** {worst_coffee['rating']:.2f}")
-
-                    elif coffee_fact_type == "Most Expensive":
-                        most_expensive_coffee = filtered_coffee_df.loc[filtered_coffee_df['price_per_ounce'].idxmax()]
-                        st.markdown(f"**The Most Expensive {coffee_roast_type} Coffee Bean is...** 💎")
-                        time.sleep(1)
-                        st.markdown(f"**Name:**\n\n💲 *{most_expensive_coffee['name']}* 💲")
-                        time.sleep(1)
-                        st.markdown(f"**Price:** ${most_expensive_coffee['price_per_ounce']:.2f} per ounce")
-
-                    elif coffee_fact_type == "Most Affordable":
-                        most_affordable_coffee = filtered_coffee_df.loc[filtered_coffee_df['price_per_ounce'].idxmin()]
-                        st.markdown(f"**The Most Affordable {coffee_roast_type} Coffee Bean is...** 🤝💸")
-                        time.sleep(1)
-                        st.markdown(f"**Name:**\n\n💸 *{most_affordable_coffee['name']}* 💸")
-                        time.sleep(1)
-                        st.markdown(f"**Price:** ${most_affordable_coffee['price_per_ounce']:.2f} per ounce")
+                roast = None if coffee_roast_type == "All Coffee Beans" else coffee_roast_type
+                fact = cube.bean(coffee_fact_type, roast=roast)
+                headline, icon = BEAN_HEADLINES[coffee_fact_type]
+                if fact is None:
+                    st.info(f"No {coffee_roast_type} coffee beans in the dataset.")
+                elif coffee_fact_type in ("Best", "Worst"):
+                    show_fact([f"**{headline.format(coffee_roast_type)}** {BEAN_BADGES[coffee_fact_type]}",
+                               f"**Name:**\n\n{icon} *{fact.name}* {icon}",
+                               f"**Rating:** {fact.value:.2f}"], animate)
+                else:
+                    show_fact([f"**{headline.format(coffee_roast_type)}** {BEAN_BADGES[coffee_fact_type]}",
+                               f"**Name:**\n\n{icon} *{fact.name}* {icon}",
+                               f"**Price:** ${fact.value:.2f} per ounce"], animate)
 
 
         # Roasters Selection
@@ -251,11 +202,9 @@ def run_dataset_explorer():
             ("Select Fact","Best", "Worst", "Most Expensive", "Most Affordable")
         )
 
-        # Get unique countries from the DataFrame
-        unique_countries = df['country'].unique().tolist()
         roaster_location_type = st.selectbox(
             "Select Location:", 
-            ["Select Location", "Worldwide"] + unique_countries,
+            ["Select Location", "Worldwide"] + cube.countries,
             index=0
         )  # Default to "Select Location"
 
@@ -268,79 +217,20 @@ def run_dataset_explorer():
             if roaster_location_type == "Select Location" or roaster_fact_type == "Select Fact":
                 st.info("Let's find out the most ❓ roaster 🧑‍🌾!")
             else:
-                with st.spinner("Exploring in the mysterious dataset..."):
-                    time.sleep(1)
-                    if roaster_fact_type == "Best":
-                        if roaster_location_type == "Worldwide":
-                            best_roaster = df.groupby('roaster')['rating'].mean().idxmax()
-                            highest_avg_rating = df.groupby('roaster')['rating'].mean().max()
-                            st.markdown("**The Best Roaster Worldwide is...** 🌍🏆")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n✨ *{best_roaster}* ✨")
-                            time.sleep(1)
-                            st.markdown(f"**Average Rating:** {highest_avg_rating:.2f}")
-                        else:
-                            best_roaster_country = df[df['country'] == roaster_location_type].groupby('roaster')['rating'].mean().idxmax()
-                            highest_avg_rating_country = df[df['country'] == roaster_location_type].groupby('roaster')['rating'].mean().max()
-                            st.markdown(f"**The Best Roaster in {roaster_location_type} is...** 🏆")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n✨ *{best_roaster_country}* ✨")
-                            time.sleep(1)
-                            st.markdown(f"**Average Rating:** {highest_avg_rating_country:.2f}")
-
-                    elif roaster_fact_type == "Worst":
-                        if roaster_location_type == "Worldwide":
-                            worst_roaster = df.groupby('roaster')['rating'].mean().idxmin()
-                            lowest_avg_rating = df.groupby('roaster')['rating'].mean().min()
-                            st.markdown("**The Worst Roaster Worldwide is...** 🌍💔")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n💀 *{worst_roaster}* 💀")
-                            time.sleep(1)
-                            st.markdown(f"**Average Rating:** {lowest_avg_rating:.2f}")
-                        else:
-                            worst_roaster_country = df[df['country'] == roaster_location_type].groupby('roaster')['rating'].mean().idxmin()
-                            lowest_avg_rating_country = df[df['country'] == roaster_location_type].groupby('roaster')['rating'].mean().min()
-                            st.markdown(f"**The Worst Roaster in {roaster_location_type} is...** 💔")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n💀 *{worst_roaster_country}* 💀")
-                            time.sleep(1)
-                            st.markdown(f"**Average Rating:** {lowest_avg_rating_country:.2f}")
-
-                    elif roaster_fact_type == "Most Expensive":
-                        if roaster_location_type == "Worldwide":
-                            most_expensive_roaster = df.groupby('roaster')['price_per_ounce'].mean().idxmax()
-                            highest_avg_price = df.groupby('roaster')['price_per_ounce'].mean().max()
-                            st.markdown("**The Most Expensive Roaster Worldwide is...** 💎💲")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n💲 *{most_expensive_roaster}* 💲")
-                            time.sleep(1)
-                            st.markdown(f"**Average Price:** ${highest_avg_price:.2f} per ounce")
-                        else:
-                            most_expensive_roaster_country = df[df['country'] == roaster_location_type].groupby('roaster')['price_per_ounce'].mean().idxmax()
-                            highest_avg_price_country = df[df['country'] == roaster_location_type].groupby('roaster')['price_per_ounce'].mean().max()
-                            st.markdown(f"**The Most Expensive Roaster in {roaster_location_type} is...** 💎💲")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n💲 *{most_expensive_roaster_country}* 💲")
-                            time.sleep(1)
-                            st.markdown(f"**Average Price:** ${highest_avg_price_country:.2f} per ounce")
-
-                    elif roaster_fact_type == "Most Affordable":
-                        if roaster_location_type == "Worldwide":
-                            cheapest_roaster = df.groupby('roaster')['price_per_ounce'].mean().idxmin()
-                            lowest_avg_price = df.groupby('roaster')['price_per_ounce'].mean().min()
-                            st.markdown("**The Most Affordable Roaster Worldwide is...** 🤝💸")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n💸 *{cheapest_roaster}* 💸")
-                            time.sleep(1)
-                            st.markdown(f"**Average Price:** ${lowest_avg_price:.2f} per ounce")
-                        else:
-                            cheapest_roaster_country = df[df['country'] == roaster_location_type].groupby('roaster')['price_per_ounce'].mean().idxmin()
-                            lowest_avg_price_country = df[df['country'] == roaster_location_type].groupby('roaster')['price_per_ounce'].mean().min()
-                            st.markdown(f"**The Most Affordable Roaster in {roaster_location_type} is...** 🤝💸")
-                            time.sleep(1)
-                            st.markdown(f"**Name:**\n\n💸 *{cheapest_roaster_country}* 💸")
-                            time.sleep(1)
-                            st.markdown(f"**Average Price:** ${lowest_avg_price_country:.2f} per ounce")
+                worldwide = roaster_location_type == "Worldwide"
+                fact = cube.roaster(roaster_fact_type, country=None if worldwide else roaster_location_type)
+                headline, icon = ROASTER_HEADLINES[roaster_fact_type]
+                location = "Worldwide" if worldwide else f"in {roaster_location_type}"
+                if fact is None:
+                    st.info(f"No roasters {location} in the dataset.")
+                else:
+                    if roaster_fact_type in ("Best", "Worst"):
+                        value = f"**Average Rating:** {fact.value:.2f}"
+                    else:
+                        value = f"**Average Price:** ${fact.value:.2f} per ounce"
+                    show_fact([f"**{headline.format(location)}** {'🌍' if worldwide else ''}{ROASTER_BADGES[roaster_fact_type]}",
+                               f"**Name:**\n\n{icon} *{fact.name}* {icon}",
+                               value], animate)
     
     # Navigation button to recommendation page
     st.sidebar.title("Navigation")
@@ -348,4 +238,6 @@ def run_dataset_explorer():
         st.switch_page("pages/recommendation.py")
 
 if __name__ == "__main__":
-    run_dataset_explorer()
\ No newline at end of file
+    run_dataset_explorer()
+    if panel_enabled():
+        debug_panel()
\ No newline at end of file
@@ -1,32 +1,42 @@
 import streamlit as st
-from joblib import load
-import pandas as pd
+import numpy as np
 from recommendation import recommend_kmeans, recommend_knn
+from registry import get_catalog_index, get_dataset, get_search_index
+from tracing import debug_panel, panel_enabled, span, traced
 from visuals import plot_feature_comparison, plot_categorical_comparison
 
+@traced('page.recommendation')
+def show_categorical_features(coffee_info):
+    # Beans added to the model by incremental.py may not be in the loaded dataset yet
+    if coffee_info is None:
+        st.markdown("- No details in the dataset yet")
+        return
+    st.markdown(f"- **Country**: {coffee_info['country']}")
+    st.markdown(f"- **Roast**: {coffee_info['roast']}")
+    # Add more features if needed
+
+
 def run_recommendation_system():
     # Step-by-step instructions
     st.header("How to Get Recommendation?")
     st.write("""
     Follow these steps to get personalized coffee recommendations:
     1. **Select Your Model**: Choose between the KNN Model and KMeans Model from the sidebar.
-    2. **Choose Coffee Options**: Select your first and second coffee choices from the dropdown menus.
+    2. **Choose Coffee Options**: Select your first and second coffee choices from the dropdown menus, or search for a coffee by name or roaster to fill them.
     3. **Randomize Choices**: If you want to explore new options, click the "Randomize" buttons to get random coffee choices.
     4. **Get Recommendation**: Click the "Get Recommendation" button to see your personalized coffee recommendation based on your selections.
     5. **View Comparison**: After receiving your recommendation, you can view a comparison of the selected coffees and the recommended coffee.
     """)
     
-    # Load the models
-    knn_model = load('./model/knn_model.joblib')
-    kmeans_model = load('./model/kmeans_model.joblib')
-
-    # Load the dataset to extract coffee names
-    df = pd.read_csv('coffee_cleaned.csv')  
-    coffee_names = df['name'].dropna().unique()  
+    # The models and the dataset are loaded once per process by the registry
+    with span('page.recommendation.load'):
+        df = get_dataset()
+        catalog = get_catalog_index()
+        coffee_names = df['name'].dropna().unique()  
 
     # Function to get random coffee choices
     def get_random_coffees():
-        return pd.Series(coffee_names).sample(n=min(15, len(coffee_names)), random_state=None)
+        return np.random.default_rng().choice(coffee_names, size=min(15, len(coffee_names)), replace=False)
 
     # Initialize session states for random coffee choices
     if "random_coffee_1" not in st.session_state:
@@ -44,9 +54,12 @@ def run_recommendation_system():
 
     # Dropdown for first coffee choice
     st.sidebar.title("Choose Coffee Options")
+    search_term = st.sidebar.text_input("Search coffee by name or roaster:")
+    search_results = get_search_index().search_names(search_term, limit=15) if search_term else None
+
     coffee_1 = st.sidebar.selectbox(
         "Select your first coffee choice:",
-        ["None"] + list(st.session_state.random_coffee_1)
+        ["None"] + (search_results or list(st.session_state.random_coffee_1))
     )
 
     # Button to randomize first coffee choices (placed below the dropdown)
@@ -56,7 +69,7 @@ def run_recommendation_system():
     # Dropdown for second coffee choice
     coffee_2 = st.sidebar.selectbox(
         "Select your second coffee choice (optional):",
-        ["None"] + list(st.session_state.random_coffee_2)
+        ["None"] + (search_results or list(st.session_state.random_coffee_2))
     )
 
     # Button to randomize second coffee choices (placed below the dropdown)
@@ -76,26 +89,18 @@ def run_recommendation_system():
             if model_choice == "KNN Model":
                 st.write("Using KNN Model...")
                 # Call the provided KNN recommendation logic
-                recommendation = recommend_knn(user_input)
+                with span('page.recommendation.recommend'):
+                    recommendation = recommend_knn(user_input)
 
             elif model_choice == "KMeans Model":
                 st.write("Using KMeans Model...")
-                recommendation = recommend_kmeans(user_input)
+                with span('page.recommendation.recommend'):
+                    recommendation = recommend_kmeans(user_input)
 
             # Display the recommendation and plot the feature comparison
             if recommendation:
                 st.success(f"Recommended Coffee: {recommendation}")
-                plot_feature_comparison(user_input, recommendation, df)
-
-                # Extract original categorical data
-                categorical_features = ['name', 'roast', 'country']  # Include other categorical features if needed
-                original_data = df[categorical_features]
-
-                # Get data for input coffee(s)
-                input_data = original_data[original_data['name'].isin(user_input)].reset_index(drop=True)
-
-                # Get data for recommended coffee
-                recommended_data = original_data[original_data['name'] == recommendation].reset_index(drop=True)
+                plot_feature_comparison(user_input, recommendation, catalog)
 
                 st.subheader("Comparison of Categorical Features")
 
@@ -104,20 +109,18 @@ def run_recommendation_system():
 
                 # Display input coffee(s)
                 for i, coffee_name in enumerate(user_input):
-                    coffee_info = input_data[input_data['name'] == coffee_name].iloc[0]
+                    with span('page.recommendation.categorical_lookup'):
+                        coffee_info = catalog.record(coffee_name)
                     with cols[i]:
                         st.markdown(f"**Input Coffee {i + 1}: {coffee_name}**")
-                        st.markdown(f"- **Country**: {coffee_info['country']}")
-                        st.markdown(f"- **Roast**: {coffee_info['roast']}")
-                        # Add more features if needed
+                        show_categorical_features(coffee_info)
 
                 # Display recommended coffee
                 with cols[-1]:
-                    coffee_info = recommended_data.iloc[0]
+                    with span('page.recommendation.categorical_lookup'):
+                        coffee_info = catalog.record(recommendation)
                     st.markdown(f"**Recommended Coffee: {recommendation}**")
-                    st.markdown(f"- **Country**: {coffee_info['country']}")
-                    st.markdown(f"- **Roast**: {coffee_info['roast']}")
-                    # Add more features if needed
+                    show_categorical_features(coffee_info)
 
 
 
@@ -126,4 +129,6 @@ def run_recommendation_system():
         st.switch_page("pages/dataset_explorer.py")
 
 if __name__ == "__main__":
-    run_recommendation_system()
\ No newline at end of file
+    run_recommendation_system()
+    if panel_enabled():
+        debug_panel()
\ No newline at end of file
@@ -0,0 +1,302 @@
+'''
+# Training pipeline
+Scriptable version of the data preparation and model building in `train_models.ipynb`.
+The pipeline runs in explicit stages:
+
+    load -> dedupe -> prices -> countries -> encode -> knn, kmeans -> export
+
+The export also precomputes the recommendation table (see recommendation_table.py), with the frequent pairs of
+the basket log passed as `--pair-log`.
+
+Every stage output is cached on disk under a key hashed from the stage name, its version, its parameters
+and the keys of its inputs (for `load`, the content of the raw CSV). A rerun only executes the stages whose
+key changed. Stages whose inputs are ready run together, in parallel worker processes (knn and kmeans).
+
+Usage:
+    python -m pipeline --raw coffee_clean.csv --workers 2
+    python -m pipeline --raw coffee_clean.csv --pair-log baskets.jsonl
+    python -m pipeline --raw coffee_clean.csv --nprobe 8    # approximate neighbor lists for large catalogs
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+
+from ann import IVFIndex
+from artifacts import DEFAULT_ARTIFACT_PATH, compute_neighbors, make_artifact, save_artifact
+from geo import country_codes, origin_countries, roaster_countries
+from prices import parse_prices
+from recommendation_table import add_table
+from similarity import PROCESSED_COUNTRIES, SimilarityEngine, build_feature_matrix
+
+CACHE_DIR = os.path.join(os.environ.get('COFFEE_CACHE_DIR', './.cache'), 'pipeline')
+
+DEFAULT_PARAMS = {
+    'k': 10,
+    'n_clusters': 100,
+    'random_state': 42,
+    'max_price_per_ounce': 40,
+    # IVF lists probed per bean when building the neighbor lists, None builds them with exact all-pairs search
+    'nprobe': None,
+}
+
+
+# Stages, each takes its inputs' outputs and its parameters and returns a picklable value
+
+def load_stage(params, raw_path):
+    return pd.read_csv(raw_path)
+
+
+def dedupe_stage(params, df):
+    return df.drop_duplicates(subset='name').reset_index(drop=True)
+
+
+def prices_stage(params, df):
+    df = df.copy()
+    parsed = parse_prices(df["est_price"])
+    df["price_per_ounce"] = parsed["price_per_ounce"]
+    df["price_error"] = parsed["error"]
+    return df
+
+
+def prices_summary(df):
+    errors = df["price_error"].value_counts()
+    if not len(errors):
+        return "all prices parsed"
+    reasons = ", ".join(f"{count} {reason}" for reason, count in errors.items())
+    return f"{errors.sum()} unparseable prices ({reasons}), see python -m prices"
+
+
+def countries_stage(params, df):
+    df = df.copy()
+    # The country is the last part of the roaster location, with US states folded into "USA"
+    df["country"] = roaster_countries(df["location"])
+    df["country_code"] = country_codes(df["country"])
+    df["origin_country"] = origin_countries(df["origin"])
+    return df
+
+
+def encode_stage(params, df):
+    """Missing value handling and filtering as in the notebook, then the KNN/KMeans feature matrix."""
+    numeric_features = ['aroma', 'acid', 'body', 'flavor', 'aftertaste']
+    df = df.copy()
+
+    # Fill NaN values in numeric features with the mean of all numeric features
+    feature_mean = df[numeric_features].mean().mean()
+    df[numeric_features] = df[numeric_features].fillna(feature_mean)
+    df['origin_country'] = df['origin_country'].fillna('Other')
+    df = df.dropna(subset=['price_per_ounce', 'roast']).drop(columns='price_error').reset_index(drop=True)
+
+    df['country_processed'] = df['country'].where(df['country'].isin(PROCESSED_COUNTRIES), 'Others')
+    df['price_per_ounce'] = df['price_per_ounce'].astype(float)
+    df['price_per_ounce_log'] = np.log(df['price_per_ounce'])
+    df = df[df['price_per_ounce'] <= params['max_price_per_ounce']].reset_index(drop=True)
+
+    features, feature_columns = build_feature_matrix(df)
+    return {'df': df, 'features': features, 'feature_columns': feature_columns}
+
+
+def knn_stage(params, encoded):
+    df = encoded['df']
+    engine = SimilarityEngine(df['name'].to_numpy(), encoded['features'], df['rating'].to_numpy())
+    # Exact search is quadratic in the catalog size, the IVF index scans only the probed lists
+    index = IVFIndex.build(engine.features) if params['nprobe'] else None
+    return compute_neighbors(engine, k=params['k'], index=index, nprobe=params['nprobe'])
+
+
+def kmeans_stage(params, encoded):
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=params['n_clusters'], random_state=params['random_state'])
+    return kmeans.fit_predict(encoded['features']).astype(np.int32)
+
+
+class Stage:
+    def __init__(self, name, func, inputs=(), params=(), version=1, summary=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = list(params)
+        self.version = version
+        self.summary = summary
+
+
+STAGES = [
+    Stage('load', load_stage),
+    Stage('dedupe', dedupe_stage, ['load']),
+    Stage('prices', prices_stage, ['dedupe'], version=2, summary=prices_summary),
+    Stage('countries', countries_stage, ['prices'], version=2),
+    Stage('encode', encode_stage, ['countries'], params=['max_price_per_ounce']),
+    Stage('knn', knn_stage, ['encode'], params=['k', 'nprobe']),
+    Stage('kmeans', kmeans_stage, ['encode'], params=['n_clusters', 'random_state']),
+]
+
+# Stage outputs the export reads
+EXPORT_INPUTS = ('encode', 'knn', 'kmeans')
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_keys(stages, params, raw_path):
+    """Cache key of every stage, derived from its code version, parameters and input keys."""
+    keys = {}
+    for stage in stages:
+        payload = {
+            'stage': stage.name,
+            'version': stage.version,
+            'params': {name: params[name] for name in stage.params},
+            'inputs': [keys[name] for name in stage.inputs] or [file_hash(raw_path)],
+        }
+        keys[stage.name] = hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return keys
+
+
+def _run_stage(stage, params, inputs, raw_path, cache_path):
+    start = time.perf_counter()
+    args = inputs if stage.inputs else [raw_path]
+    value = stage.func(params, *args)
+    dump(value, cache_path)
+    return value, time.perf_counter() - start
+
+
+def run_pipeline(raw_path='coffee_clean.csv', params=None, cache_dir=CACHE_DIR, workers=2, log=print,
+                 outputs_needed=EXPORT_INPUTS):
+    """
+    Runs the stages whose cached output is missing or invalidated.
+
+    Parameters:
+        outputs_needed (tuple): Stages whose output is returned even when it is cached, the inputs of
+            the export by default. Pass () when the export is current (see `export_is_current`).
+
+    Returns:
+        tuple: (outputs, keys) with the output of every stage that ran or was needed and the cache key of every stage.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    os.makedirs(cache_dir, exist_ok=True)
+    keys = stage_keys(STAGES, params, raw_path)
+    cache_paths = {name: os.path.join(cache_dir, f"{name}-{key}.joblib") for name, key in keys.items()}
+
+    # Cached stages are only loaded when the caller or a stage that has to run needs them
+    stale = {stage.name for stage in STAGES if not os.path.exists(cache_paths[stage.name])}
+    needed = set(stale) | set(outputs_needed)
+    for stage in reversed(STAGES):
+        if stage.name in stale:
+            needed.update(stage.inputs)
+
+    outputs = {}
+    pending = [stage for stage in STAGES if stage.name in needed]
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InlineExecutor() as executor:
+        while pending:
+            ready = [stage for stage in pending
+                     if stage.name not in stale or all(name in outputs for name in stage.inputs)]
+            futures = {}
+            for stage in ready:
+                if stage.name in stale:
+                    inputs = [outputs[name] for name in stage.inputs]
+                    futures[stage.name] = executor.submit(_run_stage, stage, params, inputs, raw_path, cache_paths[stage.name])
+                else:
+                    outputs[stage.name] = load(cache_paths[stage.name])
+                    log(f"{stage.name:<10} cached   {keys[stage.name]}")
+            for stage in ready:
+                if stage.name in futures:
+                    outputs[stage.name], seconds = futures[stage.name].result()
+                    summary = f", {stage.summary(outputs[stage.name])}" if stage.summary else ""
+                    log(f"{stage.name:<10} ran      {keys[stage.name]} in {seconds:.2f}s{summary}")
+            pending = [stage for stage in pending if stage.name not in outputs]
+    return outputs, keys
+
+
+class _InlineExecutor:
+    """Runs submitted calls immediately, used when workers <= 1."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, func, *args):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+def export_key(keys, pair_log=None):
+    """Key of the export, from the knn and kmeans stage keys and the content of the basket log."""
+    pair_key = file_hash(pair_log) if pair_log else ''
+    return hashlib.sha256(f"{keys['knn']}:{keys['kmeans']}:{pair_key}".encode('utf-8')).hexdigest()[:16]
+
+
+def export_is_current(key, csv_path='coffee_cleaned.csv', artifact_path=DEFAULT_ARTIFACT_PATH):
+    """Whether the cleaned dataset and the artifact were written by an export with `key`."""
+    manifest_path = os.path.join(artifact_path, 'manifest.json')
+    if not (os.path.exists(manifest_path) and os.path.exists(csv_path)):
+        return False
+    with open(manifest_path) as f:
+        return json.load(f).get('pipeline_key') == key
+
+
+def export(outputs, keys, csv_path='coffee_cleaned.csv', artifact_path=DEFAULT_ARTIFACT_PATH, pair_log=None, workers=1):
+    """
+    Writes the cleaned dataset (with cluster labels) and the model artifact with its recommendation table,
+    unless they are current.
+    """
+    key = export_key(keys, pair_log)
+    if export_is_current(key, csv_path, artifact_path):
+        return False
+
+    encoded = outputs['encode']
+    df = encoded['df'].copy()
+    df['cluster'] = outputs['kmeans']
+    df.to_csv(csv_path, index=False)
+
+    artifact = make_artifact(
+        df['name'].tolist(), encoded['features'], df['rating'].to_numpy(), df['price_per_ounce'].to_numpy(),
+        outputs['knn'], outputs['kmeans'], feature_columns=encoded['feature_columns'],
+        metadata={'pipeline_key': key},
+    )
+    add_table(artifact, pair_log, workers=workers)
+    save_artifact(artifact_path, artifact)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the coffee recommendation models.")
+    parser.add_argument('--raw', default='coffee_clean.csv', help="Raw review dataset")
+    parser.add_argument('--out-csv', default='coffee_cleaned.csv')
+    parser.add_argument('--artifact', default=DEFAULT_ARTIFACT_PATH)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--k', type=int, default=DEFAULT_PARAMS['k'])
+    parser.add_argument('--n-clusters', type=int, default=DEFAULT_PARAMS['n_clusters'])
+    parser.add_argument('--nprobe', type=int, default=None,
+                        help="Build the neighbor lists with the IVF index probing this many lists (default: exact search)")
+    parser.add_argument('--pair-log', default=None, help="Basket log whose frequent pairs are precomputed")
+    args = parser.parse_args(argv)
+
+    params = {**DEFAULT_PARAMS, 'k': args.k, 'n_clusters': args.n_clusters, 'nprobe': args.nprobe}
+    # The export key only depends on stage keys, so a current export needs none of the cached outputs
+    current = export_is_current(export_key(stage_keys(STAGES, params, args.raw), args.pair_log), args.out_csv, args.artifact)
+    outputs, keys = run_pipeline(args.raw, params, cache_dir=args.cache_dir, workers=args.workers,
+                                 outputs_needed=() if current else EXPORT_INPUTS)
+    if not current and export(outputs, keys, args.out_csv, args.artifact, args.pair_log, args.workers):
+        print(f"export     wrote {args.out_csv} and {args.artifact}")
+    else:
+        print("export     outputs are up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+'''
+# Price normalization
+Converts the scraped `est_price` strings ("$14.80/12 ounces", "NT $450/8 ounces", "CAD $22.00/340 grams", ...)
+to US dollars per ounce in one vectorized pass:
+
+*   One compiled regex extracts currency, amount, quantity and unit of every string through pandas string methods.
+*   Currencies are mapped to ISO codes through an alias table and converted with a rate table.
+*   Rows that cannot be parsed are kept and get a reason instead of silently becoming None.
+
+Usage:
+    python -m prices coffee_clean.csv    # summary and unparseable prices with their reasons
+'''
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+# Approximate conversion rates to USD
+USD_RATES = {
+    'USD': 1.0,
+    'TWD': 0.032,     # New Taiwan Dollar
+    'CAD': 0.75,      # Canadian Dollar
+    'AED': 0.27,      # United Arab Emirates Dirham
+    'AUD': 0.65,      # Australian Dollar
+    'MXN': 0.057,     # Mexican Peso
+    'HKD': 0.13,      # Hong Kong Dollar
+    'IDR': 0.000065,  # Indonesian Rupiah
+    'KRW': 0.00076,   # South Korean Won
+    'CNY': 0.1381,    # RMB
+    'MYR': 0.21,      # Malaysian Ringgit
+}
+
+# Currency spellings found in the reviews, upper-cased without whitespace
+CURRENCY_ALIASES = {
+    '$': 'USD', 'US$': 'USD', 'USD': 'USD', '#': 'USD',
+    'NT$': 'TWD', 'NTD$': 'TWD', 'NTD': 'TWD', 'NT': 'TWD', 'TWD': 'TWD',
+    'CAD$': 'CAD', 'CAD': 'CAD', 'C$': 'CAD',
+    'AED': 'AED',
+    'AUD$': 'AUD', 'AUD': 'AUD', 'A$': 'AUD',
+    'PESOS': 'MXN', 'MXN': 'MXN',
+    'HK$': 'HKD', 'HKD$': 'HKD', 'HKD': 'HKD',
+    'IDR': 'IDR', 'RP': 'IDR',
+    'KRW': 'KRW',
+    'RMB': 'CNY', 'CNY': 'CNY',
+    'RM': 'MYR', 'MYR': 'MYR',
+}
+
+OUNCES_PER_UNIT = {
+    'ounce': 1.0, 'ounces': 1.0, 'oz': 1.0,
+    'gram': 0.035274, 'grams': 0.035274, 'g': 0.035274,
+    'kilogram': 35.274, 'kilograms': 35.274, 'kg': 35.274,
+    'pound': 16.0, 'pounds': 16.0, 'lb': 16.0, 'lbs': 16.0,
+}
+
+# <currency> <amount> <currency> / <quantity> <unit>, the currency may stand before or after the amount
+PRICE_PATTERN = re.compile(r'''
+    ^\s*
+    (?P<prefix>[^\d/]*?)\s*
+    (?P<amount>\d+(?:,\d{3})*(?:\.\d+)?)\s*
+    (?P<suffix>[^\d/]*?)\s*
+    /\s*
+    (?P<quantity>\d+(?:\.\d+)?)?\s*
+    (?P<unit>[^\d\s/.]+)\.?
+    \s*$
+''', re.VERBOSE)
+
+
+def parse_prices(prices):
+    """
+    Parses price strings into their parts and the price in USD per ounce.
+
+    Scraped prices repeat a lot ("$18.00/12 ounces"), so every distinct string is parsed once
+    and the results are broadcast back to the rows.
+
+    Parameters:
+        prices (Series): Price strings such as "$14.80/12 ounces".
+
+    Returns:
+        DataFrame: Columns currency (ISO code), amount, quantity, unit, price_per_ounce and error,
+            on the index of `prices`. price_per_ounce is NaN and error holds the reason for unparseable rows.
+    """
+    codes, uniques = pd.factorize(prices.astype('string'))
+    # The extra last row stands for missing prices, which take() picks for the code -1
+    parsed = _parse_distinct(pd.Series([*uniques, pd.NA], dtype='string'))
+    return parsed.take(codes).set_axis(prices.index)
+
+
+def _parse_distinct(text):
+    parts = text.str.extract(PRICE_PATTERN)
+
+    token = parts['prefix'].where(parts['prefix'].str.len() > 0, parts['suffix'])
+    token = token.str.replace(r'\s+', '', regex=True).str.upper()
+    currency = token.map(CURRENCY_ALIASES)
+    unit = parts['unit'].str.lower()
+
+    amount = pd.to_numeric(parts['amount'].str.replace(',', '', regex=False), errors='coerce')
+    quantity = pd.to_numeric(parts['quantity'], errors='coerce').fillna(1.0)  # "$20/pound"
+    rate = currency.map(USD_RATES).astype(float)
+    ounces = quantity * unit.map(OUNCES_PER_UNIT).astype(float)
+
+    result = pd.DataFrame({
+        'currency': currency.astype('string'),
+        'amount': amount.astype(float),
+        'quantity': quantity.where(parts['amount'].notna()).astype(float),
+        'unit': unit,
+        'price_per_ounce': (amount * rate / ounces).astype(float),
+    })
+
+    # First failing check wins, the checks are ordered from missing input to the conversion
+    conditions = [
+        text.isna().to_numpy(dtype=bool, na_value=True),
+        parts['amount'].isna().to_numpy(dtype=bool, na_value=True),
+        (token.fillna('') == '').to_numpy(dtype=bool),
+        currency.isna().to_numpy(dtype=bool),
+        unit.map(OUNCES_PER_UNIT).isna().to_numpy(dtype=bool),
+        ~(ounces > 0).to_numpy(dtype=bool, na_value=False),
+    ]
+    reasons = [
+        'missing price',
+        'unrecognized format',
+        'missing currency',
+        'unknown currency: ' + token.fillna('').to_numpy(dtype=object),
+        'unknown unit: ' + unit.fillna('').to_numpy(dtype=object),
+        'zero quantity',
+    ]
+    result['error'] = pd.Series(np.select(conditions, reasons, default=None), dtype='string')
+    result.loc[result['error'].notna(), 'price_per_ounce'] = np.nan
+    return result
+
+
+def price_per_ounce(prices):
+    """Price in USD per ounce of every price string, NaN where it cannot be parsed."""
+    return parse_prices(prices)['price_per_ounce']
+
+
+def unparseable(parsed, prices):
+    """Rows of `parse_prices` output that failed, with the original string and the reason."""
+    failed = parsed['error'].notna()
+    return pd.DataFrame({'est_price': prices[failed], 'error': parsed.loc[failed, 'error']})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse the est_price column of a review dataset.")
+    parser.add_argument('csv', nargs='?', default='coffee_clean.csv')
+    parser.add_argument('--column', default='est_price')
+    parser.add_argument('--limit', type=int, default=50, help="Unparseable rows to print")
+    args = parser.parse_args(argv)
+
+    prices = pd.read_csv(args.csv, usecols=[args.column])[args.column]
+    parsed = parse_prices(prices)
+    failed = unparseable(parsed, prices)
+    print(f"{len(prices) - len(failed)} of {len(prices)} prices parsed")
+    print(parsed['currency'].value_counts().to_string())
+    if len(failed):
+        print("\nUnparseable prices by reason:")
+        print(failed['error'].value_counts().to_string())
+        print()
+        print(failed.head(args.limit).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+'''
+# Quantized features
+Compact copy of the feature matrix for memory-bound similarity search. Every coffee bean is encoded as a few bytes:
+
+*   the flavor scores (every non-binary column) as int8, `round(value * scale)` with one scale per column.
+    Integral columns within the int8 range keep a scale of 1 and are stored exactly, like the notebook's scores
+*   the one-hot roast and country columns bit-packed, eight columns per byte
+
+The bytes are stored as little-endian uint16 words, word-major: word j of all beans is one contiguous array, so a
+scan reads each word sequentially. Next to them, the squared norm of every encoded bean (for the cosine metric).
+With the notebook's 16 features a bean takes 8 + 4 = 12 bytes instead of 64 (float32) or 128 (float64).
+
+A search never decodes the beans. Per query, a table holds the distance contribution of every possible word value
+(65536 entries, built from the 256 values of each byte), and the distance of a bean is the sum of its words' table
+entries: four lookups for 16 features, against a 64-byte row for the exact engine. This is exact for the encoded
+values. The `rerank * k` closest beans are then re-ranked against the full-precision matrix, which only touches those
+rows, so the results match `SimilarityEngine.kneighbors` whenever the true neighbors are among the candidates
+(always, when every column is stored exactly).
+
+The compact arrays are stored next to the float32 features, not instead of them: the re-ranking reads the full rows,
+so an artifact takes 12 bytes per bean more. The search only saves memory when it is used (`recommendation.COMPACT_RERANK`,
+off by default) on a memory-mapped artifact, where a scan reads the compact words and only the re-ranked rows of the
+float32 matrix are paged in.
+
+Usage:
+    python -m quantized --queries 1000   # memory, latency and recall vs exact search, --artifact for another model
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from similarity import METRICS
+
+# Beans scanned at once, the distance block stays in the CPU cache while the words are added up
+BLOCK_ROWS = 65536
+
+# Candidates per requested neighbor that are re-ranked at full precision
+DEFAULT_RERANK = 4
+
+# Arrays of a CompactIndex as stored in a model artifact
+COMPACT_ARRAYS = ('compact_codes', 'compact_sq_norms', 'compact_columns', 'compact_scales')
+
+# Bit values of every byte, in np.packbits order (first column in the highest bit)
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32)
+
+
+def quantize(features):
+    """
+    Encodes a feature matrix.
+
+    Returns:
+        tuple: (codes, columns, scales), see `CompactIndex`.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    binary = np.all((features == 0) | (features == 1), axis=0)
+    columns = np.concatenate([np.flatnonzero(~binary), np.flatnonzero(binary)]).astype(np.int32)
+
+    numeric = features[:, ~binary]
+    peaks = np.abs(numeric).max(axis=0) if len(numeric) else np.zeros(numeric.shape[1], dtype=np.float32)
+    exact = (peaks <= 127) & np.all(numeric == np.round(numeric), axis=0)
+    scales = np.where(exact | (peaks == 0), 1.0, 127.0 / np.maximum(peaks, 1e-30)).astype(np.float32)
+    scores = np.clip(np.round(numeric * scales), -127, 127).astype(np.int8)
+    bits = np.packbits(features[:, binary].astype(np.uint8), axis=1)
+
+    code_bytes = np.concatenate([scores.view(np.uint8), bits], axis=1)
+    if code_bytes.shape[1] % 2:
+        code_bytes = np.concatenate([code_bytes, np.zeros((len(code_bytes), 1), dtype=np.uint8)], axis=1)
+    codes = np.ascontiguousarray(np.ascontiguousarray(code_bytes).view('<u2').T)
+    return codes, columns, scales
+
+
+class CompactIndex:
+    """
+    Nearest neighbor search on the encoded features with full-precision re-ranking.
+
+    Parameters:
+        codes (ndarray): uint16 code words, shape (n_words, n_beans), see `quantize`.
+        sq_norms (ndarray): Squared norm of every encoded bean, computed when None.
+        columns (ndarray): Feature column of every encoded column, the int8 columns first.
+        scales (ndarray): Scale of every int8 column.
+        features (ndarray): Full-precision feature matrix, for the queries and the re-ranking.
+    """
+
+    def __init__(self, codes, sq_norms, columns, scales, features):
+        self.codes = codes
+        self.columns = np.asarray(columns, dtype=np.int32)
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.features = features
+        self.n_numeric = len(self.scales)
+        self.n_binary = len(self.columns) - self.n_numeric
+
+        # Encoded value of every (byte, byte value, column within the byte), padding columns are never set
+        n_bytes = 2 * len(codes)
+        self._values = np.zeros((n_bytes, 256, 8), dtype=np.float32)
+        signed = np.arange(256, dtype=np.uint8).view(np.int8).astype(np.float32)
+        self._values[:self.n_numeric, :, 0] = signed[None, :] / self.scales[:, None]
+        n_bit_bytes = -(-self.n_binary // 8)
+        self._values[self.n_numeric:self.n_numeric + n_bit_bytes] = _BYTE_BITS
+
+        if sq_norms is None:
+            sq_norms = self.scan_all(np.zeros(len(self.columns), dtype=np.float32), 'euclidean', squared=True)
+        self.sq_norms = sq_norms
+
+    @classmethod
+    def from_features(cls, features):
+        codes, columns, scales = quantize(features)
+        return cls(codes, None, columns, scales, features)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """The artifact's stored compact arrays (see `make_artifact`), or an encoding of its features."""
+        if all(key in artifact.arrays for key in COMPACT_ARRAYS):
+            return cls(
+                artifact.compact_codes, artifact.compact_sq_norms, artifact.compact_columns, artifact.compact_scales,
+                artifact.features,
+            )
+        return cls.from_features(artifact.features)
+
+    def arrays(self):
+        """The compact arrays under their artifact names."""
+        return dict(zip(COMPACT_ARRAYS, (self.codes, self.sq_norms, self.columns, self.scales)))
+
+    def __len__(self):
+        return self.codes.shape[1]
+
+    def nbytes(self):
+        return self.codes.nbytes + self.sq_norms.nbytes
+
+    def word_tables(self, query, metric):
+        """Distance contribution of every value of every code word for one query vector, shape (n_words, 65536)."""
+        query = np.asarray(query, dtype=np.float32)[self.columns]
+        per_byte = np.zeros((len(self._values), 8), dtype=np.float32)
+        per_byte[:self.n_numeric, 0] = query[:self.n_numeric]
+        binary = np.zeros(-(-self.n_binary // 8) * 8, dtype=np.float32)
+        binary[:self.n_binary] = query[self.n_numeric:]
+        per_byte[self.n_numeric:self.n_numeric + len(binary) // 8] = binary.reshape(-1, 8)
+
+        diff = per_byte[:, None, :] - self._values
+        if metric == 'euclidean':
+            tables = np.einsum('bvc,bvc->bv', diff, diff)
+        elif metric == 'manhattan':
+            tables = np.abs(diff).sum(axis=2)
+        else:
+            tables = np.einsum('bc,bvc->bv', per_byte, self._values)
+        # Word value = low byte + 256 * high byte
+        return (tables[1::2, :, None] + tables[0::2, None, :]).reshape(len(self.codes), -1)
+
+    def scan_all(self, query, metric='euclidean', squared=False):
+        """Distance from one query vector to every encoded bean."""
+        tables = self.word_tables(query, 'cosine' if metric == 'cosine' else metric)
+        dist = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = dist[start:start + BLOCK_ROWS]
+            np.take(tables[0], self.codes[0, start:start + BLOCK_ROWS], out=block)
+            for word in range(1, len(self.codes)):
+                block += np.take(tables[word], self.codes[word, start:start + BLOCK_ROWS])
+
+        if metric == 'euclidean' and not squared:
+            np.sqrt(np.maximum(dist, 0.0, out=dist), out=dist)
+        elif metric == 'cosine':
+            norms = np.sqrt(self.sq_norms) * np.linalg.norm(query)
+            dist = 1.0 - dist / np.maximum(norms, 1e-12)
+        return dist
+
+    def candidates(self, queries, n_candidates, metric='euclidean', exclude_ids=None):
+        """
+        The `n_candidates` closest encoded beans of every query vector, unordered.
+
+        Parameters:
+            queries (ndarray): Query vectors, shape (n_queries, n_features).
+            exclude_ids (array-like): Optional bean to leave out per query (the query bean itself).
+
+        Returns:
+            ndarray: Bean IDs, shape (n_queries, n_candidates).
+        """
+        queries = np.atleast_2d(queries)
+        n_candidates = min(n_candidates, len(self) - (exclude_ids is not None))
+        found = np.empty((len(queries), n_candidates), dtype=np.int64)
+        for row, query in enumerate(queries):
+            dist = self.scan_all(query, metric)
+            if exclude_ids is not None:
+                dist[exclude_ids[row]] = np.inf
+            found[row] = np.argpartition(dist, n_candidates - 1)[:n_candidates]
+        return found
+
+    def kneighbors(self, query_ids, k=10, metric='euclidean', rerank=DEFAULT_RERANK, exclude_self=True):
+        """
+        Finds the k nearest coffee beans for each query bean, like `SimilarityEngine.kneighbors`.
+        `rerank * k` candidates are found on the encoded beans, then sorted by their full-precision distance.
+
+        Returns:
+            tuple: (indices, distances), both of shape (n_queries, k), sorted by distance.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+        query_ids = np.atleast_1d(np.asarray(query_ids, dtype=np.int64))
+        queries = np.asarray(self.features[query_ids], dtype=np.float32)
+        k = min(k, len(self) - 1 if exclude_self else len(self))
+        candidates = self.candidates(
+            queries, max(k, int(rerank * k)), metric, exclude_ids=query_ids if exclude_self else None
+        )
+
+        # Exact distances of the candidates only, (n_queries, n_candidates, n_features)
+        rows = np.asarray(self.features[candidates.ravel()], dtype=np.float32).reshape(*candidates.shape, -1)
+        if metric == 'euclidean':
+            dist = np.linalg.norm(rows - queries[:, None, :], axis=2)
+        elif metric == 'manhattan':
+            dist = np.abs(rows - queries[:, None, :]).sum(axis=2)
+        else:
+            dots = np.einsum('qcf,qf->qc', rows, queries)
+            norms = np.linalg.norm(rows, axis=2) * np.linalg.norm(queries, axis=1)[:, None]
+            dist = 1.0 - dots / np.maximum(norms, 1e-12)
+
+        # Beans at the same distance are ordered by bean ID
+        order = np.lexsort((candidates, dist), axis=1)[:, :k]
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(dist, order, axis=1)
+
+
+def recall(engine, index, query_ids, k=10, metric='euclidean', rerank=DEFAULT_RERANK):
+    """
+    Share of the compact search results that are true k nearest neighbors. A result counts when its exact distance is
+    within the k-th exact distance, so beans tied with the k-th neighbor are not counted as misses.
+    """
+    hits = 0
+    for query_id in query_ids:
+        dist = engine.distances(engine.features[[query_id]], metric)[0]
+        dist[query_id] = np.inf
+        found, _ = index.kneighbors([query_id], k=k, metric=metric, rerank=rerank)
+        hits += np.sum(dist[found[0]] <= np.partition(dist, k - 1)[k - 1] + 1e-5)
+    return hits / (len(query_ids) * k)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory footprint, latency and recall of the compact feature search.")
+    parser.add_argument('--artifact', default=None, help="Artifact directory (default: the registry's model)")
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=float, nargs='+', default=[1, DEFAULT_RERANK])
+    args = parser.parse_args(argv)
+
+    if args.artifact:
+        from artifacts import load_artifact
+        artifact = load_artifact(args.artifact)
+    else:
+        from registry import get_artifact
+        artifact = get_artifact()
+    engine, index = artifact.engine(), artifact.compact_index()
+    full = np.asarray(artifact.features).nbytes
+    exact = int(np.sum(index.scales == 1))
+    print(f"{len(index)} beans, {len(index.columns)} features: {index.n_numeric} int8 ({exact} exact), "
+          f"{index.n_binary} bit-packed")
+    print(f"float64 {2 * full / 2**20:8.1f} MB ({2 * full / len(index):.0f} B/bean)")
+    print(f"float32 {full / 2**20:8.1f} MB ({full / len(index):.0f} B/bean)")
+    print(f"compact {index.nbytes() / 2**20:8.1f} MB ({index.nbytes() / len(index):.0f} B/bean), "
+          f"{full / index.nbytes():.1f}x smaller than float32, {2 * full / index.nbytes():.1f}x than float64")
+    print(f"stored  {(full + index.nbytes()) / 2**20:8.1f} MB: the artifact keeps the float32 features for re-ranking")
+
+    query_ids = np.random.default_rng(0).choice(len(index), min(args.queries, len(index)), replace=False)
+    timed = query_ids[:100]
+    for metric in METRICS:
+        start = time.perf_counter()
+        for query_id in timed:
+            engine.kneighbors([query_id], k=args.k, metric=metric)
+        exact_ms = (time.perf_counter() - start) * 1000 / len(timed)
+        for rerank in args.rerank:
+            start = time.perf_counter()
+            for query_id in timed:
+                index.kneighbors([query_id], k=args.k, metric=metric, rerank=rerank)
+            compact_ms = (time.perf_counter() - start) * 1000 / len(timed)
+            score = recall(engine, index, query_ids, k=args.k, metric=metric, rerank=rerank)
+            print(f"{metric:<10} rerank {rerank:>3g}: recall@{args.k} {score:.4f}  "
+                  f"{compact_ms:7.2f} ms/query  (exact {exact_ms:7.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
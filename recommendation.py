@@ -1,68 +1,205 @@
 '''
 # Using KNN model
-Calculation the distance between one coffee bean and all other coffee beans, return the top10 nearest neighbors.
-*   For a single coffee bean: Recommend the highest-rated coffee bean among the top10 nearest neighbors.
+Calculation the distance between one coffee bean and all other coffee beans, return the top k (10 by default) nearest neighbors.
+k and the distance metric ('euclidean', 'manhattan' or 'cosine') can be passed per request.
+*   For a single coffee bean: Recommend the highest-rated coffee bean among the top k nearest neighbors.
 *   For two coffee beans:
-If there is an overlap between the 2 sets of top10 nearest neighbors for each inputted coffee beans, recommend the highest-rated coffee bean in the overlap.
-If no overlap, combine the two sets of nearest neighbors and recommend the highest-rated coffee bean among all 20 neighbors
+If there is an overlap between the 2 sets of top k nearest neighbors for each inputted coffee beans, recommend the highest-rated coffee bean in the overlap.
+If no overlap, combine the two sets of nearest neighbors and recommend the highest-rated coffee bean among all 2k neighbors.
+Ties go to the lowest bean ID, so the order of the two beans does not matter.
+*   For larger baskets: Recommend the bean that appears in the most neighbor lists of the basket (see basket mode)
+
+# Basket mode
+`recommend_basket` ranks the top-N beans for a basket of any size, e.g. a customer's purchase history, with a score per bean:
+*   KNN: the neighbor lists of all basket beans are counted in one pass, a bean scores the share of basket beans
+    that list it among their k nearest neighbors. Ties go to the higher rating, then to the closer neighbor.
+    For one or two beans the top bean is the recommendation above.
+*   KMeans: a bean scores the share of basket beans in its cluster, ties go to the higher rating.
+The basket itself is never recommended. Both read at most k (KNN) or n + basket size (KMeans) beans per basket bean,
+so the latency grows with the basket, not with the catalog.
+
+# Precomputed recommendations
+`recommend_knn_ids` and `recommend_kmeans_ids` first look up the artifact's recommendation table, which holds the
+answer for every single bean and the most frequent pairs (see recommendation_table.py), and compute the answer
+when the table does not hold it.
 '''
 
-# Load the pre-exported dictionary
-from joblib import load
-
-# Load the KNN model
-nearest_neighbors = load('./model/knn_model.joblib')
-clusters_dict = load('./model/kmeans_model.joblib')
-
-
-def recommend_knn(user_input_names):
-    if len(user_input_names) == 1:
+import numpy as np
+from registry import get_artifact
+from tracing import span, traced
+
+# Lists probed by the approximate (IVF) index for queries beyond the exported top-k lists,
+# None always uses exact search. Higher values trade latency for recall, see ann.py.
+ANN_NPROBE = None
+
+# Candidates per neighbor of the compact (int8 / bit-packed) search for queries beyond the exported top-k lists
+# that the IVF index does not answer, re-ranked at full precision. None searches the float32 features, see quantized.py.
+COMPACT_RERANK = None
+
+
+def get_engine():
+    return get_artifact().engine()
+
+
+def get_cluster_store():
+    return get_artifact().cluster_store()
+
+
+def neighbor_matrix(input_ids, k=10, metric='euclidean', nprobe=None):
+    """
+    Neighbor IDs of the input beans as an (n_inputs, k) array, closest first and padded with -1.
+    Read from the exported top-k lists when they cover the request, otherwise searched with the
+    IVF index (euclidean, when `nprobe` or ANN_NPROBE is set), the compact index (when COMPACT_RERANK is set)
+    or exactly.
+    """
+    artifact = get_artifact()
+    nprobe = nprobe or ANN_NPROBE
+    if metric == 'euclidean' and k <= artifact.k:
+        return np.asarray(artifact.neighbors[input_ids, :k])
+    if metric == 'euclidean' and nprobe:
+        neighbors, _ = artifact.ann_index().kneighbors(input_ids, k=k, nprobe=nprobe)
+    elif COMPACT_RERANK:
+        neighbors, _ = artifact.compact_index().kneighbors(input_ids, k=k, metric=metric, rerank=COMPACT_RERANK)
+    else:
+        neighbors, _ = artifact.engine().kneighbors(input_ids, k=k, metric=metric)
+    return neighbors
+
+
+@traced('recommend.neighbors')
+def nearest_neighbors(input_ids, k=10, metric='euclidean', nprobe=None):
+    """Neighbor IDs of each input bean, closest first, see `neighbor_matrix`."""
+    return [row[row >= 0] for row in neighbor_matrix(input_ids, k=k, metric=metric, nprobe=nprobe)]
+
+
+def rank_neighbor_votes(neighbors, exclude_ids, ratings, n=10):
+    """
+    Ranks the beans of a basket's neighbor lists by the number of lists they appear in.
+
+    Parameters:
+        neighbors (ndarray): Neighbor IDs of each basket bean, shape (basket_size, k), padded with -1.
+        exclude_ids (array-like): Beans that must not be recommended, i.e. the basket.
+        ratings (ndarray): Rating of each coffee bean, indexed by bean ID.
+        n (int): Number of beans to return.
+
+    Returns:
+        tuple: (bean_ids, scores) arrays, best first. The score is the share of lists containing the bean,
+            ties go to the higher rating and then to the best position in any list.
+    """
+    neighbors = np.asarray(neighbors, dtype=np.int64)
+    positions = np.broadcast_to(np.arange(neighbors.shape[1]), neighbors.shape)
+    valid = (neighbors >= 0) & ~np.isin(neighbors, exclude_ids)
+    candidates, inverse, votes = np.unique(neighbors[valid], return_inverse=True, return_counts=True)
+    closest = np.full(len(candidates), neighbors.shape[1])
+    np.minimum.at(closest, inverse, positions[valid])
+    best = np.lexsort((closest, -ratings[candidates], -votes))[:n]
+    return candidates[best], votes[best] / len(neighbors)
+
+
+@traced('recommend.knn_basket')
+def rank_knn_basket_ids(input_ids, n=10, k=10, metric='euclidean', nprobe=None):
+    """Top `n` KNN recommendations for a basket of bean IDs of any size, as (bean_ids, scores) arrays."""
+    input_ids = np.unique(np.asarray(input_ids, dtype=np.int64))
+    neighbors = neighbor_matrix(input_ids, k=k, metric=metric, nprobe=nprobe)
+    return rank_neighbor_votes(neighbors, input_ids, get_artifact().ratings, n=n)
+
+
+@traced('recommend.kmeans_basket')
+def rank_kmeans_basket_ids(input_ids, n=10):
+    """Top `n` KMeans recommendations for a basket of bean IDs of any size, as (bean_ids, scores) arrays."""
+    return get_cluster_store().rank(input_ids, n=n)
+
+
+def lookup_table(input_ids, model, k=None, metric='euclidean'):
+    """Precomputed recommendation, -1 for none, None if the current artifact's table does not hold the request."""
+    table = get_artifact().recommendation_table()
+    if table is None:
+        return None
+    with span('recommend.table'):
+        return table.lookup(input_ids, model, k=k, metric=metric)
+
+
+@traced('recommend.knn')
+def recommend_knn_ids(input_ids, k=10, metric='euclidean', nprobe=None):
+    """Bean ID of the KNN recommendation for the given input bean IDs, None if there is no candidate."""
+    best_id = lookup_table(input_ids, 'knn', k=k, metric=metric)
+    if best_id is not None:
+        return best_id if best_id >= 0 else None
+
+    artifact = get_artifact()
+    neighbors = nearest_neighbors(input_ids, k=k, metric=metric, nprobe=nprobe)
+
+    if len(input_ids) == 1:
         # Single input: Recommend the highest-rated neighbor
-        coffee_name = user_input_names[0]
-        neighbors = nearest_neighbors[coffee_name]["neighbors"]
-        ratings = nearest_neighbors[coffee_name]["ratings"]
-        highest_rated_idx = ratings.index(max(ratings))
-        return neighbors[highest_rated_idx]
+        candidates = neighbors[0]
 
-    elif len(user_input_names) == 2:
+    elif len(input_ids) == 2:
         # Two inputs: Check for overlap
-        coffee_1, coffee_2 = user_input_names
-        neighbors_1 = set(nearest_neighbors[coffee_1]["neighbors"])
-        neighbors_2 = set(nearest_neighbors[coffee_2]["neighbors"])
-
-        overlap = neighbors_1.intersection(neighbors_2)
-        if overlap:
+        overlap = np.intersect1d(neighbors[0], neighbors[1])
+        if len(overlap):
             # Recommend the highest-rated coffee in the overlap
-            overlap_ratings = [(name, nearest_neighbors[name]["ratings"][0]) for name in overlap]
-            return max(overlap_ratings, key=lambda x: x[1])[0]
+            candidates = overlap
         else:
-            # Recommend the highest-rated coffee among all 20 neighbors
-            combined_neighbors = list(neighbors_1.union(neighbors_2))
-            combined_ratings = [(name, nearest_neighbors[name]["ratings"][0]) for name in combined_neighbors]
-            return max(combined_ratings, key=lambda x: x[1])[0]
+            # Recommend the highest-rated coffee among all 2k neighbors
+            candidates = np.union1d(neighbors[0], neighbors[1])
+    else:
+        # Larger baskets: the best bean of the basket ranking
+        best_ids, _ = rank_knn_basket_ids(input_ids, n=1, k=k, metric=metric, nprobe=nprobe)
+        return int(best_ids[0]) if len(best_ids) else None
 
+    if not len(candidates):
+        return None
+
+    return int(candidates[np.argmax(artifact.ratings[candidates])])
 
-def recommend_kmeans(user_input_names):
-    input_clusters = set()
-    relevant_beans = []
 
-    for name in user_input_names:
-        # Add the cluster ID to input_clusters
-        input_clusters.add(clusters_dict[name]["cluster"])
+@traced('recommend.kmeans')
+def recommend_kmeans_ids(input_ids):
+    """Bean ID of the highest-rated coffee in the clusters of the inputs, excluding the inputs."""
+    best_id = lookup_table(input_ids, 'kmeans')
+    if best_id is not None:
+        return best_id if best_id >= 0 else None
+    return get_artifact().cluster_store().recommend(input_ids)
 
-        # Add all neighbors to relevant beans
-        neighbors = clusters_dict[name]["neighbors"]
-        ratings = clusters_dict[name]["ratings"]
-        relevant_beans.extend(zip(neighbors, ratings))
 
-    # Filter unique beans if input clusters are different
-    if len(input_clusters) > 1:
-        # Deduplicate neighbors
-        relevant_beans = list({bean[0]: bean for bean in relevant_beans}.values())
+def recommend_knn(user_input_names, k=10, metric='euclidean', nprobe=None):
+    names = get_artifact().names
+    with span('recommend.lookup'):
+        input_ids = names.ids(user_input_names)
+    best_id = recommend_knn_ids(input_ids, k=k, metric=metric, nprobe=nprobe)
+    return None if best_id is None else names[best_id]
 
-    # Recommend the highest-rated coffee bean
-    recommended_bean = max(relevant_beans, key=lambda x: x[1])
-    return recommended_bean[0]
+
+def recommend_kmeans(user_input_names):
+    names = get_artifact().names
+    with span('recommend.lookup'):
+        input_ids = names.ids(user_input_names)
+    best_id = recommend_kmeans_ids(input_ids)
+    return None if best_id is None else names[best_id]
+
+
+def recommend_basket(user_input_names, model='knn', n=10, k=10, metric='euclidean', nprobe=None):
+    """
+    Ranked recommendations for a basket of coffee beans of any size.
+
+    Parameters:
+        user_input_names (list): Names of the coffee beans in the basket.
+        model (str): 'knn' or 'kmeans'.
+        n (int): Number of recommendations.
+        k (int), metric (str), nprobe (int): KNN neighborhood size, distance metric and IVF probes.
+
+    Returns:
+        list: (name, score) pairs, best first.
+    """
+    names = get_artifact().names
+    with span('recommend.lookup'):
+        input_ids = names.ids(user_input_names)
+    if model == 'knn':
+        bean_ids, scores = rank_knn_basket_ids(input_ids, n=n, k=k, metric=metric, nprobe=nprobe)
+    elif model == 'kmeans':
+        bean_ids, scores = rank_kmeans_basket_ids(input_ids, n=n)
+    else:
+        raise ValueError(f"Unknown model '{model}', expected 'knn' or 'kmeans'")
+    return [(names[int(bean_id)], float(score)) for bean_id, score in zip(bean_ids, scores)]
 
 
 
@@ -72,6 +209,8 @@ def recommend_kmeans(user_input_names):
 
 # print("Recommended coffee bean for single input:", recommend_knn(user_input_1))
 # print("Recommended coffee bean for two inputs:", recommend_knn(user_input_2))
+# print("Using 20 neighbors and cosine distance:", recommend_knn(user_input_2, k=20, metric='cosine'))
+# print("Top 5 for a basket:", recommend_basket(user_input_2 + ["Colombia Huila"], model='knn', n=5))
 
 
 # Example usage
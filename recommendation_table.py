@@ -0,0 +1,300 @@
+'''
+# Recommendation table
+Precomputed answers of `recommend_knn` and `recommend_kmeans` for the inputs whose answer depends only on the model:
+
+*   every single bean: an int32 array of shape (n_beans, 2), the KNN and the KMeans recommendation (-1 for none)
+*   the most frequent bean pairs of a basket log (the batch.py input formats): an open-addressing hash table with
+    linear probing. A pair is stored under the normalized key `min(A, B) << 32 | max(A, B)`, so (A, B) and (B, A)
+    share one entry, and a lookup reads one or two slots.
+
+The table is built by the export step (pipeline.py, `python -m artifacts`) and stored in the artifact (table_*.npy),
+so it is memory-mapped and shared like the model arrays. Its manifest entry is stamped with the model version it
+was computed for; an artifact whose version differs (e.g. after an incremental delta) has no table. The recommend_*
+functions of recommendation.py look the table up first and compute live when there is no table, the request uses
+another k or metric, the pair is not in the table, or the basket holds more than two beans.
+
+Single beans and pairs are recommended in chunks on a process pool with the vectorized functions of batch.py, whose
+tie rules match the live ones; the pair log is counted on the same pool.
+
+Usage:
+    python -m recommendation_table --artifact model/coffee_model --pair-log baskets.jsonl --workers 4
+'''
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MODELS = ('knn', 'kmeans')
+TABLE_ARRAYS = ('table_single', 'table_pair_keys', 'table_pair_values')
+
+DEFAULT_K = 10
+DEFAULT_MAX_PAIRS = 100000
+
+# Beans or pairs per work item of the build
+CHUNK_SIZE = 65536
+
+EMPTY_KEY = -1
+# Fibonacci hashing: the high bits of key * 2^64 / golden ratio pick the slot
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+# Model and neighborhood size of the build, set in every worker process
+_artifact = None
+_k = DEFAULT_K
+
+
+def pair_keys(first, second):
+    """Normalized int64 keys of bean ID pairs, the same for (A, B) and (B, A)."""
+    first, second = np.asarray(first, dtype=np.int64), np.asarray(second, dtype=np.int64)
+    return np.minimum(first, second) << 32 | np.maximum(first, second)
+
+
+def hash_slots(keys, bits):
+    keys = np.asarray(keys, dtype=np.int64).view(np.uint64)
+    return ((keys * np.uint64(HASH_MULTIPLIER)) >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def build_hash_table(keys, values):
+    """
+    Open-addressing hash table of unique keys at a load factor of at most 1/2.
+
+    Parameters:
+        keys (ndarray): Unique non-negative int64 keys.
+        values (ndarray): Row of values per key.
+
+    Returns:
+        tuple: (slot_keys, slot_values), EMPTY_KEY and -1 in free slots.
+    """
+    bits = max(1, int(np.ceil(np.log2(max(2 * len(keys), 1)))))
+    slot_keys = np.full(1 << bits, EMPTY_KEY, dtype=np.int64)
+    slot_values = np.full((1 << bits,) + values.shape[1:], -1, dtype=np.int32)
+
+    # Every round places one pending key per free slot, the others move on to their next slot
+    slots = hash_slots(keys, bits)
+    pending = np.arange(len(keys))
+    while len(pending):
+        free = pending[slot_keys[slots[pending]] == EMPTY_KEY]
+        _, first = np.unique(slots[free], return_index=True)
+        placed = free[first]
+        slot_keys[slots[placed]] = keys[placed]
+        slot_values[slots[placed]] = values[placed]
+        pending = np.setdiff1d(pending, placed, assume_unique=True)
+        slots[pending] = (slots[pending] + 1) & ((1 << bits) - 1)
+    return slot_keys, slot_values
+
+
+class RecommendationTable:
+    """
+    Precomputed KNN and KMeans recommendations of single beans and frequent pairs.
+
+    Parameters:
+        single (ndarray): Recommendation per bean and model, shape (n_beans, 2), -1 for none.
+        pair_keys, pair_values (ndarray): Hash table of the pairs, see `build_hash_table`.
+        k (int): Neighborhood size of the KNN recommendations.
+        metric (str): Distance metric of the KNN recommendations.
+    """
+
+    def __init__(self, single, pair_keys, pair_values, k=DEFAULT_K, metric='euclidean'):
+        self.single = single
+        self.pair_keys = pair_keys
+        self.pair_values = pair_values
+        self.k = k
+        self.metric = metric
+        self._bits = max(len(pair_keys).bit_length() - 1, 0)
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """The artifact's table, None if it has none or it was built for another model version."""
+        entry = artifact.manifest.get('recommendation_table')
+        if not entry or any(key not in artifact.arrays for key in TABLE_ARRAYS):
+            return None
+        if entry['model_version'] != artifact.model_version:
+            return None
+        return cls(
+            artifact.table_single, artifact.table_pair_keys, artifact.table_pair_values,
+            k=entry['k'], metric=entry['metric'],
+        )
+
+    def __len__(self):
+        return int(np.count_nonzero(np.asarray(self.pair_keys) != EMPTY_KEY))
+
+    def nbytes(self):
+        return self.single.nbytes + self.pair_keys.nbytes + self.pair_values.nbytes
+
+    def store(self, artifact):
+        """Adds the table to an artifact, stamped with its model version."""
+        artifact.arrays.update(zip(TABLE_ARRAYS, (self.single, self.pair_keys, self.pair_values)))
+        artifact.manifest['recommendation_table'] = {
+            'model_version': artifact.model_version,
+            'k': self.k,
+            'metric': self.metric,
+            'pairs': len(self),
+        }
+        artifact._recommendation_table = self
+
+    def lookup(self, input_ids, model, k=None, metric='euclidean'):
+        """
+        Precomputed recommendation for the input bean IDs.
+
+        Parameters:
+            input_ids (array-like): Bean IDs of the request.
+            model (str): 'knn' or 'kmeans'.
+            k (int), metric (str): KNN neighborhood size and distance metric of the request.
+
+        Returns:
+            int: Recommended bean ID, -1 if the model has no recommendation,
+                None if the table does not hold the request.
+        """
+        if model == 'knn' and (k != self.k or metric != self.metric):
+            return None
+        column = MODELS.index(model)
+        if len(input_ids) == 1:
+            return int(self.single[int(input_ids[0]), column])
+        if len(input_ids) != 2 or not self._bits:
+            return None
+
+        first, second = sorted(int(bean_id) for bean_id in input_ids)
+        if first == second:
+            return None
+        key = first << 32 | second
+        mask = (1 << self._bits) - 1
+        slot = ((key * HASH_MULTIPLIER) & _MASK64) >> (64 - self._bits)
+        while True:
+            found = int(self.pair_keys[slot])
+            if found == key:
+                return int(self.pair_values[slot, column])
+            if found == EMPTY_KEY:
+                return None
+            slot = (slot + 1) & mask
+
+
+def _init_worker(artifact, k):
+    global _artifact, _k
+    _artifact, _k = artifact, k
+
+
+def recommend_chunk(baskets):
+    """KNN and KMeans recommendation of every basket of a (n_baskets, basket_size) array, shape (n_baskets, 2)."""
+    from batch import kmeans_batch, knn_batch
+    return np.stack([knn_batch(_artifact, baskets, k=_k), kmeans_batch(_artifact, baskets)], axis=1).astype(np.int32)
+
+
+def count_chunk(baskets):
+    """Unique normalized pair keys of a chunk of (basket_id, bean_names) pairs and their counts."""
+    keys = []
+    for _, names in baskets:
+        ids = np.unique([bean_id for bean_id in map(_artifact.names.find, names) if bean_id is not None])
+        if len(ids) > 1:
+            first, second = np.triu_indices(len(ids), 1)
+            keys.append(pair_keys(ids[first], ids[second]))
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys), return_counts=True)
+
+
+def _map_chunks(func, chunks, artifact, k, workers):
+    """Yields func(chunk) in order, on `workers` processes with at most two chunks per worker in flight."""
+    if workers <= 1:
+        _init_worker(artifact, k)
+        yield from map(func, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(artifact, k)) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def _merge_counts(keys, counts):
+    keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    return keys, np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+
+
+def frequent_pairs(baskets, artifact, max_pairs=DEFAULT_MAX_PAIRS, workers=1):
+    """
+    Counts the bean pairs of a basket log, every two distinct known beans of a basket form a pair.
+
+    Parameters:
+        baskets (iterable): (basket_id, bean_names) pairs, e.g. from `batch.read_baskets`.
+
+    Returns:
+        ndarray: Normalized keys of the `max_pairs` most frequent pairs, ties go to the lower key.
+    """
+    from batch import chunked
+    keys, counts = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for chunk_keys, chunk_counts in _map_chunks(count_chunk, chunked(baskets, CHUNK_SIZE), artifact, None, workers):
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+        if len(keys) >= 16:
+            merged = _merge_counts(keys, counts)
+            keys, counts = [merged[0]], [merged[1]]
+    keys, counts = _merge_counts(keys, counts)
+    return keys[np.lexsort((keys, -counts))[:max_pairs]]
+
+
+def build_table(artifact, pairs=(), k=DEFAULT_K, workers=1):
+    """
+    Computes the recommendation table of an artifact.
+
+    Parameters:
+        artifact (ModelArtifact): Model to recommend from.
+        pairs (ndarray): Normalized keys of the pairs to include, see `frequent_pairs`.
+        k (int): KNN neighborhood size, at most the length of the exported neighbor lists.
+        workers (int): Worker processes, 1 builds in this process.
+    """
+    k = min(k, artifact.k)
+    singles = np.arange(len(artifact), dtype=np.int64)[:, None]
+    single_chunks = (singles[start:start + CHUNK_SIZE] for start in range(0, len(singles), CHUNK_SIZE))
+    single = list(_map_chunks(recommend_chunk, single_chunks, artifact, k, workers))
+    single = np.concatenate(single) if single else np.zeros((0, len(MODELS)), dtype=np.int32)
+
+    pairs = np.asarray(pairs, dtype=np.int64)
+    baskets = np.stack([pairs >> 32, pairs & 0xFFFFFFFF], axis=1)
+    pair_chunks = (baskets[start:start + CHUNK_SIZE] for start in range(0, len(baskets), CHUNK_SIZE))
+    values = list(_map_chunks(recommend_chunk, pair_chunks, artifact, k, workers))
+    values = np.concatenate(values) if values else np.zeros((0, len(MODELS)), dtype=np.int32)
+
+    slot_keys, slot_values = build_hash_table(pairs, values)
+    return RecommendationTable(single, slot_keys, slot_values, k=k)
+
+
+def add_table(artifact, pair_log=None, fmt=None, max_pairs=DEFAULT_MAX_PAIRS, k=DEFAULT_K, workers=1):
+    """Builds the recommendation table, with the frequent pairs of the basket log `pair_log`, and stores it in the artifact."""
+    pairs = ()
+    if pair_log:
+        from batch import read_baskets
+        fmt = fmt or ('csv' if pair_log.endswith('.csv') else 'jsonl')
+        with open(pair_log, newline='', encoding='utf-8') as f:
+            pairs = frequent_pairs(read_baskets(f, fmt), artifact, max_pairs=max_pairs, workers=workers)
+    table = build_table(artifact, pairs, k=k, workers=workers)
+    table.store(artifact)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the recommendations of single beans and frequent pairs.")
+    parser.add_argument('--artifact', default='./model/coffee_model')
+    parser.add_argument('--pair-log', default=None, help="Basket log (JSONL or CSV) the frequent pairs are counted in")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default=None, help="Defaults to the log file extension")
+    parser.add_argument('--max-pairs', type=int, default=DEFAULT_MAX_PAIRS)
+    parser.add_argument('--k', type=int, default=DEFAULT_K)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from artifacts import load_artifact, save_artifact
+    artifact = load_artifact(args.artifact)
+    start = time.perf_counter()
+    table = add_table(artifact, args.pair_log, args.format, args.max_pairs, args.k, args.workers)
+    seconds = time.perf_counter() - start
+    save_artifact(args.artifact, artifact)
+    print(f"{len(table.single)} beans and {len(table)} pairs in {seconds:.1f}s, "
+          f"{table.nbytes() / 2**20:.1f} MB, model version {artifact.model_version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+'''
+# Registry
+Process-wide owner of the coffee dataset and the model artifact.
+Every Streamlit session and page gets the same loaded objects instead of reloading them on each rerun.
+The files behind each resource are checked at most every CHECK_INTERVAL seconds; when their
+modification time changes and their content hash differs, the resource is reloaded and swapped in
+atomically. Sessions that still hold the previous object keep using it until their next call.
+
+With COFFEE_SHARED_STORE set, the model artifact is attached from the shared memory store of that name instead
+(see shared_store.py) and swapped when a new generation is published; the files are used until one is.
+The dataset and the indexes built from it are always loaded in this process.
+
+The returned objects are shared between all sessions and must be treated as read-only.
+'''
+
+import hashlib
+import os
+import threading
+import time
+
+from tracing import span
+
+DATASET_PATH = 'coffee_cleaned.csv'
+ARTIFACT_PATH = './model/coffee_model'
+KNN_MODEL_PATH = './model/knn_model.joblib'
+KMEANS_MODEL_PATH = './model/kmeans_model.joblib'
+
+# Seconds between two checks of the files on disk
+CHECK_INTERVAL = 2.0
+
+# Shared memory store the artifact is attached from, None loads it in this process
+SHARED_STORE = os.environ.get('COFFEE_SHARED_STORE') or None
+
+
+def file_signature(paths):
+    """Cheap change detector: modification time and size of each existing file."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def content_hash(paths):
+    """SHA-256 over the content of each existing file."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        digest.update(path.encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Resource:
+    """
+    A lazily loaded value that is reloaded when its files change on disk.
+
+    Parameters:
+        loader (callable): Builds the value, called without arguments.
+        watch_paths (callable): Returns the files the value is loaded from.
+    """
+
+    def __init__(self, loader, watch_paths):
+        self.loader = loader
+        self.watch_paths = watch_paths
+        self.value = None
+        self.version = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.value is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return self.value
+        with self._lock:
+            self._refresh()
+            return self.value
+
+    def _refresh(self):
+        self._checked_at = time.monotonic()
+        paths = self.watch_paths()
+        signature = file_signature(paths)
+        if self.value is not None and signature == self._signature:
+            return
+
+        version = content_hash(paths)
+        if self.value is None or version != self.version:
+            # Load fully before swapping, readers never see a half-loaded value
+            self.value = self.loader()
+            self.version = version
+        self._signature = signature
+
+    def invalidate(self):
+        with self._lock:
+            self.value = None
+            self.version = None
+            self._signature = None
+
+
+class ArtifactResource(Resource):
+    """The model artifact, attached from the SHARED_STORE once something is published there, versioned by generation."""
+
+    def _refresh(self):
+        if SHARED_STORE:
+            from shared_store import attach, current_generation
+            generation = current_generation(SHARED_STORE)
+            if generation is not None:
+                self._checked_at = time.monotonic()
+                if self.version != f"{SHARED_STORE}:{generation}":
+                    with span('load.shared_artifact'):
+                        artifact = attach(SHARED_STORE)
+                    self.value = artifact
+                    self.version = f"{SHARED_STORE}:{artifact.manifest['generation']}"
+                    self._signature = None
+                return
+        super()._refresh()
+
+
+def _artifact_watch_paths():
+    manifest = os.path.join(ARTIFACT_PATH, 'manifest.json')
+    if os.path.exists(manifest):
+        return [manifest]
+    return [DATASET_PATH, KNN_MODEL_PATH, KMEANS_MODEL_PATH]
+
+
+def _load_dataset():
+    from dataset import load_dataset
+    with span('load.dataset'):
+        return load_dataset(DATASET_PATH)
+
+
+def _load_artifact():
+    from artifacts import load_or_build_artifact
+    with span('load.artifact'):
+        return load_or_build_artifact(ARTIFACT_PATH, get_dataset, KNN_MODEL_PATH, KMEANS_MODEL_PATH)
+
+
+def _load_catalog_index():
+    from catalog_index import CatalogIndex
+    dataset = get_dataset()
+    with span('load.catalog_index'):
+        return CatalogIndex(dataset)
+
+
+def _load_search_index():
+    from search import SearchIndex
+    dataset = get_dataset()
+    with span('load.search_index'):
+        return SearchIndex(dataset)
+
+
+def _load_fact_cube():
+    from facts import FactCube
+    dataset = get_dataset()
+    with span('load.fact_cube'):
+        return FactCube(dataset)
+
+
+_resources = {
+    'dataset': Resource(_load_dataset, lambda: [DATASET_PATH]),
+    'catalog_index': Resource(_load_catalog_index, lambda: [DATASET_PATH]),
+    'search_index': Resource(_load_search_index, lambda: [DATASET_PATH]),
+    'fact_cube': Resource(_load_fact_cube, lambda: [DATASET_PATH]),
+    'artifact': ArtifactResource(_load_artifact, _artifact_watch_paths),
+}
+
+
+def get(name):
+    return _resources[name].get()
+
+
+def version(name):
+    """Content hash of the files behind a resource, usable as a cache key."""
+    resource = _resources[name]
+    resource.get()
+    return resource.version
+
+
+def get_dataset():
+    """The cleaned coffee dataset as a DataFrame."""
+    return get('dataset')
+
+
+def get_catalog_index():
+    """CatalogIndex over the current dataset (see catalog_index.py)."""
+    return get('catalog_index')
+
+
+def get_search_index():
+    """SearchIndex over the current dataset (see search.py)."""
+    return get('search_index')
+
+
+def get_fact_cube():
+    """FactCube over the current dataset (see facts.py)."""
+    return get('fact_cube')
+
+
+def get_artifact():
+    """The current ModelArtifact (see artifacts.py)."""
+    return get('artifact')
+
+
+def invalidate(name=None):
+    """Drops one or all resources, the next access reloads them."""
+    for key, resource in _resources.items():
+        if name is None or key == name:
+            resource.invalidate()
@@ -0,0 +1,123 @@
+'''
+# Search index
+Substring search over coffee bean names and roasters, built once per dataset version.
+
+*   Names and roasters are normalized (case-folded, accents removed, whitespace collapsed).
+*   A trigram inverted index narrows a query down to the rows containing all of its trigrams,
+    only those candidates are checked for the full substring.
+*   A sorted array of the normalized names answers autocomplete prefix queries with a binary search.
+'''
+
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Case-folds, strips accents and collapses whitespace."""
+    if not isinstance(text, str):
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(' ', text.casefold()).strip()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    Trigram and prefix index over the coffee dataset.
+
+    Parameters:
+        df (DataFrame): Coffee dataset with 'name', 'roaster' and 'rating' columns.
+    """
+
+    def __init__(self, df):
+        self.names = df['name'].to_numpy(dtype=object)
+        self.ratings = np.nan_to_num(np.asarray(df['rating'], dtype=np.float32), nan=-np.inf)
+        self.norm_names = [normalize(name) for name in self.names]
+        self.norm_roasters = [normalize(roaster) for roaster in df['roaster']]
+
+        postings = {}
+        for row, (name, roaster) in enumerate(zip(self.norm_names, self.norm_roasters)):
+            for gram in trigrams(name) | trigrams(roaster):
+                postings.setdefault(gram, []).append(row)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+        # (normalized name, row) pairs sorted for prefix lookups
+        order = sorted(range(len(self.norm_names)), key=lambda row: self.norm_names[row])
+        self.sorted_names = [self.norm_names[row] for row in order]
+        self.sorted_rows = np.array(order, dtype=np.int32)
+
+    def _candidates(self, query):
+        grams = trigrams(query)
+        if not grams:
+            # Queries shorter than a trigram are checked against every row
+            return range(len(self.names))
+        lists = sorted((self.postings.get(gram) for gram in grams), key=lambda rows: 0 if rows is None else len(rows))
+        if lists[0] is None:
+            return []
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if not len(candidates):
+                break
+        return candidates
+
+    def search(self, text, limit=None):
+        """
+        Finds the rows whose name or roaster contains `text`, ignoring case and accents.
+
+        Results are ranked: exact name, name prefix, name word prefix, name substring, roaster match;
+        ties are broken by rating (highest first).
+
+        Returns:
+            ndarray: Matching row IDs, best match first.
+        """
+        query = normalize(text)
+        if not query:
+            return np.arange(len(self.names))[:limit]
+
+        matches, ranks = [], []
+        for row in self._candidates(query):
+            name = self.norm_names[row]
+            pos = name.find(query)
+            if pos == 0:
+                rank = 0 if name == query else 1
+            elif pos > 0:
+                rank = 2 if name[pos - 1] == ' ' else 3
+            elif query in self.norm_roasters[row]:
+                rank = 4
+            else:
+                continue
+            matches.append(row)
+            ranks.append(rank)
+
+        matches = np.array(matches, dtype=np.int64)
+        order = np.lexsort((-self.ratings[matches], ranks)) if len(matches) else matches
+        return matches[order][:limit]
+
+    def search_names(self, text, limit=None):
+        return list(self.names[self.search(text, limit)])
+
+    def suggest(self, prefix, limit=10):
+        """Autocomplete: names starting with `prefix`, falling back to substring matches."""
+        query = normalize(prefix)
+        if not query:
+            return []
+        start = bisect.bisect_left(self.sorted_names, query)
+        rows = []
+        for i in range(start, len(self.sorted_names)):
+            if len(rows) >= limit or not self.sorted_names[i].startswith(query):
+                break
+            rows.append(int(self.sorted_rows[i]))
+        if len(rows) < limit:
+            seen = set(rows)
+            rows += [int(row) for row in self.search(query, limit + len(rows)) if row not in seen]
+        return [self.names[row] for row in rows[:limit]]
@@ -0,0 +1,302 @@
+'''
+# Recommendation service
+Headless HTTP/1.1 service around recommendation.py, built on asyncio from the standard library.
+The model artifact is loaded once through the registry and shared by all requests.
+
+Endpoints:
+*   GET /recommend?model=knn&beans=<name>&beans=<name>[&k=10&metric=euclidean] -> {"recommendation": ...}
+*   GET /recommend/basket?model=knn&beans=<name>&beans=<name>...[&n=10&k=10&metric=euclidean]
+    -> {"recommendations": [{"name": ..., "score": ...}, ...]}, ranked top-n for a basket of any size
+*   POST /recommend/batch?model=knn, body: JSONL baskets as for batch.py -> streamed JSONL results,
+    ending with an {"error": ...} record if the batch fails after the stream started
+*   GET /health
+*   GET /metrics: per-stage timings in the Prometheus text format, when COFFEE_TRACING=1 (see tracing.py)
+
+Single recommendations are cached in an LRU cache keyed by the model version and the basket as a set, so the
+order of the beans does not matter, answers of a replaced model are never served, and concurrent identical
+requests share one computation.
+Connections are kept alive between requests.
+
+Usage:
+    python -m service --host 0.0.0.0 --port 8000
+'''
+
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from batch import MODELS, chunked, read_baskets, recommend_chunk
+from recommendation import rank_kmeans_basket_ids, rank_knn_basket_ids, recommend_kmeans_ids, recommend_knn_ids
+from registry import get_artifact
+from similarity import METRICS
+from tracing import render_prometheus
+
+CACHE_SIZE = 100000
+BATCH_CHUNK_SIZE = 1000
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecommendationCache:
+    """LRU cache of recommendations that merges concurrent requests for the same key."""
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        # An identical request is already being computed: wait for its result
+        if key in self.inflight:
+            self.hits += 1
+            return await asyncio.shield(self.inflight[key])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await compute()
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark as retrieved when nobody else is waiting
+            raise
+        finally:
+            del self.inflight[key]
+        future.set_result(value)
+
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return value
+
+
+class RecommendationService:
+    def __init__(self, cache_size=CACHE_SIZE, threads=1):
+        self.cache = RecommendationCache(cache_size)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def _recommend(self, model, bean_ids, k, metric):
+        if model == 'knn':
+            best_id = recommend_knn_ids(bean_ids, k=k, metric=metric)
+        else:
+            best_id = recommend_kmeans_ids(bean_ids)
+        return None if best_id is None else get_artifact().names[best_id]
+
+    def _rank(self, model, bean_ids, n, k, metric):
+        if model == 'knn':
+            ranked_ids, scores = rank_knn_basket_ids(bean_ids, n=n, k=k, metric=metric)
+        else:
+            ranked_ids, scores = rank_kmeans_basket_ids(bean_ids, n=n)
+        names = get_artifact().names
+        return [{'name': names[int(bean_id)], 'score': float(score)} for bean_id, score in zip(ranked_ids, scores)]
+
+    @staticmethod
+    def parse_options(query, params=('k',)):
+        """Model, the positive integer `params` and the metric of a recommendation query, as a dict."""
+        model = query.get('model', ['knn'])[0]
+        if model not in MODELS:
+            raise HTTPError(400, f"unknown model '{model}'")
+        values = {'model': model}
+        for param in params:
+            try:
+                values[param] = int(query.get(param, ['10'])[0])
+            except ValueError:
+                raise HTTPError(400, f"'{param}' must be an integer")
+            if values[param] < 1:
+                raise HTTPError(400, f"'{param}' must be at least 1")
+        metric = query.get('metric', ['euclidean'])[0]
+        if metric not in METRICS:
+            raise HTTPError(400, f"unknown metric '{metric}', expected one of {list(METRICS)}")
+        values['metric'] = metric
+        return values
+
+    def parse_basket(self, query, params=('k',)):
+        """
+        Model, bean names, sorted bean IDs and the options of a recommendation query (see `parse_options`),
+        plus the 'version' of the model the IDs belong to.
+        """
+        values = self.parse_options(query, params)
+        names = query.get('beans', [])
+        if not names:
+            raise HTTPError(400, "missing 'beans' parameter")
+
+        artifact = get_artifact()
+        # Part of every cache key: entries of a replaced model are never hit again and age out of the LRU
+        values['version'] = artifact.model_version
+        ids = [artifact.names.find(name) for name in names]
+        if None in ids:
+            raise HTTPError(404, f"unknown beans: {[n for n, i in zip(names, ids) if i is None]}")
+
+        # The basket is a set: sorted IDs give one cache key and one answer for every order
+        return values['model'], names, sorted(set(ids)), values
+
+    async def recommend(self, query):
+        model, names, bean_ids, values = self.parse_basket(query)
+        k, metric = values['k'], values['metric']
+        key = (values['version'], model, tuple(bean_ids), k, metric)
+        loop = asyncio.get_running_loop()
+        recommendation = await self.cache.get(
+            key, lambda: loop.run_in_executor(self.executor, self._recommend, model, bean_ids, k, metric)
+        )
+        return {'model': model, 'beans': names, 'recommendation': recommendation}
+
+    async def recommend_basket(self, query):
+        model, names, bean_ids, values = self.parse_basket(query, params=('n', 'k'))
+        n, k, metric = values['n'], values['k'], values['metric']
+        key = ('basket', values['version'], model, tuple(bean_ids), n, k, metric)
+        loop = asyncio.get_running_loop()
+        recommendations = await self.cache.get(
+            key, lambda: loop.run_in_executor(self.executor, self._rank, model, bean_ids, n, k, metric)
+        )
+        return {'model': model, 'beans': names, 'recommendations': recommendations}
+
+    async def recommend_batch(self, query, body, writer, keep_alive=True):
+        """
+        Streams the results of a JSONL batch. The request is validated completely before the 200 head is sent;
+        an error after that ends the stream with an {"error": ...} record instead of a second response.
+        """
+        values = self.parse_options(query)
+        model, k, metric = values['model'], values['k'], values['metric']
+        try:
+            baskets = list(read_baskets(body.decode('utf-8').splitlines()))
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            raise HTTPError(400, f"invalid batch request: {type(exc).__name__}: {exc}")
+        for basket_id, names in baskets:
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                raise HTTPError(400, f"invalid batch request: basket {basket_id!r} must list bean names")
+
+        write_head(writer, 200, 'application/x-ndjson', chunked=True, keep_alive=keep_alive)
+        loop = asyncio.get_running_loop()
+        try:
+            for chunk in chunked(baskets, BATCH_CHUNK_SIZE):
+                results = await loop.run_in_executor(self.executor, recommend_chunk, chunk, model, k, metric)
+                write_chunk(writer, ''.join(
+                    json.dumps({'id': basket_id, 'recommendation': rec, **({'error': err} if err else {})}, ensure_ascii=False) + '\n'
+                    for basket_id, rec, err in results
+                ).encode('utf-8'))
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as exc:
+            write_chunk(writer, (json.dumps({'error': f"{type(exc).__name__}: {exc}"}) + '\n').encode('utf-8'))
+        writer.write(b'0\r\n\r\n')
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_SIZE:
+                    self.respond(writer, 413, {'error': 'request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+                await self.dispatch(method, target, body, writer, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body, writer, keep_alive):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            if url.path == '/health':
+                self.respond(writer, 200, {'status': 'ok', 'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}, keep_alive)
+            elif url.path == '/metrics':
+                data = render_prometheus().encode('utf-8')
+                write_head(writer, 200, 'text/plain; version=0.0.4', length=len(data), keep_alive=keep_alive)
+                writer.write(data)
+            elif url.path == '/recommend':
+                if method != 'GET':
+                    raise HTTPError(405, "use GET")
+                self.respond(writer, 200, await self.recommend(query), keep_alive)
+            elif url.path == '/recommend/basket':
+                if method != 'GET':
+                    raise HTTPError(405, "use GET")
+                self.respond(writer, 200, await self.recommend_basket(query), keep_alive)
+            elif url.path == '/recommend/batch':
+                if method != 'POST':
+                    raise HTTPError(405, "use POST")
+                await self.recommend_batch(query, body, writer, keep_alive)
+            else:
+                raise HTTPError(404, f"no route for {url.path}")
+        except HTTPError as exc:
+            self.respond(writer, exc.status, {'error': str(exc)}, keep_alive)
+        except ConnectionError:
+            raise
+        except Exception as exc:
+            self.respond(writer, 500, {'error': f"{type(exc).__name__}: {exc}"}, keep_alive)
+
+    @staticmethod
+    def respond(writer, status, payload, keep_alive=True):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        write_head(writer, status, 'application/json', length=len(data), keep_alive=keep_alive)
+        writer.write(data)
+
+
+def write_chunk(writer, payload):
+    writer.write(b'%x\r\n%s\r\n' % (len(payload), payload))
+
+
+def write_head(writer, status, content_type, length=None, chunked=False, keep_alive=True):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}"]
+    if chunked:
+        lines.append("Transfer-Encoding: chunked")
+    else:
+        lines.append(f"Content-Length: {length}")
+    lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+async def serve(host='127.0.0.1', port=8000, cache_size=CACHE_SIZE):
+    service = RecommendationService(cache_size=cache_size)
+    get_artifact()  # Load the model before accepting connections
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Serving recommendations on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Coffee recommendation HTTP service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port, args.cache_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+'''
+# Shared store
+Publishes the model artifact into `multiprocessing.shared_memory`, so several Streamlit workers on one host share a
+single copy of it. One loader process publishes, every worker attaches read-only through the registry: with
+COFFEE_SHARED_STORE set, `registry.get_artifact()` (and so every function of recommendation.py) returns the
+published artifact instead of loading its own.
+
+Only the model artifact is shared. The dataset and the indexes built from it (CatalogIndex, SearchIndex, FactCube)
+are still loaded by every worker: the dataset cache maps its numeric and category code columns from the same files,
+so the page cache holds one copy of those, but the text columns and the indexes are private to each worker.
+
+Segments:
+
+*   `<name>`: control block, a magic number and the current generation
+*   `<name>_g<generation>`: one model version, a JSON header (manifest and array layout) followed by the arrays
+    (names, features, ratings, prices, neighbors, cluster arrays, centroids, the compact features of quantized.py
+    and the squared feature norms)
+
+Publishing writes the next generation completely, then bumps the generation in the control block, and finally
+unlinks the previous generation. Workers notice the new generation on their next registry check and swap it in;
+sessions still holding the previous artifact keep a valid mapping until they drop it, like with `save_artifact`.
+A worker maps the segment instead of copying it, so attaching costs kilobytes of private memory.
+
+The segments live in /dev/shm, which Docker limits to 64 MB by default (`docker run --shm-size`).
+
+Usage:
+    python -m shared_store publish --artifact model/coffee_model   # publish once
+    python -m shared_store publish --watch                          # republish whenever the artifact changes
+    python -m shared_store status
+    python -m shared_store unlink
+    COFFEE_SHARED_STORE=coffee_model streamlit run main.py           # in every worker
+'''
+
+import argparse
+import json
+import os
+import time
+import weakref
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+DEFAULT_STORE_NAME = 'coffee_model'
+
+CONTROL_MAGIC = 0xC0FFEE5703E
+SEGMENT_MAGIC = b'COFFEESM'
+CONTROL_SIZE = 16
+ALIGNMENT = 64
+
+# Attached segments whose arrays are gone. A segment can only be closed once NumPy has released its buffer,
+# which happens after the arrays' weakref callbacks run, so they are closed on the next access to the store.
+_released = []
+
+
+class _Segment(SharedMemory):
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass  # Arrays still map it at interpreter exit, the mapping ends with the process
+
+
+def _open(name, create=False, size=0):
+    """
+    Opens a segment without handing it to the resource tracker, which would unlink it when this
+    process exits: the segments outlive the publisher and must not be removed by a worker.
+    """
+    try:
+        return _Segment(name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument
+        shm = _Segment(name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _close_released():
+    for segment in list(_released):
+        try:
+            segment.close()
+        except BufferError:
+            continue
+        _released.remove(segment)
+
+
+def segment_name(name, generation):
+    return f"{name}_g{generation}"
+
+
+def current_generation(name=DEFAULT_STORE_NAME):
+    """Generation published under `name`, None if nothing is published."""
+    _close_released()
+    try:
+        control = _open(name)
+    except FileNotFoundError:
+        return None
+    try:
+        magic = int.from_bytes(control.buf[:8], 'little')
+        generation = int.from_bytes(control.buf[8:16], 'little')
+    finally:
+        control.close()
+    return generation if magic == CONTROL_MAGIC and generation else None
+
+
+def shared_arrays(artifact):
+    """Arrays published for an artifact: all of its arrays plus the squared feature norms and the compact features."""
+    arrays = dict(artifact.arrays)
+    # Artifacts written before the norms were stored
+    if artifact.has_features and 'sq_norms' not in arrays:
+        features = np.asarray(artifact.features)
+        arrays['sq_norms'] = np.einsum('ij,ij->i', features, features)
+    if artifact.has_features:
+        arrays.update(artifact.compact_index().arrays())
+    return arrays
+
+
+def publish(artifact, name=DEFAULT_STORE_NAME):
+    """
+    Publishes an artifact as the next generation of the store.
+
+    Returns:
+        int: The published generation.
+    """
+    arrays = {key: np.ascontiguousarray(value) for key, value in shared_arrays(artifact).items()}
+    previous = current_generation(name) or 0
+    generation = previous + 1
+
+    layout, offset = {}, 0
+    for key, value in arrays.items():
+        layout[key] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+        offset += -(-value.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({
+        'generation': generation,
+        'published': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'manifest': {key: value for key, value in artifact.manifest.items() if key != 'deltas'},
+        'arrays': layout,
+    }).encode('utf-8')
+    data_start = -(-(16 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    segment = _open(segment_name(name, generation), create=True, size=data_start + max(offset, 1))
+    try:
+        segment.buf[:8] = SEGMENT_MAGIC
+        segment.buf[8:16] = len(header).to_bytes(8, 'little')
+        segment.buf[16:16 + len(header)] = header
+        for key, value in arrays.items():
+            start = data_start + layout[key]['offset']
+            segment.buf[start:start + value.nbytes] = value.reshape(-1).view(np.uint8)
+    finally:
+        segment.close()
+
+    try:
+        control = _open(name)
+    except FileNotFoundError:
+        control = _open(name, create=True, size=CONTROL_SIZE)
+    try:
+        control.buf[:8] = CONTROL_MAGIC.to_bytes(8, 'little')
+        # The single write that makes the new generation visible
+        control.buf[8:16] = generation.to_bytes(8, 'little')
+    finally:
+        control.close()
+
+    if previous:
+        # Workers that still map the previous generation keep it until they release it
+        unlink_segment(segment_name(name, previous))
+    return generation
+
+
+def _attach_segment(name, generation):
+    from artifacts import ModelArtifact
+
+    segment = _open(segment_name(name, generation))
+    base = np.frombuffer(segment.buf, dtype=np.uint8)
+    base.flags.writeable = False
+    # Unmapped after the last array view of the segment is gone
+    weakref.finalize(base, _released.append, segment).atexit = False
+
+    if bytes(base[:8]) != SEGMENT_MAGIC:
+        raise ValueError(f"{segment_name(name, generation)} is not a coffee model segment")
+    header_size = int.from_bytes(bytes(base[8:16]), 'little')
+    header = json.loads(bytes(base[16:16 + header_size]).decode('utf-8'))
+    data_start = -(-(16 + header_size) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for key, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape']))
+        start = data_start + entry['offset']
+        arrays[key] = base[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+    manifest = dict(header['manifest'], shared_store=name, generation=header['generation'])
+    return ModelArtifact(arrays, manifest)
+
+
+def attach(name=DEFAULT_STORE_NAME, retries=3):
+    """
+    Maps the current generation of the store as a read-only ModelArtifact.
+    `artifact.manifest['generation']` tells which generation it is.
+
+    Raises:
+        FileNotFoundError: If nothing is published under `name`.
+    """
+    for attempt in range(retries):
+        generation = current_generation(name)
+        if generation is None:
+            raise FileNotFoundError(f"No shared model store named '{name}'")
+        try:
+            return _attach_segment(name, generation)
+        except FileNotFoundError:
+            # A newer generation was published and this one unlinked in between
+            if attempt == retries - 1:
+                raise
+
+
+def unlink_segment(segment):
+    try:
+        # Tracked, unlink() unregisters it again
+        shm = SharedMemory(segment)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def unlink(name=DEFAULT_STORE_NAME):
+    """Removes the store: the current generation and the control block."""
+    generation = current_generation(name)
+    if generation:
+        unlink_segment(segment_name(name, generation))
+    unlink_segment(name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Share the coffee model between worker processes.")
+    parser.add_argument('--name', default=os.environ.get('COFFEE_SHARED_STORE') or DEFAULT_STORE_NAME)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help="Publish the model artifact as a new generation")
+    publish_parser.add_argument('--artifact', default=None, help="Artifact directory, the registry's by default")
+    publish_parser.add_argument('--watch', action='store_true', help="Keep running and republish on changes")
+    subparsers.add_parser('status', help="Show the published generation")
+    subparsers.add_parser('unlink', help="Remove the store")
+
+    args = parser.parse_args(argv)
+    if args.command == 'status':
+        generation = current_generation(args.name)
+        if generation is None:
+            print(f"{args.name}: nothing published")
+            return 1
+        artifact = attach(args.name)
+        size = sum(array.nbytes for array in artifact.arrays.values())
+        print(f"{args.name}: generation {generation}, {len(artifact)} beans, {size / 2**20:.1f} MB")
+        return 0
+    if args.command == 'unlink':
+        unlink(args.name)
+        return 0
+
+    import registry
+    if args.artifact:
+        registry.ARTIFACT_PATH = args.artifact
+    # Reads the files, never the store this command publishes
+    registry.SHARED_STORE = None
+    published = None
+    while True:
+        artifact = registry.get_artifact()
+        if artifact is not published:
+            generation = publish(artifact, args.name)
+            published = artifact
+            print(f"Published {len(artifact)} beans as {args.name} generation {generation}", flush=True)
+        if not args.watch:
+            return 0
+        time.sleep(registry.CHECK_INTERVAL)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
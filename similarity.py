@@ -0,0 +1,145 @@
+'''
+# Similarity engine
+Keeps the coffee feature matrix as one contiguous NumPy array and answers k-nearest
+neighbor queries on the fly, instead of reading the fixed top10 lists exported by the notebook.
+The features are built exactly like the notebook's KNN model: the five flavor scores plus
+the one-hot encoded roast and processed country columns.
+'''
+
+import numpy as np
+from name_table import NameTable
+
+NUMERICAL_FEATURES = ['aroma', 'acid', 'body', 'flavor', 'aftertaste']
+CATEGORICAL_FEATURES = ['roast', 'country_processed']
+
+# Countries kept as their own category by the notebook, every other country becomes "Others"
+PROCESSED_COUNTRIES = ['USA', 'Taiwan', 'Guatemala', 'China', 'Canada']
+
+METRICS = ('euclidean', 'manhattan', 'cosine')
+
+
+def build_feature_matrix(df, feature_columns=None, fill_values=None):
+    """
+    Builds the KNN/KMeans feature matrix from the cleaned coffee dataset.
+
+    Parameters:
+        df (DataFrame): Cleaned coffee dataset (coffee_cleaned.csv).
+        feature_columns (list): Optional columns of an existing matrix to align the one-hot
+            columns with, categories unknown to it are encoded as all zeros.
+        fill_values (dict): Optional value per numerical feature for missing scores,
+            the column means of `df` by default.
+
+    Returns:
+        tuple: (features, feature_columns) where features is a C-contiguous float32 array
+        with one row per coffee bean.
+    """
+    import pandas as pd
+
+    numeric = df[NUMERICAL_FEATURES].apply(pd.to_numeric, errors='coerce')
+    numeric = numeric.fillna(numeric.mean() if fill_values is None else pd.Series(fill_values, dtype=float))
+
+    categorical = df.reindex(columns=CATEGORICAL_FEATURES)
+    if 'country_processed' not in df.columns and 'country' in df.columns:
+        # Older exports only have the raw country column
+        categorical['country_processed'] = df['country'].where(df['country'].isin(PROCESSED_COUNTRIES), 'Others')
+    encoded = pd.get_dummies(categorical.astype(str), columns=CATEGORICAL_FEATURES)
+
+    combined = pd.concat([numeric.reset_index(drop=True), encoded.reset_index(drop=True)], axis=1)
+    if feature_columns is not None:
+        combined = combined.reindex(columns=feature_columns, fill_value=0)
+    features = np.ascontiguousarray(combined.to_numpy(dtype=np.float32))
+    return features, list(combined.columns)
+
+
+class SimilarityEngine:
+    """
+    Exact k-nearest neighbor search over the coffee feature matrix.
+
+    Parameters:
+        names (NameTable or array-like): Coffee bean names, one per feature row.
+        features (ndarray): Feature matrix with one row per coffee bean.
+        ratings (array-like): Rating of each coffee bean.
+        sq_norms (ndarray): Optional precomputed squared row norms of the features, e.g. from a shared store.
+    """
+
+    def __init__(self, names, features, ratings, sq_norms=None):
+        self.names = names if isinstance(names, NameTable) else NameTable.from_names(names)
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.ratings = np.asarray(ratings, dtype=np.float32)
+
+        # Precomputed once so euclidean and cosine distances are a single matrix product
+        self._sq_norms = np.einsum('ij,ij->i', self.features, self.features) if sq_norms is None else sq_norms
+        self._norms = None  # Computed on the first cosine query
+
+    @classmethod
+    def from_dataframe(cls, df):
+        features, _ = build_feature_matrix(df)
+        return cls(df['name'].to_numpy(), features, df['rating'].to_numpy())
+
+    @classmethod
+    def from_csv(cls, path):
+        import pandas as pd
+        return cls.from_dataframe(pd.read_csv(path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def ids(self, names):
+        """Maps coffee bean names to row IDs, raising KeyError for unknown names."""
+        return self.names.ids(names)
+
+    def distances(self, queries, metric='euclidean'):
+        """
+        Computes the distance from every query vector to every coffee bean in one batch.
+
+        Parameters:
+            queries (ndarray): Query vectors, shape (n_queries, n_features).
+            metric (str): One of 'euclidean', 'manhattan' or 'cosine'.
+
+        Returns:
+            ndarray: Distance matrix of shape (n_queries, n_beans).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if metric == 'euclidean':
+            q_sq = np.einsum('ij,ij->i', queries, queries)
+            sq = q_sq[:, None] - 2.0 * (queries @ self.features.T) + self._sq_norms[None, :]
+            return np.sqrt(np.maximum(sq, 0.0))
+        if metric == 'cosine':
+            if self._norms is None:
+                self._norms = np.sqrt(self._sq_norms)
+            q_norms = np.linalg.norm(queries, axis=1)
+            denom = np.maximum(q_norms[:, None] * self._norms[None, :], 1e-12)
+            return 1.0 - (queries @ self.features.T) / denom
+        if metric == 'manhattan':
+            return np.abs(queries[:, None, :] - self.features[None, :, :]).sum(axis=2)
+        raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}")
+
+    def kneighbors(self, query_ids, k=10, metric='euclidean', exclude_self=True):
+        """
+        Finds the k nearest coffee beans for each query bean.
+
+        Parameters:
+            query_ids (array-like): Row IDs of the query coffee beans.
+            k (int): Number of neighbors to return per query.
+            metric (str): Distance metric, see `distances`.
+            exclude_self (bool): Drop the query bean from its own neighbor list.
+
+        Returns:
+            tuple: (indices, distances), both of shape (n_queries, k), sorted by distance.
+        """
+        query_ids = np.atleast_1d(np.asarray(query_ids, dtype=np.int64))
+        dist = self.distances(self.features[query_ids], metric=metric)
+        if exclude_self:
+            dist[np.arange(len(query_ids)), query_ids] = np.inf
+
+        k = min(k, len(self) - 1 if exclude_self else len(self))
+        # argpartition finds the k smallest in linear time, only those k get sorted
+        part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        part_dist = np.take_along_axis(dist, part, axis=1)
+        order = np.argsort(part_dist, axis=1, kind='stable')
+        return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_dist, order, axis=1)
+
+    def query(self, names, k=10, metric='euclidean'):
+        """Returns the k nearest neighbor names for each input coffee bean name."""
+        indices, _ = self.kneighbors(self.ids(names), k=k, metric=metric)
+        return [self.names[row] for row in indices]
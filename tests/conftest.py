@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATASET_PATH = os.path.join(ROOT, 'coffee_cleaned.csv')
+KNN_MODEL_PATH = os.path.join(ROOT, 'model', 'knn_model.joblib')
+KMEANS_MODEL_PATH = os.path.join(ROOT, 'model', 'kmeans_model.joblib')
+
+
+@pytest.fixture(scope='session')
+def coffee_df():
+    import pandas as pd
+    return pd.read_csv(DATASET_PATH)
+
+
+@pytest.fixture
+def use_catalog(monkeypatch):
+    """Points the registry at a dataset and an artifact directory, see `benchmarks.suite._use_artifact`."""
+    import registry
+
+    def use(dataset_path=DATASET_PATH, artifact_path=None):
+        monkeypatch.setattr(registry, 'DATASET_PATH', dataset_path)
+        monkeypatch.setattr(registry, 'ARTIFACT_PATH', artifact_path or os.path.join(ROOT, 'model', 'coffee_model'))
+        monkeypatch.setattr(registry, 'KNN_MODEL_PATH', KNN_MODEL_PATH)
+        monkeypatch.setattr(registry, 'KMEANS_MODEL_PATH', KMEANS_MODEL_PATH)
+        registry.invalidate()
+        return registry
+    yield use
+    registry.invalidate()
+
+
+def page_test(page, timeout=60):
+    """AppTest of a page with the repository root on sys.path, as `streamlit run main.py` runs it."""
+    from streamlit.testing.v1 import AppTest
+    script = os.path.join(ROOT, 'pages', page)
+    return AppTest.from_string(
+        f"import runpy, sys; sys.path.insert(0, {ROOT!r}); runpy.run_path({script!r}, run_name='__main__')",
+        default_timeout=timeout,
+    )
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import pipeline
+from ann import IVFIndex, recall_at_k
+from similarity import SimilarityEngine, build_feature_matrix
+
+
+@pytest.fixture(scope='module')
+def engine(coffee_df):
+    features, _ = build_feature_matrix(coffee_df)
+    return SimilarityEngine(coffee_df['name'].to_numpy(), features, coffee_df['rating'].to_numpy())
+
+
+@pytest.fixture(scope='module')
+def index(engine):
+    return IVFIndex.build(engine.features)
+
+
+def test_recall_at_the_default_nprobe(engine, index):
+    assert recall_at_k(index, engine, k=10, nprobe=8, sample_size=500)['recall'] >= 0.95
+
+
+def test_probing_every_list_is_exact(engine, index):
+    ids = np.arange(0, len(engine), 7)
+    _, approx = index.kneighbors(ids, k=10, nprobe=index.n_lists)
+    _, exact = engine.kneighbors(ids, k=10)
+    np.testing.assert_allclose(approx, exact, atol=1e-4)
+
+
+def test_lists_partition_the_catalog(engine, index):
+    assert index.offsets[-1] == len(engine)
+    assert sorted(index.members.tolist()) == list(range(len(engine)))
+    np.testing.assert_array_equal(index.lists[index.members], np.repeat(np.arange(index.n_lists), np.diff(index.offsets)))
+
+
+def test_pipeline_builds_neighbor_lists_with_the_index(coffee_df, engine):
+    encoded = {'df': coffee_df, 'features': engine.features}
+    approx = pipeline.knn_stage({**pipeline.DEFAULT_PARAMS, 'nprobe': 8}, encoded)
+    exact = pipeline.knn_stage(pipeline.DEFAULT_PARAMS, encoded)
+    assert approx.shape == exact.shape and (approx >= 0).all()
+
+    features = engine.features.astype(np.float64)
+    rows = np.arange(len(features))[:, None]
+    approx_dist = np.linalg.norm(features[approx] - features[rows], axis=2)
+    exact_dist = np.linalg.norm(features[exact] - features[rows], axis=2)
+    # Share of listed neighbors within the exact k-th distance, ties make IDs ambiguous
+    assert (approx_dist <= exact_dist[:, -1:] + 1e-4).mean() >= 0.95
@@ -0,0 +1,78 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from joblib import load
+
+from artifacts import (
+    ARRAY_FILES, build_artifact, convert_joblib, load_artifact, load_or_build_artifact, save_artifact,
+)
+from conftest import KMEANS_MODEL_PATH, KNN_MODEL_PATH
+
+
+@pytest.fixture(scope='module')
+def artifact(coffee_df):
+    return build_artifact(coffee_df)
+
+
+def test_round_trip_memory_maps_every_array(artifact, tmp_path):
+    path = str(tmp_path / 'model')
+    save_artifact(path, artifact)
+    loaded = load_artifact(path)
+    assert set(artifact.arrays) == set(loaded.arrays)
+    for key, array in artifact.arrays.items():
+        assert isinstance(loaded.arrays[key], np.memmap), key
+        np.testing.assert_array_equal(loaded.arrays[key], array, err_msg=key)
+    assert loaded.model_version == artifact.model_version
+    assert loaded.names.find(artifact.names[7]) == 7
+
+
+def test_built_neighbors_are_the_exact_top_k(artifact):
+    ids = np.arange(0, len(artifact), 17)
+    _, exact = artifact.engine().kneighbors(ids, k=artifact.k)
+    features = np.asarray(artifact.features, dtype=np.float64)
+    listed = np.linalg.norm(features[artifact.neighbors[ids]] - features[ids, None], axis=2)
+    np.testing.assert_allclose(listed, exact, atol=1e-4)
+
+
+def test_save_replaces_an_existing_artifact(artifact, coffee_df, tmp_path):
+    path = str(tmp_path / 'model')
+    save_artifact(path, build_artifact(coffee_df.iloc[:100]))
+    save_artifact(path, artifact)
+    assert len(load_artifact(path)) == len(artifact)
+    assert os.listdir(tmp_path) == ['model']
+
+
+def test_unknown_format_is_rejected(artifact, tmp_path):
+    path = str(tmp_path / 'model')
+    save_artifact(path, artifact)
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump({**artifact.manifest, 'version': 99}, f)
+    with pytest.raises(ValueError):
+        load_artifact(path)
+
+
+def test_converted_joblib_models_keep_their_lists(coffee_df):
+    nearest_neighbors = load(KNN_MODEL_PATH)
+    converted = convert_joblib(nearest_neighbors, load(KMEANS_MODEL_PATH), coffee_df)
+    name, entry = next(iter(nearest_neighbors.items()))
+    bean_id = converted.names.find(name)
+    assert [converted.names[i] for i in converted.neighbors[bean_id][:len(entry['neighbors'])]] == entry['neighbors']
+    assert converted.has_features and converted.manifest['converted_from'] == 'joblib'
+
+
+def test_load_or_build_loads_only_what_is_missing(artifact, coffee_df, tmp_path):
+    calls = []
+
+    def load_dataset():
+        calls.append(1)
+        return coffee_df
+
+    path = str(tmp_path / 'model')
+    built = load_or_build_artifact(path, load_dataset, KNN_MODEL_PATH, KMEANS_MODEL_PATH)
+    assert calls and set(ARRAY_FILES) <= set(built.arrays)
+    save_artifact(path, artifact)
+    calls.clear()
+    assert len(load_or_build_artifact(path, load_dataset, KNN_MODEL_PATH, KMEANS_MODEL_PATH)) == len(artifact)
+    assert not calls
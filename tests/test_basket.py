@@ -0,0 +1,62 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import recommendation
+
+
+@pytest.fixture
+def artifact(use_catalog, tmp_path):
+    return use_catalog(artifact_path=str(tmp_path / 'model')).get_artifact()
+
+
+def naive_votes(neighbors, basket, ratings, n):
+    votes, closest = Counter(), {}
+    for row in neighbors:
+        for position, bean in enumerate(row):
+            if bean >= 0 and bean not in basket:
+                votes[bean] += 1
+                closest[bean] = min(closest.get(bean, position), position)
+    ranked = sorted(votes, key=lambda bean: (-votes[bean], -ratings[bean], closest[bean], bean))[:n]
+    return ranked, [votes[bean] / len(neighbors) for bean in ranked]
+
+
+@pytest.mark.parametrize('size, k', [(3, 10), (8, 10), (25, 10), (5, 30)])
+def test_knn_basket_matches_a_naive_count(artifact, size, k):
+    basket = np.random.default_rng(size).choice(len(artifact), size, replace=False)
+    ids, scores = recommendation.rank_knn_basket_ids(basket, n=10, k=k)
+    if k > artifact.k:
+        neighbors, _ = artifact.engine().kneighbors(basket, k=k)
+    else:
+        neighbors = np.asarray(artifact.neighbors[basket, :k])
+    expected_ids, expected_scores = naive_votes(neighbors, set(basket.tolist()), artifact.ratings, 10)
+    assert ids.tolist() == expected_ids
+    np.testing.assert_allclose(scores, expected_scores)
+
+
+def test_basket_is_never_recommended_and_duplicates_vote_once(artifact):
+    basket = [3, 3, 40, 41]
+    ids, scores = recommendation.rank_knn_basket_ids(basket, n=50)
+    assert not np.isin(ids, basket).any() and (np.diff(scores) <= 0).all()
+    assert scores.max() <= 1.0 and scores.min() >= 1 / 3
+    kmeans_ids, _ = recommendation.rank_kmeans_basket_ids(basket, n=50)
+    assert not np.isin(kmeans_ids, basket).any()
+
+
+def test_single_bean_basket_tops_with_the_recommendation(artifact):
+    for bean_id in range(0, len(artifact), 97):
+        ids, _ = recommendation.rank_knn_basket_ids([bean_id], n=1)
+        assert ids[0] == recommendation.recommend_knn_ids([bean_id])
+        kmeans_ids, _ = recommendation.rank_kmeans_basket_ids([bean_id], n=1)
+        assert kmeans_ids[0] == recommendation.recommend_kmeans_ids([bean_id])
+
+
+def test_recommend_basket_by_name(artifact):
+    names = artifact.names[np.arange(4)]
+    ranked = recommendation.recommend_basket(names, model='kmeans', n=3)
+    assert len(ranked) == 3 and not {name for name, _ in ranked} & set(names)
+    with pytest.raises(ValueError):
+        recommendation.recommend_basket(names, model='svm')
+    with pytest.raises(KeyError):
+        recommendation.recommend_basket(['No such coffee'])
@@ -0,0 +1,61 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import batch
+import recommendation
+
+
+@pytest.fixture
+def baskets(coffee_df, use_catalog, tmp_path):
+    """Baskets of one to four beans over the registry's artifact, built in memory from the dataset."""
+    use_catalog(artifact_path=str(tmp_path / 'model'))
+    rng = np.random.default_rng(0)
+    names = coffee_df['name'].drop_duplicates().to_numpy()
+    return [(i, list(rng.choice(names, size=1 + i % 4, replace=False))) for i in range(120)]
+
+
+@pytest.mark.parametrize('model, k', [('knn', 10), ('knn', 15), ('kmeans', 10)])
+def test_batch_matches_single_recommendations(baskets, model, k):
+    results = list(batch.recommend_batch(baskets, model=model, k=k, chunk_size=50))
+    assert [basket_id for basket_id, _, _ in results] == [basket_id for basket_id, _ in baskets]
+    for (_, names), (_, recommended, error) in zip(baskets, results):
+        if model == 'knn':
+            expected = recommendation.recommend_knn(names, k=k)
+        else:
+            expected = recommendation.recommend_kmeans(names)
+        assert recommended == expected and error is None
+
+
+def test_unknown_and_empty_baskets_are_reported(baskets):
+    results = list(batch.recommend_batch([('a', ['No such coffee']), ('b', []), *baskets[:1]]))
+    assert results[0] == ('a', None, "unknown beans: ['No such coffee']")
+    assert results[1] == ('b', None, "empty basket")
+    assert results[2][1] is not None
+    with pytest.raises(ValueError):
+        list(batch.recommend_batch(baskets, model='svm'))
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'csv'])
+def test_main_round_trips_both_formats(baskets, tmp_path, fmt):
+    source = tmp_path / f"baskets.{fmt}"
+    if fmt == 'jsonl':
+        source.write_text(''.join(json.dumps({'id': basket_id, 'beans': names}) + '\n' for basket_id, names in baskets))
+    else:
+        source.write_text('id,bean_1,bean_2,bean_3,bean_4\n' + ''.join(
+            ','.join([str(basket_id)] + [f'"{name}"' for name in names]) + '\n' for basket_id, names in baskets))
+    target = tmp_path / f"out.{fmt}"
+    batch.main(['--input', str(source), '--output', str(target)])
+
+    with open(source, newline='') as f:
+        read = list(batch.read_baskets(f, fmt))
+    assert [names for _, names in read] == [names for _, names in baskets]
+    with open(target, newline='') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == len(baskets) + (fmt == 'csv')
+
+    out = io.StringIO()
+    batch.write_results([('x', None, 'empty basket')], out, fmt)
+    assert 'empty basket' in out.getvalue()
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from benchmarks.suite import compare, run_suite
+from benchmarks.synthetic import make_catalog, write_catalog
+
+
+def test_catalog_has_the_dataset_columns(coffee_df):
+    df = make_catalog(500, seed=1)
+    assert set(coffee_df.columns) <= set(df.columns)
+    assert len(df) == 500 and df['name'].is_unique
+    assert df['rating'].between(75, 98).all()
+
+
+def test_catalog_is_reproducible():
+    pd.testing.assert_frame_equal(make_catalog(300, seed=2), make_catalog(300, seed=2))
+    assert not make_catalog(300, seed=2).equals(make_catalog(300, seed=3))
+
+
+def test_written_catalog_is_reused(tmp_path):
+    logs = []
+    first = write_catalog(str(tmp_path), 200, log=logs.append)
+    second = write_catalog(str(tmp_path), 200, log=logs.append)
+    assert first == second and len(logs) == 1
+    pd.testing.assert_frame_equal(pd.read_csv(first[0]), make_catalog(200), check_dtype=False)
+
+
+def test_suite_reports_the_metrics_of_every_size(tmp_path, use_catalog):
+    # The suite repoints the registry, the fixture restores it afterwards
+    use_catalog()
+    results = run_suite([200], sections=('query',), data_dir=str(tmp_path), log=lambda message: None)
+    metrics = results['results']['200']
+    assert metrics and all(value >= 0 for value in metrics.values())
+
+
+def test_compare_flags_regressions_in_both_directions():
+    baseline = {'results': {'1000': {'query_p95_ms': 1.0, 'batch_per_s': 100.0, 'load_s': 2.0}}}
+    current = {'results': {'1000': {'query_p95_ms': 1.5, 'batch_per_s': 50.0, 'load_s': 2.1}, '10000': {'load_s': 9.0}}}
+    rows = {metric: regressed for _, metric, _, _, _, regressed in compare(baseline, current, threshold=0.1)}
+    assert rows == {'query_p95_ms': True, 'batch_per_s': True, 'load_s': False}
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog_index import FLAVOR_FEATURES, CatalogIndex
+from name_table import NameTable
+
+
+@pytest.fixture(scope='module')
+def catalog(coffee_df):
+    return CatalogIndex(coffee_df)
+
+
+def test_lookups_match_a_dataframe_scan(catalog, coffee_df):
+    for name in coffee_df['name'].sample(50, random_state=0):
+        expected = coffee_df[coffee_df['name'] == name].iloc[0]
+        row = catalog.row(name)
+        np.testing.assert_allclose(catalog.flavor_features([row])[0], expected[FLAVOR_FEATURES].astype(float), rtol=1e-6)
+        assert catalog.ratings[row] == pytest.approx(expected['rating'])
+        record = catalog.record(name)
+        for column in ('roast', 'country'):
+            assert record[column] == (None if pd.isna(expected[column]) else expected[column])
+
+
+def test_unknown_names(catalog):
+    assert catalog.row('No such coffee') is None and catalog.record('No such coffee') is None
+    assert 'No such coffee' not in catalog
+    assert catalog.rows(['No such coffee']).tolist() == []
+
+
+def test_first_row_wins_for_duplicated_names():
+    df = pd.DataFrame({
+        'name': ['a', 'b', 'a'], 'rating': [90, 91, 92], 'roast': ['Light', None, 'Dark'], 'country': ['USA'] * 3,
+        **{feature: [1.0, 2.0, 3.0] for feature in FLAVOR_FEATURES},
+    })
+    catalog = CatalogIndex(df)
+    assert catalog.row('a') == 0 and catalog.rows(['b', 'a', 'c']).tolist() == [1, 0]
+    assert catalog.record('a')['roast'] == 'Light' and catalog.record('b')['roast'] is None
+
+
+def test_name_table_round_trip():
+    names = ['Ethiopia Yirgacheffe', 'Café de Colombia', 'Kenya AA', '']
+    table = NameTable.from_names(names)
+    assert [table.find(name) for name in names] == [0, 1, 2, 3]
+    assert table[1] == 'Café de Colombia' and table[np.array([2, 0])] == ['Kenya AA', 'Ethiopia Yirgacheffe']
+    assert table.ids(['Kenya AA', 'Café de Colombia']).tolist() == [2, 1]
+    assert table.find('Kenya') is None
+    with pytest.raises(KeyError):
+        table.ids(['Kenya'])
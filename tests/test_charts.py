@@ -0,0 +1,112 @@
+import gc
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import charts
+from charts import ChartCache, GridCache
+from conftest import DATASET_PATH
+
+
+@pytest.fixture
+def catalog(use_catalog, tmp_path, monkeypatch):
+    """Fresh chart caches over a copy of the dataset that is checked on every access."""
+    import registry
+    path = str(tmp_path / 'coffee_cleaned.csv')
+    shutil.copy(DATASET_PATH, path)
+    monkeypatch.setattr(registry, 'CHECK_INTERVAL', 0.0)
+    monkeypatch.setattr(charts, '_cache', ChartCache())
+    monkeypatch.setattr(charts, '_prewarmed', {})
+    use_catalog(dataset_path=path)
+    return path
+
+
+def drop_last_row(path):
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path, 'w') as f:
+        f.writelines(lines[:-1])
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = ChartCache(max_bytes=10)
+    for key in 'abc':
+        cache.get(key, lambda: b'1234')
+    cache.get('b', lambda: b'')
+    cache.get('d', lambda: b'1234')
+    assert list(cache.entries) == ['b', 'd'] and cache.size == 8
+    assert cache.get('big', lambda: b'x' * 11) == b'x' * 11 and 'big' not in cache.entries
+
+
+def test_concurrent_requests_share_one_render():
+    cache, calls, release = ChartCache(), [], threading.Event()
+
+    def render():
+        calls.append(1)
+        release.wait(5)
+        return b'png'
+
+    threads = [threading.Thread(target=cache.get, args=('key', render)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and (cache.hits, cache.misses) == (0, 1)
+
+
+def test_charts_are_rendered_once_per_dataset_version(catalog):
+    png = charts.chart('roast_counts')
+    assert png.startswith(b'\x89PNG') and charts.chart('roast_counts') is png
+    drop_last_row(catalog)
+    assert charts.chart('roast_counts') is not png
+    assert charts._cache.misses == 2
+
+
+def test_prewarm_keeps_only_the_current_version(catalog):
+    charts.render_static(['roast_counts'])
+    drop_last_row(catalog)
+    charts.render_static(['roast_counts'])
+    charts.render_static(['roast_counts'])
+    assert len(charts._prewarmed) == 1 and charts._cache.misses == 2
+
+
+def test_grid_cache_holds_the_latest_dataset_only():
+    cache = GridCache()
+    first = pd.DataFrame({'x': [1.0, 2.0, 2.0], 'y': [5.0, 5.0, 6.0]})
+    counts, x_edges, y_edges = cache.get(first, 'x', 'y')
+    assert counts.sum() == 3 and counts.shape == (len(x_edges) - 1, len(y_edges) - 1)
+    transposed, _, _ = cache.get(first, 'y', 'x')
+    assert (transposed == counts.T).all() and len(cache._grids) == 1
+
+    second = pd.DataFrame({'x': [1.0], 'y': [2.0]})
+    assert cache.get(second, 'x', 'y')[0].sum() == 1 and len(cache._grids) == 1
+    del second
+    gc.collect()
+    assert cache._df() is None
+
+
+def test_integer_scores_get_one_bin_per_value():
+    edges = charts.grid_edges(np.array([6.0, 7.0, 9.0, 10.0]))
+    assert edges.tolist() == [5.5, 6.5, 7.5, 8.5, 9.5, 10.5]
+    assert len(charts.grid_edges(np.linspace(0, 40, 1000))) == charts.GRID_BINS + 1
+    assert charts.grid_edges(np.array([2.5, 2.5])).tolist()[0] == 2.5
+
+
+@pytest.mark.parametrize('threshold, density', [(0, False), (10**9, False), (100, True)])
+def test_scatter_plots_switch_to_a_density_grid(coffee_df, monkeypatch, threshold, density):
+    from matplotlib.collections import PathCollection, QuadMesh
+    monkeypatch.setattr(charts, 'DENSITY_THRESHOLD', threshold)
+    monkeypatch.setattr(charts, '_grids', GridCache())
+    assert charts.use_density(coffee_df) == density
+
+    ax = charts.price_vs_rating(coffee_df).axes[0]
+    meshes = [child for child in ax.get_children() if isinstance(child, QuadMesh)]
+    points = [child for child in ax.get_children() if isinstance(child, PathCollection)]
+    assert bool(meshes) == density and bool(points) != density
+    if density:
+        counts = meshes[0].get_array()
+        assert counts.sum() == coffee_df[['price_per_ounce', 'rating']].dropna().shape[0]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from cluster_store import ClusterStore
+
+
+@pytest.fixture
+def store():
+    rng = np.random.default_rng(0)
+    # Ratings on a coarse grid so clusters hold ties
+    return ClusterStore(rng.integers(0, 6, 300), rng.integers(80, 95, 300))
+
+
+def naive_best(store, input_ids):
+    """Highest-rated bean of the input clusters outside the inputs, ties to the lower cluster and bean ID."""
+    candidates = [bean for bean in range(len(store.bean_cluster))
+                  if store.bean_cluster[bean] in store.bean_cluster[input_ids] and bean not in input_ids]
+    return min(candidates, key=lambda bean: (-store.ratings[bean], store.bean_cluster[bean], bean), default=None)
+
+
+def test_clusters_are_sorted_by_rating(store):
+    for cluster_id in range(store.n_clusters):
+        members = store.cluster_members(cluster_id)
+        assert (store.bean_cluster[members] == cluster_id).all()
+        assert (np.diff(store.ratings[members]) <= 0).all()
+    assert sorted(store.members.tolist()) == list(range(len(store.bean_cluster)))
+
+
+@pytest.mark.parametrize('input_ids', [[0], [5, 17], [3, 3], [1, 2, 4, 8, 16]])
+def test_recommend_matches_a_full_scan(store, input_ids):
+    assert store.recommend(input_ids) == naive_best(store, input_ids)
+    assert store.recommend(input_ids[::-1]) == store.recommend(input_ids)
+
+
+def test_every_member_excluded_gives_none():
+    store = ClusterStore([0, 0, 1], [90, 85, 88])
+    assert store.recommend([0, 1]) is None
+    assert store.recommend([0]) == 1
+
+
+def test_rank_scores_the_share_of_the_basket(store):
+    basket = np.flatnonzero(store.bean_cluster == 2)[:3].tolist() + np.flatnonzero(store.bean_cluster == 4)[:1].tolist()
+    ids, scores = store.rank(basket, n=5)
+    assert len(ids) == 5 and not np.isin(ids, basket).any()
+    assert (store.bean_cluster[ids] == 2).all() and (scores == 0.75).all()
+    assert ids[0] == store.recommend(basket[:3])
+
+
+def test_from_clusters_dict():
+    clusters_dict = {
+        'a': {'cluster': 0, 'neighbors': ['b'], 'ratings': [91]},
+        'b': {'cluster': 0, 'neighbors': ['a'], 'ratings': [88]},
+        'c': {'cluster': 1, 'neighbors': [], 'ratings': []},
+    }
+    store = ClusterStore.from_clusters_dict(clusters_dict, {'a': 0, 'b': 1, 'c': 2})
+    assert store.cluster_members(0).tolist() == [1, 0]
+    assert store.recommend([0]) == 1
+    with pytest.raises(ValueError):
+        ClusterStore.from_clusters_dict(clusters_dict, {'a': 0, 'b': 1, 'c': 2, 'd': 3})
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from conftest import DATASET_PATH
+
+
+def test_cached_load_matches_the_parsed_csv(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    parsed = dataset.load_dataset(DATASET_PATH, cache_dir=cache_dir)
+    cached = dataset.load_dataset(DATASET_PATH, cache_dir=cache_dir)
+    assert os.listdir(os.path.join(cache_dir, 'dataset')) == [dataset.file_hash(DATASET_PATH)[:16]]
+    # The cached columns are read-only memory maps, compared as in-memory copies
+    assert not cached['rating'].to_numpy().flags.writeable
+    pd.testing.assert_frame_equal(cached.copy(deep=True), parsed, check_categorical=False)
+    assert cached['rating'].dtype == np.float32
+    assert isinstance(cached['roast'].dtype, pd.CategoricalDtype)
+
+
+def test_values_survive_the_cache(coffee_df, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    dataset.load_dataset(DATASET_PATH, cache_dir=cache_dir)
+    cached = dataset.load_dataset(DATASET_PATH, cache_dir=cache_dir)
+    for column in coffee_df.columns:
+        expected, actual = coffee_df[column], cached[column]
+        if pd.api.types.is_numeric_dtype(expected):
+            np.testing.assert_allclose(actual.astype(float), expected.astype(float), rtol=1e-6, err_msg=column)
+        else:
+            assert actual.astype(object).where(actual.notna(), None).tolist() == \
+                expected.where(expected.notna(), None).tolist(), column
+
+
+def test_changed_csv_gets_a_new_cache(tmp_path):
+    path, cache_dir = str(tmp_path / 'coffee.csv'), str(tmp_path / 'cache')
+    shutil.copy(DATASET_PATH, path)
+    full = dataset.load_dataset(path, cache_dir=cache_dir)
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path, 'w') as f:
+        f.writelines(lines[:-5])
+    assert len(dataset.load_dataset(path, cache_dir=cache_dir)) == len(full) - 5
+    assert len(os.listdir(os.path.join(cache_dir, 'dataset'))) == 2
+
+
+def test_unreadable_cache_is_rebuilt(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    expected = dataset.load_dataset(DATASET_PATH, cache_dir=cache_dir)
+    cache_path = os.path.join(cache_dir, 'dataset', dataset.file_hash(DATASET_PATH)[:16])
+    with open(os.path.join(cache_path, 'manifest.json'), 'w') as f:
+        f.write('{"version": 0}')
+    pd.testing.assert_frame_equal(dataset.load_dataset(DATASET_PATH, cache_dir=cache_dir), expected)
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from facts import ALL, FACTS, FactCube
+
+
+@pytest.fixture(scope='module')
+def cube(coffee_df):
+    return FactCube(coffee_df)
+
+
+def scoped(df, country, roast):
+    if country is not ALL:
+        df = df[df['country'] == country]
+    if roast is not ALL:
+        df = df[df['roast'] == roast]
+    return df
+
+
+def scopes(coffee_df):
+    countries = coffee_df['country'].value_counts().index[:4].tolist()
+    roasts = coffee_df['roast'].dropna().unique().tolist()[:3]
+    return [(country, roast) for country in [ALL] + countries for roast in [ALL] + roasts]
+
+
+def test_beans_match_a_filtered_scan(cube, coffee_df):
+    for country, roast in scopes(coffee_df):
+        df = scoped(coffee_df, country, roast)
+        for fact, (metric, pick) in FACTS.items():
+            answer = cube.bean(fact, roast=roast, country=country)
+            if not df[metric].notna().any():
+                assert answer is None
+                continue
+            row = getattr(df[metric], pick)()
+            assert (answer.name, answer.count) == (df['name'][row], df[metric].count())
+            assert answer.value == pytest.approx(df[metric][row])
+
+
+def test_roasters_match_a_filtered_scan(cube, coffee_df):
+    for country, roast in scopes(coffee_df):
+        for fact, (metric, pick) in FACTS.items():
+            means = scoped(coffee_df, country, roast).groupby('roaster')[metric].mean().dropna()
+            answer = cube.roaster(fact, country=country, roast=roast)
+            if means.empty:
+                assert answer is None
+                continue
+            roaster = getattr(means, pick)()
+            assert (answer.name, answer.count) == (roaster, len(means))
+            assert answer.value == pytest.approx(means[roaster])
+
+
+def test_empty_scopes_and_ties():
+    df = pd.DataFrame({
+        'name': ['a', 'b', 'c'], 'roaster': ['R2', 'R1', 'R1'], 'country': ['Kenya', 'Kenya', 'Peru'],
+        'roast': ['Light', 'Light', 'Dark'], 'rating': [90, 90, 85], 'price_per_ounce': [1.0, None, 2.0],
+    })
+    cube = FactCube(df)
+    assert cube.bean('Best', country='Kenya').name == 'a'
+    assert cube.roaster('Best', country='Kenya').name == 'R1'
+    assert cube.bean('Best', roast='Dark', country='Kenya') is None
+    assert cube.bean('Most Expensive', roast='Light').count == 1
+    assert cube.countries == ['Kenya', 'Peru'] and cube.roasts == ['Light', 'Dark']
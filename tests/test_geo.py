@@ -0,0 +1,36 @@
+import pandas as pd
+
+from geo import COUNTRY_CODE_DTYPE, country_codes, origin_countries, roaster_countries
+
+
+def values(series):
+    return [None if pd.isna(value) else value for value in series]
+
+
+def test_matches_the_notebook_countries(coffee_df):
+    # The dataset's country columns come from the notebook's row-wise list scans
+    assert values(roaster_countries(coffee_df['location'])) == values(coffee_df['country'])
+    assert values(origin_countries(coffee_df['origin'])) == values(coffee_df['origin_country'])
+
+
+def test_us_states_are_folded_into_usa():
+    locations = pd.Series(['Portland, Oregon', "Kona, Big Island of Hawai’i", 'Taipei, Taiwan', 'Chicago, Calfornia',
+                           'Toronto, Ontario, Canada', None, 'Nowhere'], index=list('abcdefg'))
+    assert values(roaster_countries(locations)) == ['USA', 'USA', 'Taiwan', 'USA', 'Canada', None, 'Nowhere']
+    assert roaster_countries(locations).index.tolist() == list('abcdefg')
+
+
+def test_origin_names_match_on_word_boundaries():
+    origins = pd.Series(['Dominican Republic', 'Dominica', 'Kenya; Ethiopia blend', 'Ethiopia and Kenya',
+                         'Nigeria', 'Java, Indonesia', 'House blend', None])
+    assert values(origin_countries(origins)) == [
+        'Dominican Republic', 'Dominica', 'Ethiopia; Kenya', 'Ethiopia; Kenya', 'Nigeria', 'Indonesia', None, None,
+    ]
+
+
+def test_codes_do_not_depend_on_the_dataset():
+    small = country_codes(pd.Series(['Kenya']))
+    large = country_codes(pd.Series(['USA', 'Kenya', 'England', 'Atlantis']))
+    assert small.dtype == large.dtype == COUNTRY_CODE_DTYPE
+    assert small.cat.codes[0] == large.cat.codes[1]
+    assert large.tolist()[:3] == ['USA', 'KEN', 'GBR'] and pd.isna(large[3])
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+import import_budget
+from conftest import ROOT
+
+# Budgets x scale, for slower machines, as `python -m import_budget --scale`
+SCALE = float(os.environ.get('COFFEE_IMPORT_BUDGET_SCALE', 1))
+
+
+@pytest.fixture(autouse=True)
+def in_root(monkeypatch):
+    # The entry points are paths relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.mark.parametrize('entry_point', list(import_budget.BUDGETS))
+def test_entry_point_is_within_its_budget(entry_point):
+    [(_, report, budget_ms, found)] = import_budget.check({entry_point: import_budget.BUDGETS[entry_point]},
+                                                          scale=SCALE, repeat=2)
+    assert found == []
+    assert report['total_ms'] <= budget_ms, f"slowest: {report['top']}"
+
+
+def test_check_reports_an_exceeded_budget():
+    [(_, report, budget_ms, found)] = import_budget.check({'pages/recommendation.py': (0, ('streamlit',))}, repeat=1)
+    assert report['total_ms'] > budget_ms
+    assert found == ['streamlit']
+
+
+def test_main_fails_when_a_budget_is_exceeded(monkeypatch, capsys):
+    monkeypatch.setattr(import_budget, 'BUDGETS', {'recommendation.py': (0, ())})
+    assert import_budget.main(['--repeat', '1']) == 1
+    assert capsys.readouterr().out.startswith('FAIL recommendation.py')
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import load
+
+import incremental
+from artifacts import build_artifact, convert_joblib, load_artifact, save_artifact
+from conftest import KMEANS_MODEL_PATH, KNN_MODEL_PATH, page_test
+
+N_NEW = 30
+
+
+def list_distances(artifact, neighbors):
+    features = np.asarray(artifact.features, dtype=np.float64)
+    return np.linalg.norm(features[:, None, :] - features[neighbors], axis=2)
+
+
+@pytest.fixture
+def base_artifact(coffee_df, tmp_path):
+    """Artifact of all but the last N_NEW beans, exact neighbor lists."""
+    path = str(tmp_path / 'model')
+    save_artifact(path, build_artifact(coffee_df.iloc[:-N_NEW].reset_index(drop=True)))
+    return path
+
+
+def test_patched_lists_match_exact_search(coffee_df, base_artifact):
+    report = incremental.add_beans(coffee_df.iloc[-N_NEW:], base_artifact)
+    assert report['added'] == N_NEW and report['patched_neighbor_lists'] > 0
+
+    artifact = load_artifact(base_artifact)
+    _, exact = artifact.engine().kneighbors(np.arange(len(artifact)), k=artifact.k)
+    # Compared by distance: beans with identical features may be listed in any order
+    np.testing.assert_allclose(list_distances(artifact, artifact.neighbors), exact, atol=1e-4)
+
+
+def test_converted_lists_only_take_beans_within_the_exact_kth_distance(coffee_df, tmp_path):
+    # The joblib lists come from another notebook run and are not the top-k of the CSV features
+    path = str(tmp_path / 'model')
+    save_artifact(path, convert_joblib(load(KNN_MODEL_PATH), load(KMEANS_MODEL_PATH), coffee_df))
+    before = load_artifact(path)
+    _, exact = before.engine().kneighbors(np.arange(len(before)), k=before.k)
+
+    copies = coffee_df.sample(5, random_state=1).copy()
+    copies['name'] = copies['name'] + ' (copy)'
+    copies['rating'] = 99
+    incremental.add_beans(copies, path)
+
+    after = load_artifact(path)
+    n_old = len(before)
+    old_lists = np.asarray(after.neighbors[:n_old])
+    patched = np.nonzero((old_lists >= n_old).any(axis=1))[0]
+    assert 0 < len(patched) < n_old // 10
+    features = np.asarray(after.features, dtype=np.float64)
+    for old_id in patched:
+        new_ids = old_lists[old_id][old_lists[old_id] >= n_old]
+        distances = np.linalg.norm(features[new_ids] - features[old_id], axis=1)
+        assert (distances <= exact[old_id, -1] + 1e-4).all()
+
+
+def test_missing_scores_are_filled_from_the_catalog(coffee_df, base_artifact):
+    bean = coffee_df.iloc[-1:].copy()
+    bean['aroma'] = np.nan
+    report = incremental.add_beans(bean, base_artifact)
+    assert report['added'] == 1 and report['rejected'] == []
+
+    artifact = load_artifact(base_artifact)
+    bean_id = artifact.names.find(bean['name'].iloc[0])
+    assert np.isfinite(artifact.features[bean_id]).all()
+    assert artifact.features[bean_id][0] == pytest.approx(artifact.manifest['feature_means']['aroma'], rel=1e-6)
+    assert bean_id not in artifact.neighbors[bean_id]
+    assert not report['drift']['needs_refit']
+
+
+def test_rows_with_unusable_features_are_rejected(coffee_df, base_artifact):
+    bean = coffee_df.iloc[-1:].copy()
+    bean['aroma'] = np.inf
+    report = incremental.add_beans(bean, base_artifact)
+    assert report['added'] == 0 and report['rejected'] == [bean['name'].iloc[0]]
+
+
+def test_non_finite_drift_counters_ask_for_a_refit():
+    manifest = {'n_beans': 1000, 'mean_centroid_distance': 1.0,
+                'drift': {'beans_since_refit': 1, 'centroid_distance_sum': float('nan')}}
+    drift = incremental.drift_status(manifest, {'added': 1, 'centroid_distance_sum': 0.5})
+    assert drift['growth'] < incremental.MAX_GROWTH
+    assert drift['needs_refit']
+
+
+def test_deltas_are_compacted_above_the_threshold(coffee_df, tmp_path, monkeypatch):
+    path = str(tmp_path / 'model')
+    save_artifact(path, build_artifact(coffee_df.iloc[:-N_NEW].reset_index(drop=True)))
+    monkeypatch.setattr(incremental, 'MAX_DELTAS', 3)
+    reports = [incremental.add_beans(coffee_df.iloc[-N_NEW + 10 * i:len(coffee_df) - N_NEW + 10 * (i + 1)], path)
+               for i in range(3)]
+    assert [report['compacted'] for report in reports] == [False, False, True]
+
+    artifact = load_artifact(path)
+    assert 'deltas' not in artifact.manifest and len(artifact) == len(coffee_df)
+    assert isinstance(artifact.features, np.memmap)
+
+
+def test_added_beans_are_appended_to_the_dataset(coffee_df, tmp_path):
+    path, dataset_path = str(tmp_path / 'model'), str(tmp_path / 'coffee_cleaned.csv')
+    coffee_df.iloc[:-N_NEW].to_csv(dataset_path, index=False)
+    save_artifact(path, build_artifact(coffee_df.iloc[:-N_NEW].reset_index(drop=True)))
+    incremental.add_beans(coffee_df.iloc[-N_NEW:], path, dataset_path)
+
+    dataset = pd.read_csv(dataset_path)
+    assert list(dataset.columns) == list(coffee_df.columns)
+    assert dataset['name'].tolist() == coffee_df['name'].tolist()
+    artifact = load_artifact(path)
+    ids = [artifact.names.find(name) for name in dataset['name'].iloc[-N_NEW:]]
+    assert dataset['cluster'].iloc[-N_NEW:].tolist() == np.asarray(artifact.clusters)[ids].tolist()
+
+
+def test_recommendation_page_handles_beans_missing_from_the_dataset(coffee_df, tmp_path, use_catalog):
+    # The artifact knows a copy of the source bean with a top rating, the dataset does not
+    path = str(tmp_path / 'model')
+    save_artifact(path, build_artifact(coffee_df))
+    source = coffee_df.iloc[0]
+    copy = coffee_df.iloc[:1].assign(name=source['name'] + ' (copy)', rating=99)
+    incremental.add_beans(copy, path)
+    use_catalog(artifact_path=path)
+
+    at = page_test('recommendation.py').run()
+    at.sidebar.text_input[0].set_value(source['name']).run()
+    at.sidebar.selectbox[0].set_value(source['name']).run()
+    next(button for button in at.button if button.label == "Get Recommendation").click().run()
+    assert not at.exception
+    assert f"Recommended Coffee: {copy['name'].iloc[0]}" in [success.value for success in at.success]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import pipeline
+from artifacts import load_artifact
+
+RAW_COLUMNS = ['name', 'roaster', 'roast', 'location', 'origin', 'est_price',
+               'aroma', 'acid', 'body', 'flavor', 'aftertaste', 'rating']
+PARAMS = {'n_clusters': 8}
+
+
+@pytest.fixture
+def raw_path(coffee_df, tmp_path):
+    """The review columns of a few hundred beans, as in the raw dataset."""
+    path = str(tmp_path / 'coffee_clean.csv')
+    coffee_df[RAW_COLUMNS].iloc[:300].to_csv(path, index=False)
+    return path
+
+
+def run(raw_path, tmp_path, params=PARAMS):
+    log = []
+    outputs, keys = pipeline.run_pipeline(raw_path, params, cache_dir=str(tmp_path / 'cache'), workers=1, log=log.append)
+    return outputs, keys, {line.split()[0]: line.split()[1] for line in log}
+
+
+def test_rerun_only_runs_invalidated_stages(raw_path, tmp_path):
+    outputs, keys, first = run(raw_path, tmp_path)
+    assert set(first.values()) == {'ran'}
+    _, same_keys, second = run(raw_path, tmp_path)
+    assert same_keys == keys and set(second.values()) == {'cached'}
+
+    _, new_keys, third = run(raw_path, tmp_path, {**PARAMS, 'k': 5})
+    assert third['knn'] == 'ran' and third['kmeans'] == 'cached' and third['encode'] == 'cached'
+    assert new_keys['knn'] != keys['knn'] and new_keys['kmeans'] == keys['kmeans']
+
+
+def test_stage_outputs(raw_path, tmp_path):
+    outputs, _, _ = run(raw_path, tmp_path)
+    encoded = outputs['encode']
+    assert len(encoded['df']) == len(encoded['features']) == len(outputs['knn']) == len(outputs['kmeans'])
+    assert encoded['df']['price_per_ounce'].le(pipeline.DEFAULT_PARAMS['max_price_per_ounce']).all()
+    assert outputs['knn'].shape[1] == pipeline.DEFAULT_PARAMS['k']
+    assert set(np.unique(outputs['kmeans'])) <= set(range(PARAMS['n_clusters']))
+
+
+def test_export_is_skipped_when_current(raw_path, tmp_path):
+    outputs, keys, _ = run(raw_path, tmp_path)
+    csv_path, artifact_path = str(tmp_path / 'coffee_cleaned.csv'), str(tmp_path / 'model')
+    assert pipeline.export(outputs, keys, csv_path, artifact_path)
+    assert pipeline.export_is_current(pipeline.export_key(keys), csv_path, artifact_path)
+    assert not pipeline.export(outputs, keys, csv_path, artifact_path)
+
+    artifact = load_artifact(artifact_path)
+    assert len(artifact) == len(outputs['encode']['df'])
+    np.testing.assert_array_equal(artifact.neighbors, outputs['knn'])
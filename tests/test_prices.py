@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from prices import parse_prices, price_per_ounce, unparseable
+
+
+def test_matches_the_notebook_prices(coffee_df):
+    # price_per_ounce of the dataset comes from the notebook's row-wise convert_to_dollar_per_ounce
+    np.testing.assert_allclose(price_per_ounce(coffee_df['est_price']), coffee_df['price_per_ounce'], rtol=1e-6)
+
+
+@pytest.mark.parametrize('text, currency, expected', [
+    ('$14.80/12 ounces', 'USD', 14.80 / 12),
+    ('NT $450/8 ounces', 'TWD', 450 * 0.032 / 8),
+    ('CAD $22.00/340 grams', 'CAD', 22 * 0.75 / (340 * 0.035274)),
+    ('$20/pound', 'USD', 20 / 16),
+    ('1,200 pesos/1 kilogram', 'MXN', 1200 * 0.057 / 35.274),
+    ('  RMB 98 / 227 g. ', 'CNY', 98 * 0.1381 / (227 * 0.035274)),
+])
+def test_formats(text, currency, expected):
+    parsed = parse_prices(pd.Series([text])).iloc[0]
+    assert parsed['currency'] == currency and pd.isna(parsed['error'])
+    assert parsed['price_per_ounce'] == pytest.approx(expected)
+
+
+def test_unparseable_rows_get_a_reason():
+    prices = pd.Series(['garbage', None, '€10/12 ounces', '$10/12 cups', '$10/0 ounces', '10/12 ounces', '$5/2 oz'],
+                       index=[10, 11, 12, 13, 14, 15, 16])
+    parsed = parse_prices(prices)
+    assert parsed.index.tolist() == prices.index.tolist()
+    assert parsed['error'].tolist()[:-1] == [
+        'unrecognized format', 'missing price', 'unknown currency: €', 'unknown unit: cups', 'zero quantity',
+        'missing currency',
+    ]
+    assert parsed['price_per_ounce'].isna().tolist() == [True] * 6 + [False]
+    assert unparseable(parsed, prices)['est_price'].tolist() == prices.iloc[:6].tolist()
+
+
+def test_repeated_strings_are_broadcast():
+    prices = pd.Series(['$18.00/12 ounces', 'junk', '$18.00/12 ounces', None, 'junk'])
+    parsed = parse_prices(prices)
+    assert parsed['price_per_ounce'].iloc[[0, 2]].tolist() == [1.5, 1.5]
+    assert parsed['error'].iloc[[1, 3, 4]].tolist() == ['unrecognized format', 'missing price', 'unrecognized format']
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import quantized
+from quantized import CompactIndex
+from similarity import SimilarityEngine, build_feature_matrix
+
+
+@pytest.fixture(scope='module')
+def engine(coffee_df):
+    features, _ = build_feature_matrix(coffee_df)
+    return SimilarityEngine(coffee_df['name'].to_numpy(), features, coffee_df['rating'].to_numpy())
+
+
+@pytest.fixture(scope='module')
+def index(engine):
+    return CompactIndex.from_features(engine.features)
+
+
+def test_compact_index_is_smaller_than_the_features(engine, index):
+    assert len(index) == len(engine)
+    assert index.nbytes() < engine.features.astype(np.float32).nbytes / 4
+
+
+@pytest.mark.parametrize('metric', ['euclidean', 'manhattan', 'cosine'])
+def test_recall_against_exact_search(engine, index, metric):
+    query_ids = np.arange(0, len(engine), 11)
+    assert quantized.recall(engine, index, query_ids, k=10, metric=metric) >= 0.95
+
+
+def test_main_reads_the_registry_artifact(use_catalog, tmp_path, capsys):
+    use_catalog(artifact_path=str(tmp_path / 'model'))
+    quantized.main(['--queries', '20'])
+    out = capsys.readouterr().out
+    assert 'B/bean' in out and 'recall@10' in out
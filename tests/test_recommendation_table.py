@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+import incremental
+import recommendation
+from artifacts import ModelArtifact, build_artifact, load_artifact, save_artifact
+from recommendation_table import RecommendationTable, add_table, frequent_pairs, pair_keys
+
+
+@pytest.fixture(scope='module')
+def built(coffee_df):
+    return build_artifact(coffee_df)
+
+
+@pytest.fixture
+def pair_log(built, tmp_path):
+    """Basket log of a few pairs repeated at different rates, plus noise baskets."""
+    rng = np.random.default_rng(0)
+    names = built.names[np.arange(len(built))]
+    lines = []
+    for i in range(40):
+        lines += [{'id': f"{i}-{j}", 'beans': [names[2 * i], names[2 * i + 1]]} for j in range(1 + i % 5)]
+    lines += [{'id': f"noise-{i}", 'beans': list(rng.choice(names, 3, replace=False))} for i in range(20)]
+    path = tmp_path / 'baskets.jsonl'
+    path.write_text(''.join(json.dumps(line) + '\n' for line in lines))
+    return str(path)
+
+
+def test_frequent_pairs_are_counted_across_orders(built):
+    names = built.names[np.arange(4)]
+    baskets = [(0, [names[0], names[1]]), (1, [names[1], names[0]]), (2, [names[2], names[3], 'No such coffee']),
+               (3, [names[0], names[0]])]
+    keys = frequent_pairs(baskets, built, max_pairs=2)
+    assert keys.tolist() == [pair_keys(np.array([0]), np.array([1]))[0], pair_keys(np.array([2]), np.array([3]))[0]]
+
+
+def test_table_answers_match_the_live_recommendations(built, pair_log, tmp_path, use_catalog):
+    live_path, table_path = str(tmp_path / 'live'), str(tmp_path / 'table')
+    save_artifact(live_path, built)
+    artifact = load_artifact(live_path)
+    add_table(artifact, pair_log, max_pairs=25)
+    save_artifact(table_path, artifact)
+
+    table = RecommendationTable.from_artifact(load_artifact(table_path))
+    assert len(table) == 25 and table.single.shape == (len(built), 2)
+    requests = [[i] for i in range(0, len(built), 37)] + [[2 * i + 1, 2 * i] for i in range(40)]
+    held = [request for request in requests if table.lookup(request, 'knn', k=10) is not None]
+    assert len(held) == len(requests) - 15
+
+    registry = use_catalog(artifact_path=live_path)
+    live = [(recommendation.recommend_knn_ids(ids), recommendation.recommend_kmeans_ids(ids)) for ids in held]
+    assert registry.get_artifact().recommendation_table() is None
+    use_catalog(artifact_path=table_path)
+    assert [(table.lookup(ids, 'knn', k=10), table.lookup(ids, 'kmeans')) for ids in held] == \
+        [tuple(-1 if answer is None else answer for answer in answers) for answers in live]
+    assert [(recommendation.recommend_knn_ids(ids), recommendation.recommend_kmeans_ids(ids)) for ids in held] == live
+
+
+def test_requests_outside_the_table_are_computed(built):
+    table = add_table(ModelArtifact(dict(built.arrays), dict(built.manifest)))
+    assert table.lookup([0], 'knn', k=5) is None and table.lookup([0], 'knn', metric='cosine') is None
+    assert table.lookup([0, 1], 'knn', k=10) is None and table.lookup([0, 1, 2], 'kmeans') is None
+
+
+def test_table_is_dropped_when_the_model_changes(coffee_df, tmp_path):
+    path = str(tmp_path / 'model')
+    artifact = build_artifact(coffee_df.iloc[:-5].reset_index(drop=True))
+    add_table(artifact)
+    save_artifact(path, artifact)
+    assert RecommendationTable.from_artifact(load_artifact(path)) is not None
+    incremental.add_beans(coffee_df.iloc[-5:], path)
+    assert RecommendationTable.from_artifact(load_artifact(path)) is None
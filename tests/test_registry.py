@@ -0,0 +1,56 @@
+import os
+import shutil
+
+import pytest
+
+import registry
+from artifacts import save_artifact
+from conftest import DATASET_PATH
+
+
+@pytest.fixture
+def catalog(use_catalog, tmp_path, monkeypatch):
+    """Registry over a copy of the dataset that is checked on every access."""
+    path = str(tmp_path / 'coffee_cleaned.csv')
+    shutil.copy(DATASET_PATH, path)
+    monkeypatch.setattr(registry, 'CHECK_INTERVAL', 0.0)
+    use_catalog(dataset_path=path, artifact_path=str(tmp_path / 'model'))
+    return path
+
+
+def test_resources_are_loaded_once(catalog):
+    assert registry.get_dataset() is registry.get_dataset()
+    assert registry.get_catalog_index() is registry.get_catalog_index()
+
+
+def test_touching_a_file_without_changing_it_keeps_the_value(catalog):
+    dataset, version = registry.get_dataset(), registry.version('dataset')
+    stat = os.stat(catalog)
+    os.utime(catalog, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert registry.get_dataset() is dataset and registry.version('dataset') == version
+
+
+def test_changed_files_are_reloaded(catalog):
+    dataset, index, version = registry.get_dataset(), registry.get_search_index(), registry.version('dataset')
+    with open(catalog) as f:
+        lines = f.readlines()
+    with open(catalog, 'w') as f:
+        f.writelines(lines[:-1])
+    assert len(registry.get_dataset()) == len(dataset) - 1
+    assert registry.version('dataset') != version
+    assert registry.get_search_index() is not index
+
+
+def test_invalidate_drops_one_resource(catalog):
+    dataset, index = registry.get_dataset(), registry.get_catalog_index()
+    registry.invalidate('catalog_index')
+    assert registry.get_dataset() is dataset
+    assert registry.get_catalog_index() is not index
+
+
+def test_artifact_is_built_until_one_is_exported(catalog, tmp_path):
+    artifact = registry.get_artifact()
+    assert not os.path.exists(tmp_path / 'model')
+    save_artifact(str(tmp_path / 'model'), artifact)
+    loaded = registry.get_artifact()
+    assert loaded is not artifact and loaded.model_version == artifact.model_version
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import page_test
+from search import SearchIndex, normalize
+
+
+@pytest.fixture(scope='module')
+def index(coffee_df):
+    return SearchIndex(coffee_df)
+
+
+@pytest.mark.parametrize('term', ['kenya', 'ETHIOPIA', 'natural', 'ro', 'x', 'blend', 'no such coffee'])
+def test_matches_the_dataframe_scan(index, coffee_df, term):
+    # The scan the explorer form used before the index
+    expected = coffee_df['name'].str.contains(term, case=False, regex=False) | \
+        coffee_df['roaster'].str.contains(term, case=False, regex=False, na=False)
+    assert sorted(index.search(term).tolist()) == np.flatnonzero(expected).tolist()
+
+
+def test_results_are_ranked():
+    df = pd.DataFrame({
+        'name': ['Kenya Nyeri', 'Kenya', 'Best of Kenya', 'Kenyan Blend', 'House Blend'],
+        'roaster': ['A', 'B', 'C', 'D', 'Kenya Roasters'],
+        'rating': [90, 85, 95, 91, 99],
+    })
+    assert SearchIndex(df).search_names('kenya') == ['Kenya', 'Kenyan Blend', 'Kenya Nyeri', 'Best of Kenya', 'House Blend']
+
+
+def test_accents_and_whitespace_are_ignored():
+    assert normalize('  Café   de\tColombia ') == 'cafe de colombia'
+    df = pd.DataFrame({'name': ['Café de Colombia'], 'roaster': [None], 'rating': [90]})
+    assert SearchIndex(df).search_names('CAFE  DE') == ['Café de Colombia']
+
+
+def test_suggest_prefers_prefixes(index, coffee_df):
+    suggestions = index.suggest('ethiopia', limit=5)
+    assert len(suggestions) == 5
+    prefixed = coffee_df['name'].map(normalize).str.startswith('ethiopia').sum()
+    assert all(normalize(name).startswith('ethiopia') for name in suggestions[:min(5, prefixed)])
+    assert index.suggest('') == []
+
+
+def test_explorer_searches_on_submit(use_catalog):
+    use_catalog()
+    at = page_test('dataset_explorer.py').run()
+    at.text_input[0].set_value('kenya').run()
+    assert 'Search Results' not in [subheader.value for subheader in at.subheader]
+    at.button[0].click().run()
+    assert not at.exception
+    assert 'Search Results' in [subheader.value for subheader in at.subheader]
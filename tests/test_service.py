@@ -0,0 +1,119 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+import recommendation
+from service import RecommendationCache, RecommendationService
+
+
+async def read_response(reader):
+    """(status, body bytes) of one HTTP/1.1 response, chunked or with a Content-Length."""
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split()[1])
+    headers = dict(line.lower().split(': ', 1) for line in head[1:] if line)
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b''
+        while size := int((await reader.readline()).strip(), 16):
+            body += await reader.readexactly(size)
+            await reader.readline()
+        await reader.readline()
+        return status, body
+    return status, await reader.readexactly(int(headers['content-length']))
+
+
+def exchange(requests):
+    """Sends (method, target, body) requests over one kept-alive connection to a fresh service."""
+    async def run():
+        service = RecommendationService()
+        server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        responses = []
+        for method, target, body in requests:
+            writer.write(f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            responses.append(await read_response(reader))
+        writer.close()
+        await writer.wait_closed()
+        # Lets the handler see the closed connection and return before the loop stops
+        await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+        return responses
+    return asyncio.run(run())
+
+
+def recommend_target(beans, **params):
+    return '/recommend?' + urlencode({**params, 'beans': beans}, doseq=True)
+
+
+@pytest.fixture
+def names(coffee_df, use_catalog, tmp_path):
+    use_catalog(artifact_path=str(tmp_path / 'model'))
+    return coffee_df['name'].drop_duplicates().tolist()
+
+
+def test_recommend_matches_the_library_and_is_cached(names):
+    beans = names[:2]
+    responses = exchange([
+        ('GET', recommend_target(beans), b''),
+        ('GET', recommend_target(beans[::-1]), b''),
+        ('GET', recommend_target(beans[:1], model='kmeans'), b''),
+        ('GET', '/health', b''),
+    ])
+    assert [status for status, _ in responses] == [200] * 4
+    first, second, kmeans, health = [json.loads(body) for _, body in responses]
+    assert first['recommendation'] == second['recommendation'] == recommendation.recommend_knn(beans)
+    assert kmeans['recommendation'] == recommendation.recommend_kmeans(beans[:1])
+    assert health == {'status': 'ok', 'cache_hits': 1, 'cache_misses': 2}
+
+
+def test_basket_ranking(names):
+    [(status, body)] = exchange([('GET', '/recommend/basket?' + urlencode({'beans': names[:5], 'n': 3}, doseq=True), b'')])
+    ranked = json.loads(body)['recommendations']
+    assert status == 200 and len(ranked) == 3
+    assert [(entry['name'], entry['score']) for entry in ranked] == \
+        [(name, pytest.approx(score)) for name, score in recommendation.recommend_basket(names[:5], n=3)]
+
+
+@pytest.mark.parametrize('method, target, status', [
+    ('GET', recommend_target(['No such coffee']), 404),
+    ('GET', recommend_target([], model='knn'), 400),
+    ('GET', recommend_target(['x'], k=0), 400),
+    ('GET', recommend_target(['x'], metric='chebyshev'), 400),
+    ('GET', recommend_target(['x'], model='svm'), 400),
+    ('POST', recommend_target(['x']), 405),
+    ('GET', '/nowhere', 404),
+])
+def test_invalid_requests(names, method, target, status):
+    [(got, body)] = exchange([(method, target, b'')])
+    assert got == status and 'error' in json.loads(body)
+
+
+def test_batch_is_streamed(names):
+    body = ''.join(json.dumps({'id': i, 'beans': names[i:i + 2]}) + '\n' for i in range(5)).encode()
+    body += json.dumps({'id': 'bad', 'beans': ['No such coffee']}).encode()
+    [(status, out)] = exchange([('POST', '/recommend/batch?model=knn', body)])
+    records = [json.loads(line) for line in out.decode().splitlines()]
+    assert status == 200 and [record['id'] for record in records] == [0, 1, 2, 3, 4, 'bad']
+    assert records[0]['recommendation'] == recommendation.recommend_knn(names[:2])
+    assert 'unknown beans' in records[-1]['error']
+
+
+def test_concurrent_identical_requests_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'answer'
+
+    async def run():
+        cache = RecommendationCache(max_size=1)
+        results = await asyncio.gather(*(cache.get('key', compute) for _ in range(5)))
+        await cache.get('other', compute)
+        return results, cache
+
+    results, cache = asyncio.run(run())
+    assert results == ['answer'] * 5 and len(calls) == 2
+    assert list(cache.entries) == ['other'] and (cache.hits, cache.misses) == (4, 2)
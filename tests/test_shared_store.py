@@ -0,0 +1,58 @@
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+import registry
+import shared_store
+
+
+@pytest.fixture
+def store():
+    name = f"coffee_test_{uuid.uuid4().hex[:8]}"
+    yield name
+    shared_store.unlink(name)
+
+
+@pytest.fixture
+def artifact(use_catalog, tmp_path):
+    return use_catalog(artifact_path=str(tmp_path / 'model')).get_artifact()
+
+
+def test_attached_artifact_matches_the_published_one(artifact, store):
+    assert shared_store.publish(artifact, store) == 1
+    attached = shared_store.attach(store)
+    assert attached.manifest['generation'] == 1 and attached.model_version == artifact.model_version
+    for key, array in artifact.arrays.items():
+        np.testing.assert_array_equal(attached.arrays[key], array, err_msg=key)
+    assert not attached.features.flags.writeable
+    assert attached.engine()._sq_norms is attached.arrays['sq_norms']
+
+    ids = np.arange(0, len(artifact), 50)
+    np.testing.assert_array_equal(attached.engine().kneighbors(ids)[0], artifact.engine().kneighbors(ids)[0])
+
+
+def test_new_generations_replace_the_old_one(artifact, store):
+    shared_store.publish(artifact, store)
+    first = shared_store.attach(store)
+    assert shared_store.publish(artifact, store) == 2
+    assert shared_store.current_generation(store) == 2
+    assert not os.path.exists(f"/dev/shm/{shared_store.segment_name(store, 1)}")
+    # The previous generation stays readable for whoever still holds it
+    assert first.names[0] == artifact.names[0]
+    assert shared_store.attach(store).manifest['generation'] == 2
+
+
+def test_registry_shares_only_the_artifact(artifact, store, monkeypatch):
+    dataset = registry.get_dataset()
+    shared_store.publish(artifact, store)
+    monkeypatch.setattr(registry, 'SHARED_STORE', store)
+    registry.invalidate('artifact')
+    assert registry.get_artifact().manifest['shared_store'] == store
+    assert registry.get_dataset() is dataset
+
+
+def test_missing_store():
+    with pytest.raises(FileNotFoundError):
+        shared_store.attach(f"coffee_test_missing_{uuid.uuid4().hex[:8]}")
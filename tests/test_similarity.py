@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from artifacts import build_artifact, load_artifact, save_artifact
+from similarity import SimilarityEngine, build_feature_matrix
+
+
+@pytest.fixture(scope='module')
+def engine(coffee_df):
+    return SimilarityEngine.from_dataframe(coffee_df)
+
+
+def brute_force(features, metric):
+    features = features.astype(np.float64)
+    if metric == 'euclidean':
+        return np.linalg.norm(features[:, None] - features[None], axis=2)
+    if metric == 'manhattan':
+        return np.abs(features[:, None] - features[None]).sum(axis=2)
+    norms = np.linalg.norm(features, axis=1)
+    return 1 - features @ features.T / np.maximum(norms[:, None] * norms[None], 1e-12)
+
+
+@pytest.mark.parametrize('metric', ['euclidean', 'manhattan', 'cosine'])
+def test_kneighbors_matches_brute_force(engine, metric):
+    ids = np.arange(0, len(engine), 13)
+    found, dist = engine.kneighbors(ids, k=10, metric=metric)
+    expected = brute_force(engine.features, metric)[ids]
+    expected[np.arange(len(ids)), ids] = np.inf
+    # Compared by distance: beans with identical features may be listed in any order
+    np.testing.assert_allclose(dist, np.sort(expected, axis=1)[:, :10], atol=1e-3)
+    np.testing.assert_allclose(np.take_along_axis(expected, found, axis=1), dist, atol=1e-3)
+    assert not (found == ids[:, None]).any()
+
+
+def test_query_by_name_and_unknown_names(engine, coffee_df):
+    name = coffee_df['name'].iloc[0]
+    [neighbors] = engine.query([name], k=5)
+    assert len(neighbors) == 5 and name not in neighbors
+    with pytest.raises(KeyError):
+        engine.ids(['No such coffee'])
+    with pytest.raises(ValueError):
+        engine.distances(engine.features[:1], metric='chebyshev')
+
+
+def test_feature_matrix_aligns_unknown_categories(coffee_df):
+    features, columns = build_feature_matrix(coffee_df)
+    bean = coffee_df.iloc[:1].assign(roast='Unknown roast')
+    aligned, aligned_columns = build_feature_matrix(bean, columns)
+    assert aligned_columns == columns and aligned.shape == (1, features.shape[1])
+    assert not any(aligned[0, columns.index(column)] for column in columns if column.startswith('roast_'))
+
+
+def test_artifact_engine_reads_the_stored_norms(coffee_df, tmp_path):
+    path = str(tmp_path / 'model')
+    save_artifact(path, build_artifact(coffee_df))
+    artifact = load_artifact(path)
+    assert isinstance(artifact.arrays['sq_norms'], np.memmap)
+    features = np.asarray(artifact.features)
+    np.testing.assert_allclose(artifact.sq_norms, np.einsum('ij,ij->i', features, features), rtol=1e-6)
+    assert artifact.engine()._sq_norms is artifact.arrays['sq_norms']
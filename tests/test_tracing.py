@@ -0,0 +1,79 @@
+import threading
+import urllib.request
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def traces():
+    tracing.reset()
+    tracing.enable()
+    yield tracing
+    tracing.enable(False)
+    tracing.reset()
+
+
+def test_disabled_tracing_records_nothing():
+    tracing.reset()
+
+    @tracing.traced('test.noop')
+    def work():
+        return 42
+
+    with tracing.span('test.outer'):
+        assert work() == 42
+    assert tracing.span('test.outer') is tracing._NOOP
+    assert tracing.stage_summary() == {} and tracing.recent_traces() == []
+
+
+def test_spans_nest_per_thread(traces):
+    @tracing.traced()
+    def inner():
+        pass
+
+    def run():
+        with tracing.span('test.outer'):
+            inner()
+            inner()
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = tracing.stage_summary()
+    assert summary['test.outer']['count'] == 3 and summary['test_tracing.inner']['count'] == 6
+    [trace, *_] = tracing.recent_traces()
+    assert [(depth, name) for depth, name, _ in trace.lines()] == [
+        (0, 'test.outer'), (1, 'test_tracing.inner'), (1, 'test_tracing.inner'),
+    ]
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = tracing.StageHistogram()
+    for seconds in (0.0001, 0.003, 0.003, 20.0):
+        histogram.add(seconds)
+    assert histogram.counts[0] == 1 and histogram.counts[tracing.BUCKETS.index(0.005)] == 2 and histogram.counts[-1] == 1
+    assert histogram.percentile(50) == 0.003 and histogram.percentile(100) == 20.0
+
+
+def test_prometheus_text_is_served(traces, tmp_path):
+    with tracing.span('test.stage'):
+        pass
+    text = tracing.render_prometheus()
+    assert 'coffee_stage_duration_seconds_count{stage="test.stage"} 1' in text
+    assert 'coffee_stage_duration_seconds_bucket{stage="test.stage",le="+Inf"} 1' in text
+
+    path = tmp_path / 'coffee.prom'
+    tracing.write_prometheus(str(path))
+    assert path.read_text() == text
+
+    server = tracing.serve(0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            assert response.read().decode('utf-8') == text
+    finally:
+        server.shutdown()
@@ -0,0 +1,31 @@
+import warmup
+
+
+def test_warm_up_loads_every_resource(use_catalog, tmp_path):
+    registry = use_catalog(artifact_path=str(tmp_path / 'model'))
+    timings = warmup.warm_up(plotting=False, charts=False)
+    assert list(timings) == list(warmup.RESOURCES)
+    assert all(registry._resources[name].value is not None for name in warmup.RESOURCES)
+
+
+def test_warm_up_skips_what_it_is_not_asked_for(use_catalog):
+    registry = use_catalog()
+    assert list(warmup.warm_up(resources=('dataset',), plotting=False, charts=False)) == ['dataset']
+    assert registry._resources['artifact'].value is None
+
+
+def test_start_warmup_runs_once_per_process(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup, '_started', False)
+    monkeypatch.setattr(warmup, 'warm_up', lambda **kwargs: calls.append(kwargs))
+    thread = warmup.start_warmup(charts=False)
+    thread.join()
+    assert warmup.start_warmup(charts=False) is None
+    assert calls == [{'charts': False}]
+
+
+def test_main_prints_a_timing_per_step(use_catalog, tmp_path, capsys):
+    use_catalog(artifact_path=str(tmp_path / 'model'))
+    warmup.main(['--no-charts'])
+    steps = [line.split()[0] for line in capsys.readouterr().out.splitlines()]
+    assert steps == list(warmup.RESOURCES)
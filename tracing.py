@@ -0,0 +1,282 @@
+'''
+# Tracing
+Per-stage timings of page runs and recommendations, aggregated in-process.
+
+    with span('recommend.knn'):
+        ...
+
+    @traced('visuals.feature_comparison')
+    def plot_feature_comparison(...):
+
+Spans nest per thread (every Streamlit session runs its script in its own thread). Each finished span
+adds its duration to the histogram of its stage name, and every finished top-level span is kept as a
+trace tree for the debug panel. When tracing is disabled, `span` returns a shared no-op object and
+`traced` functions call straight through, so the instrumentation can stay in the hot paths.
+
+Configuration (environment):
+*   COFFEE_TRACING=1: enable tracing
+*   COFFEE_METRICS_PORT=9464: serve the histograms as Prometheus text on http://localhost:<port>/metrics
+*   COFFEE_METRICS_FILE=metrics.prom: rewrite the Prometheus text file every METRICS_FILE_INTERVAL seconds
+*   COFFEE_TRACING_PANEL=1: show the timings in the sidebar of both pages
+'''
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Recent durations kept per stage for the percentiles
+RECENT_SAMPLES = 1024
+# Finished top-level traces kept for the debug panel
+RECENT_TRACES = 20
+METRICS_FILE_INTERVAL = 15.0
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}
+_traces = deque(maxlen=RECENT_TRACES)
+_local = threading.local()
+
+
+class StageHistogram:
+    """Cumulative Prometheus histogram of one stage plus its most recent durations."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def percentile(self, q):
+        """q-th percentile (0-100) of the recent durations in seconds."""
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, name):
+        self.name = name
+        self.children = []
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            stack[-1].children.append(self)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        with _lock:
+            histogram = _stages.get(self.name)
+            if histogram is None:
+                histogram = _stages[self.name] = StageHistogram()
+            histogram.add(self.seconds)
+            if not stack:
+                _traces.append(self)
+        return False
+
+    def lines(self, depth=0):
+        """(depth, name, seconds) of this span and its children, depth first."""
+        yield depth, self.name, self.seconds
+        for child in self.children:
+            yield from child.lines(depth + 1)
+
+
+def span(name):
+    """Context manager timing the stage `name`, a no-op while tracing is disabled."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name)
+
+
+def traced(name=None):
+    """Decorator timing every call of a function as the stage `name` (default: module.function)."""
+    def decorate(func):
+        stage = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(value=True):
+    global _enabled
+    _enabled = value
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    """Drops all recorded timings."""
+    with _lock:
+        _stages.clear()
+        _traces.clear()
+
+
+def stage_summary():
+    """
+    Timings of every stage.
+
+    Returns:
+        dict: Stage name -> {'count', 'total_s', 'p50_ms', 'p95_ms'}, the percentiles over the recent calls.
+    """
+    with _lock:
+        return {
+            name: {
+                'count': histogram.count,
+                'total_s': histogram.sum,
+                'p50_ms': histogram.percentile(50) * 1000,
+                'p95_ms': histogram.percentile(95) * 1000,
+            }
+            for name, histogram in sorted(_stages.items())
+        }
+
+
+def recent_traces():
+    """The most recent finished top-level spans, newest first."""
+    with _lock:
+        return list(reversed(_traces))
+
+
+def render_prometheus():
+    """All stage histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP coffee_stage_duration_seconds Duration of traced stages.",
+        "# TYPE coffee_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        stages = sorted(_stages.items())
+        for name, histogram in stages:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'coffee_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'coffee_stage_duration_seconds_sum{{stage="{name}"}} {histogram.sum}')
+            lines.append(f'coffee_stage_duration_seconds_count{{stage="{name}"}} {histogram.count}')
+        lines += [
+            f"# HELP coffee_stage_recent_seconds Percentiles of the last {RECENT_SAMPLES} durations of each stage.",
+            "# TYPE coffee_stage_recent_seconds summary",
+        ]
+        for name, histogram in stages:
+            for q in (50, 95, 99):
+                lines.append(f'coffee_stage_recent_seconds{{stage="{name}",quantile="{q / 100}"}} {histogram.percentile(q)}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Writes the Prometheus text file atomically, for node_exporter's textfile collector."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    """Serves /metrics on a background thread, returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def _write_periodically(path):
+    while True:
+        time.sleep(METRICS_FILE_INTERVAL)
+        write_prometheus(path)
+
+
+def configure_from_env(environ=os.environ):
+    """Applies the COFFEE_TRACING* / COFFEE_METRICS_* settings, see the module docstring."""
+    enable(environ.get('COFFEE_TRACING', '0') not in ('', '0', 'false'))
+    if not _enabled:
+        return
+    if environ.get('COFFEE_METRICS_PORT'):
+        try:
+            serve(int(environ['COFFEE_METRICS_PORT']))
+        except OSError:
+            pass  # Another process of the app already serves the port
+    if environ.get('COFFEE_METRICS_FILE'):
+        threading.Thread(
+            target=_write_periodically, args=(environ['COFFEE_METRICS_FILE'],), name='metrics-file', daemon=True
+        ).start()
+
+
+def panel_enabled():
+    return _enabled and os.environ.get('COFFEE_TRACING_PANEL', '0') not in ('', '0', 'false')
+
+
+def debug_panel():
+    """Sidebar expander with the per-stage timings and the last trace of this process."""
+    import streamlit as st
+    with st.sidebar.expander("Timings"):
+        summary = stage_summary()
+        if not summary:
+            st.caption("No traced stages yet.")
+            return
+        st.dataframe(
+            [{'stage': name, **{key: round(value, 2) for key, value in stats.items()}} for name, stats in summary.items()],
+            hide_index=True,
+        )
+        traces = recent_traces()
+        if traces:
+            st.caption("Last trace")
+            st.code("\n".join(
+                f"{'  ' * depth}{name:<{40 - 2 * depth}} {seconds * 1000:9.2f} ms" for depth, name, seconds in traces[0].lines()
+            ))
+
+
+configure_from_env()
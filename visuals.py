@@ -1,25 +1,31 @@
-import matplotlib.pyplot as plt
 import streamlit as st
+from tracing import span, traced
 
-def plot_feature_comparison(input_coffees, recommended_coffee, df):
+
+def as_catalog_index(catalog):
+    # Callers may still pass the raw DataFrame, index it once (catalog_index imports pandas)
+    from catalog_index import CatalogIndex
+    return catalog if isinstance(catalog, CatalogIndex) else CatalogIndex(catalog)
+
+
+@traced('visuals.feature_comparison')
+def plot_feature_comparison(input_coffees, recommended_coffee, catalog):
     """
     Plots a bar chart comparing the features of input coffees and the recommended coffee.
 
     Parameters:
         input_coffees (list): List of input coffee names.
         recommended_coffee (str): Name of the recommended coffee.
-        df (DataFrame): Coffee dataset containing feature data.
+        catalog (CatalogIndex or DataFrame): Coffee dataset containing feature data.
     """
+    catalog = as_catalog_index(catalog)
+
     # Extract feature data for input and recommended coffees
-    input_features = []
-    for coffee_name in input_coffees:
-        coffee_data = df[df['name'] == coffee_name][['aroma', 'acid', 'body', 'flavor', 'aftertaste']]
-        if not coffee_data.empty:
-            input_features.append(coffee_data.iloc[0].values)  # First row's features as array
-
-    recommended_data = df[df['name'] == recommended_coffee][['aroma', 'acid', 'body', 'flavor', 'aftertaste']]
-    if not recommended_data.empty:
-        recommended_features = recommended_data.iloc[0].values  # First row's features as array
+    with span('visuals.lookup'):
+        input_features = list(catalog.flavor_features(catalog.rows(input_coffees)))
+        recommended_row = catalog.row(recommended_coffee)
+    if recommended_row is not None:
+        recommended_features = catalog.flavor_features(recommended_row)
     else:
         st.error("Recommended coffee not found in dataset.")
         return
@@ -28,8 +34,10 @@ def plot_feature_comparison(input_coffees, recommended_coffee, df):
     feature_labels = ['Aroma', 'Acid', 'Body', 'Flavor', 'Aftertaste']
     input_features.append(recommended_features)  # Add recommended coffee features for comparison
 
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
+    # Plotting, matplotlib is imported on the first chart instead of with the page
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
     bar_width = 0.2
     positions = list(range(len(feature_labels)))
 
@@ -58,37 +66,30 @@ def plot_feature_comparison(input_coffees, recommended_coffee, df):
     ax.set_title("Feature Comparison: Input vs. Recommended Coffee")
     ax.legend()
 
-    st.pyplot(fig)
-
+    with span('visuals.render'):
+        st.pyplot(fig)
 
 
 
-# visuals.py
 
-import matplotlib.pyplot as plt
-import streamlit as st
-
-def plot_categorical_comparison(input_coffees, recommended_coffee, df, categorical_features):
+@traced('visuals.categorical_comparison')
+def plot_categorical_comparison(input_coffees, recommended_coffee, catalog, categorical_features):
     """
     Plots a grouped bar chart comparing categorical features of input coffees and the recommended coffee.
 
     Parameters:
         input_coffees (list): List of input coffee names.
         recommended_coffee (str): Name of the recommended coffee.
-        df (DataFrame): Coffee dataset containing categorical data.
+        catalog (CatalogIndex or DataFrame): Coffee dataset containing categorical data.
         categorical_features (list): List of categorical feature column names to compare.
     """
+    catalog = as_catalog_index(catalog)
+
     # Extract data for input and recommended coffees
-    input_data = []
-    for coffee_name in input_coffees:
-        coffee_row = df[df['name'] == coffee_name]
-        if not coffee_row.empty:
-            input_data.append(coffee_row.iloc[0][categorical_features])
-
-    recommended_row = df[df['name'] == recommended_coffee]
-    if not recommended_row.empty:
-        recommended_data = recommended_row.iloc[0][categorical_features]
-    else:
+    with span('visuals.lookup'):
+        input_data = [catalog.record(name, categorical_features) for name in input_coffees if name in catalog]
+        recommended_data = catalog.record(recommended_coffee, categorical_features)
+    if recommended_data is None:
         st.error("Recommended coffee not found in dataset.")
         return
 
@@ -96,8 +97,10 @@ def plot_categorical_comparison(input_coffees, recommended_coffee, df, categoric
     data = input_data + [recommended_data]
     labels = [f"Input Coffee {i + 1}" for i in range(len(input_data))] + ["Recommended Coffee"]
 
-    # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
+    # Plotting, matplotlib is imported on the first chart instead of with the page
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
     bar_width = 0.2
     positions = range(len(categorical_features))
 
@@ -116,4 +119,5 @@ def plot_categorical_comparison(input_coffees, recommended_coffee, df, categoric
     ax.set_title("Categorical Comparison: Input vs. Recommended Coffee")
     ax.legend()
 
-    st.pyplot(fig)
+    with span('visuals.render'):
+        st.pyplot(fig)
@@ -0,0 +1,93 @@
+'''
+# Warm-up
+Importing the app's modules does no I/O and does not import the plotting libraries: the dataset and the
+model artifact are loaded by the registry on first use, and matplotlib / seaborn when the first chart is
+drawn. `warm_up` pays these costs up front instead of in the first page view:
+
+*   loads the registry resources (dataset, model artifact, indexes)
+*   imports the plotting libraries
+*   renders the static Dataset Explorer charts into the chart cache
+
+`start_warmup` runs it once per process in a background thread. `main.py` calls it when the first session
+opens the landing page, i.e. after the Streamlit server is bound, unless COFFEE_PREWARM=0.
+
+Usage:
+    python -m warmup    # warm the on-disk caches (e.g. the typed dataset cache) and print the timings
+'''
+
+import argparse
+import importlib
+import os
+import threading
+import time
+
+import registry
+
+RESOURCES = ('dataset', 'artifact', 'catalog_index', 'search_index', 'fact_cube')
+
+# Background warm-up on the first page view, COFFEE_PREWARM=0 keeps everything lazy
+PREWARM = os.environ.get('COFFEE_PREWARM', '1') not in ('', '0', 'false')
+
+_started = False
+_lock = threading.Lock()
+
+
+def import_plotting():
+    """Imports the plotting libraries the charts use."""
+    for module in ('matplotlib.figure', 'seaborn'):
+        importlib.import_module(module)
+
+
+def warm_up(resources=RESOURCES, plotting=True, charts=True):
+    """
+    Loads everything the first page views need.
+
+    Parameters:
+        resources (tuple): Registry resources to load.
+        plotting (bool): Import the plotting libraries.
+        charts (bool): Render the static explorer charts (implies plotting).
+
+    Returns:
+        dict: Step -> seconds.
+    """
+    timings = {}
+
+    def timed(step, func, *args):
+        start = time.perf_counter()
+        func(*args)
+        timings[step] = time.perf_counter() - start
+
+    for name in resources:
+        timed(name, registry.get, name)
+    if plotting or charts:
+        timed('plotting', import_plotting)
+    if charts:
+        from charts import render_static
+        timed('charts', render_static)
+    return timings
+
+
+def start_warmup(**kwargs):
+    """Runs `warm_up` in a daemon thread, once per process. Returns the thread, None if already started."""
+    global _started
+    with _lock:
+        if _started:
+            return None
+        _started = True
+    thread = threading.Thread(target=warm_up, kwargs=kwargs, name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the dataset, models and charts ahead of the first page view.")
+    parser.add_argument('--no-charts', action='store_true', help="Skip the plotting libraries and charts")
+    args = parser.parse_args(argv)
+
+    timings = warm_up(plotting=not args.no_charts, charts=not args.no_charts)
+    for step, seconds in timings.items():
+        print(f"{step:<14} {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()